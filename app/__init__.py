@@ -1,7 +1,8 @@
-from flask import Flask, redirect, render_template, request, url_for
+from flask import Flask, abort, g, redirect, render_template, request, send_file, url_for
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import create_engine, text
 from app.keyvault import get_secret
+import hmac
 import os, secrets
 import dotenv
 import logging
@@ -13,6 +14,7 @@ import pyodbc
 db = SQLAlchemy()
 
 from app.helper import load_config
+from app.reconnect import is_waking_error, prewarm_in_background
 
 # Global flag for database connection status
 db_connected = False
@@ -21,6 +23,28 @@ db_lock = threading.Lock()
 db_waking = False  # Flag to indicate database is waking up
 app_instance = None  # Store app instance for background thread
 db_engine = None  # Store the engine globally
+db_wake_thread = None  # Background connect thread, if one has been started
+
+# Libraries the exports, previews and SharePoint calls import on first use. A server that
+# forks workers imports them once in the master with preload_modules() so the workers
+# share them instead of each paying for them on its first export
+HEAVY_MODULES = ("pandas", "openpyxl", "docx", "reportlab.pdfgen.canvas", "azure.identity")
+
+
+def preload_modules(names=HEAVY_MODULES) -> dict:
+    """Import the lazily loaded libraries now; returns seconds taken per module."""
+    import importlib
+
+    timings = {}
+    for name in names:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logging.warning(f"preload_modules: could not import {name}: {e}")
+            continue
+        timings[name] = round(time.perf_counter() - started, 3)
+    return timings
 
 
 def initialize_database_connection(app=None):
@@ -34,26 +58,56 @@ def initialize_database_connection(app=None):
         # Azure serverless returns 40613 immediately; truly unreachable hosts time out fast.
         engine = build_engine(timeout=15)
         if engine:
+            check_schema(engine)
             if target_app:
                 target_app.config['SQLALCHEMY_DATABASE_URI'] = str(engine.url)
+                if "sqlalchemy" in target_app.extensions:
+                    # Started after init_app (a preloaded worker): swap the engine in
+                    # the same way connect_database_background does
+                    with target_app.app_context():
+                        db.session.remove()
+                        target_app.extensions["sqlalchemy"].engines[None] = engine
             db_engine = engine
             with db_lock:
                 db_connected = True
                 db_error = None
                 db_waking = False
             logging.info("Database connected successfully on startup")
+            prewarm_in_background(engine)
             return True
+    except SchemaOutOfDate as e:
+        # Connecting again will not help; report it on /db-status and the waiting page
+        engine.dispose()
+        logging.error(str(e))
+        with db_lock:
+            db_connected = False
+            db_error = str(e)
+            db_waking = False
+        return False
     except Exception as e:
         error_str = str(e)
         logging.info(f"Startup probe failed ({error_str[:80]}) — starting background retry")
         with db_lock:
             db_connected = False
             db_error = None
-            db_waking = '40613' in error_str or '08001' in error_str or 'timeout' in error_str.lower()
+            db_waking = is_waking_error(error_str)
 
-    threading.Thread(target=connect_database_background, daemon=True).start()
+    start_background_connect("startup")
     return False
 
+
+def start_background_connect(reason="request"):
+    """Start connect_database_background unless it is already running; returns True if started."""
+    global db_wake_thread
+    from app import dbwake
+
+    with db_lock:
+        if db_wake_thread is not None and db_wake_thread.is_alive():
+            return False
+        db_wake_thread = threading.Thread(target=dbwake.timed_wake, args=(connect_database_background, reason), daemon=True)
+        db_wake_thread.start()
+    return True
+
 # Initialise the app
 def create_app():
     global app_instance
@@ -67,13 +121,126 @@ def create_app():
     app.config.from_object(f'config.{config_mode}')
     app.secret_key = secrets.token_hex(32)
 
+    # Debug logging follows the config now that .env is loaded; level checks are cached
+    from app.log import configure as configure_logging
+    configure_logging(config_mode=config_mode)
+
+    # Request latency per endpoint and a trace per request; registered first so they
+    # also cover the waiting page
+    from app import metrics, tracing
+    metrics.configure()
+    tracing.install_log_filter()
+
+    @app.before_request
+    def start_request_timer():
+        g._request_started = time.perf_counter()
+        g._trace = tracing.start_trace(f"{request.method} {request.endpoint or 'unmatched'}",
+                                       path=request.path, method=request.method)
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('_request_started', None)
+        if started is not None:
+            metrics.record_request(request.endpoint or 'unmatched', request.method, response.status_code,
+                                   time.perf_counter() - started)
+        trace = g.get('_trace')
+        if trace is not None:
+            trace.set(status_code=response.status_code)
+            response.headers['X-Trace-Id'] = trace.trace_id
+        return response
+
+    @app.teardown_request
+    def finish_request_trace(error=None):
+        tracing.finish_trace(g.pop('_trace', None), error)
+
+    # /metrics, /db-metrics and /profiles need "Authorization: Bearer <METRICS_TOKEN>";
+    # with no token configured they are closed (behind a reverse proxy every request
+    # looks local, so the caller's address proves nothing)
+    try:
+        app.config['METRICS_TOKEN'] = get_secret('METRICS_TOKEN', 'METRICS-TOKEN')
+    except KeyError:
+        app.config['METRICS_TOKEN'] = ''
+
+    def metrics_allowed():
+        token = app.config.get('METRICS_TOKEN')
+        if not token:
+            return False
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+    # Opt-in cProfile of a single request: X-Profile: 1 (or ?profile=1) from an admin,
+    # or a PROFILE_SAMPLE_RATE fraction of all requests; see /profiles
+    from app import profiling
+
+    @app.before_request
+    def start_request_profile():
+        asked = profiling.requested(request.headers, request.args)
+        reason = profiling.should_profile(asked, asked and metrics_allowed())
+        if reason:
+            profiler = profiling.start()
+            if profiler is not None:
+                g._profile = profiling.RequestProfiler(profiler, reason)
+
+    @app.after_request
+    def store_request_profile(response):
+        state = g.pop('_profile', None)
+        if state is not None:
+            trace = g.get('_trace')
+            name = profiling.finish(state.profiler, request.endpoint or 'unmatched', request.method, request.path,
+                                    response.status_code, time.perf_counter() - state.started, state.reason,
+                                    trace.trace_id if trace is not None else None)
+            if name:
+                response.headers['X-Profile-Id'] = name
+        return response
+
+    @app.teardown_request
+    def stop_request_profile(error=None):
+        # after_request is skipped when a view raises; never leave the profiler running
+        state = g.pop('_profile', None)
+        if state is not None:
+            state.profiler.disable()
+
+    # Under gunicorn --preload this runs in the master: the engine, probe and threads are
+    # started per worker after fork (preload.start_worker) and only shared state is built here
+    from app import preload
+    deferred = preload.deferred()
+
     # Try to connect to database on startup
-    initialize_database_connection(app)
+    if not deferred:
+        initialize_database_connection(app)
     
     db.init_app(app)
 
+    # Prime secrets, API hosts, clients, templates and CS standards in the background;
+    # /ready reports once the critical ones are warm
+    from app import warmup
+    if not deferred:
+        warmup.start(app)
+
     from app.views import views_bp
     app.register_blueprint(views_bp)
+
+    from app.chindex import ch_ingest_command
+    app.cli.add_command(ch_ingest_command)
+
+    from app.chbatch import ch_revalidate_command
+    app.cli.add_command(ch_revalidate_command)
+
+    from app.chstream import ch_stream_command
+    app.cli.add_command(ch_stream_command)
+
+    from app import replica
+    app.cli.add_command(replica.replica_sync_command)
+
+    from app import dbwake
+    if not deferred:
+        replica.start_replica_sync(app)
+        dbwake.start_wake_scheduler()
+
+    from app.reconnect import reconnect_status
+
+    @app.context_processor
+    def inject_replica_mode():
+        return {'read_replica': replica.is_serving()}
     
     # Application-level utility routes (not part of main business logic)
     @app.route('/waiting')
@@ -86,6 +253,22 @@ def create_app():
 
         return render_template('waiting.html', next_url=next_url)
     
+    started_at = time.time()
+
+    @app.route('/health')
+    def health():
+        """Liveness: the process is up and serving, whatever the state of its dependencies"""
+        return {'status': 'ok', 'pid': os.getpid(), 'uptime_seconds': round(time.time() - started_at, 1)}, 200, \
+            {'Cache-Control': 'no-store'}
+
+    @app.route('/ready')
+    def readiness():
+        """Readiness: 200 once the critical warm-up items are warm (this worker only), else 503"""
+        warmup.ensure_started(app)
+        is_ready = warmup.ready()
+        response = {'ready': is_ready, 'pid': os.getpid(), 'items': warmup.status()}
+        return response, 200 if is_ready else 503, {'Cache-Control': 'no-store'}
+
     @app.route('/db-status')
     def db_status():
         """Database connection status endpoint for monitoring"""
@@ -96,8 +279,59 @@ def create_app():
                 'error': db_error,
                 'waking': db_waking
             }
+        response['wake'] = dbwake.wake_status()
+        response['reconnect'] = reconnect_status()
         return response, 200, {'Cache-Control': 'no-store, no-cache, must-revalidate, max-age=0'}
     
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Request, dependency, database and cache metrics in Prometheus text format (this worker only)"""
+        if not metrics_allowed():
+            abort(403)
+        return metrics.render_prometheus(), 200, {
+            'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+            'Cache-Control': 'no-store',
+        }
+
+    @app.route('/db-metrics')
+    def db_metrics():
+        """Per-operation database timings and the slow-query log (this worker only)"""
+        if not metrics_allowed():
+            abort(403)
+        response = {
+            'pid': os.getpid(),
+            'slow_query_ms': metrics.slow_query_seconds() * 1000,
+            'operations': metrics.operation_stats(),
+            'slow_queries': metrics.slow_queries(),
+            'caches': metrics.cache_stats(),
+        }
+        return response, 200, {'Cache-Control': 'no-store, no-cache, must-revalidate, max-age=0'}
+
+    @app.route('/profiles')
+    def list_profiles():
+        """Summaries of the newest stored request profiles (this instance only)"""
+        if not metrics_allowed():
+            abort(403)
+        return {'profiles': profiling.latest(request.args.get('limit', 20, type=int))}, 200, {'Cache-Control': 'no-store'}
+
+    @app.route('/profiles/<name>')
+    def show_profile(name):
+        """One stored profile: a pstats report, or the raw .prof file with ?format=prof"""
+        if not metrics_allowed():
+            abort(403)
+        if request.args.get('format') == 'prof':
+            path = profiling.profile_path(name)
+            if path is None:
+                abort(404)
+            return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=f'{name}.prof')
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'calls'):
+            abort(400)
+        text = profiling.profile_report(name, request.args.get('limit', 40, type=int), sort)
+        if text is None:
+            abort(404)
+        return text, 200, {'Content-Type': 'text/plain; charset=utf-8', 'Cache-Control': 'no-store'}
+
     # Add diagnostic endpoint to check data
     @app.route('/db-check')
     def db_check():
@@ -110,14 +344,14 @@ def create_app():
         try:
             # Check table exists and count records
             with db.engine.connect() as conn:
-                result = conn.execute(text("SELECT COUNT(*) as total, COUNT(CASE WHEN UPPER(sid) = 'CS' THEN 1 END) as cs_count FROM dbo.ServiceStandard"))
+                result = conn.execute(text("SELECT COUNT(*) as total, COUNT(CASE WHEN sid_norm = 'CS' THEN 1 END) as cs_count FROM dbo.ServiceStandard"))
                 row = result.fetchone()
                 
                 if row is None:
                     return {'error': 'No data returned from query'}, 500
                 
                 # Get sample of CS records
-                cs_records = conn.execute(text("SELECT TOP 5 stdid, sid, ssn, description FROM dbo.ServiceStandard WHERE UPPER(sid) = 'CS'"))
+                cs_records = conn.execute(text("SELECT TOP 5 stdid, sid, ssn, description FROM dbo.ServiceStandard WHERE sid_norm = 'CS'"))
                 cs_data = [{'stdid': r[0], 'sid': r[1], 'ssn': r[2], 'description': r[3]} for r in cs_records]
                 
                 return {
@@ -135,10 +369,19 @@ def create_app():
         global db_connected
         
         # Allow these endpoints without requiring database connection
-        allowed_paths = ['/waiting', '/db-status', '/db-check', '/static/', '/favicon.ico']
+        allowed_paths = ['/waiting', '/health', '/ready', '/db-status', '/db-metrics', '/metrics', '/profiles', '/db-check', '/static/', '/favicon.ico']
         if any(request.path.startswith(path) for path in allowed_paths):
             return None
+
+        # Start waking the database as soon as someone opens the home page
+        if request.path == '/':
+            dbwake.request_wake("index")
             
+        # While the database wakes, the read-replica serves pages and the queueable saves
+        replica_endpoints = ('views.set_servicestandards', 'views.manage_servicearrangements')
+        if not db_connected and (request.method == 'GET' or request.endpoint in replica_endpoints) and replica.is_serving():
+            return None
+
         # For all other routes, show waiting page if database not ready
         if not db_connected:
             next_url = request.full_path if request.query_string else request.path
@@ -148,71 +391,108 @@ def create_app():
         
         return None
 
+    if deferred:
+        preload.warm(app)
+
     return app
 
 
 def connect_database_background():
     """Background thread to connect to database when it's waking up"""
     global db_connected, db_error, db_waking, app_instance, db_engine
-    
-    max_attempts = 30  # Reduced attempts since each attempt now waits 2 minutes
-    attempt = 0
-    
-    while attempt < max_attempts:
-        try:
-            logging.info(f"Background connection attempt {attempt + 1}/{max_attempts}")
-            engine = build_engine()
-            
-            if engine:
-                # Test the connection
-                with engine.connect() as conn:
-                    conn.execute(text("SELECT 1"))
-                
-                # Inject the real engine into Flask-SQLAlchemy's state.
-                # Updating config + calling dispose() only drains the pool;
-                # the engine object (and its placeholder URI) persists.
-                # Directly replacing engines[None] is the correct swap in FSA 3.x.
-                if app_instance:
-                    with app_instance.app_context():
-                        db.session.remove()
-                        app_instance.extensions["sqlalchemy"].engines[None] = engine
-                        db_engine = engine
-                        logging.info("Flask-SQLAlchemy engine replaced with real connection")
-                
-                with db_lock:
-                    db_connected = True
-                    db_error = None
-                    db_waking = False
-                
-                logging.info("Database connected successfully in background and app reconfigured")
-                return  # Success, exit thread
-                
-        except Exception as e:
-            error_str = str(e)
-            attempt += 1
-            
-            # Check if still waking up (40613, timeout, or 08001 errors)
-            if '40613' in error_str or '08001' in error_str or 'timeout' in error_str.lower():
-                logging.info(f"Database still waking up, attempt {attempt}/{max_attempts}")
-                time.sleep(10)  # Wait 10 seconds before retry (build_engine waits 2 mins internally)
-            else:
-                # Different error - stop trying
-                logging.error(f"Database connection failed with non-waking error: {e}")
-                with db_lock:
-                    db_connected = False
-                    db_error = error_str
-                    db_waking = False
-                return
-    
-    # Timeout after max attempts
-    logging.error("Database wake-up timeout exceeded")
+    from app.reconnect import ReconnectManager
+
+    # One engine for every attempt, jittered exponential backoff, pool pre-warmed on success
+    manager = ReconnectManager(engine_factory=create_db_engine)
+    engine = manager.run()
+
+    if engine is None:
+        if manager.timed_out:
+            logging.error("Database wake-up timeout exceeded")
+            error = "Database wake-up timeout: The database did not become available within the expected time."
+        else:
+            error = manager.last_error
+        with db_lock:
+            db_connected = False
+            db_error = error
+            db_waking = False
+        return
+
+    try:
+        check_schema(engine)
+    except SchemaOutOfDate as e:
+        engine.dispose()
+        logging.error(str(e))
+        with db_lock:
+            db_connected = False
+            db_error = str(e)
+            db_waking = False
+        return
+
+    # Inject the real engine into Flask-SQLAlchemy's state.
+    # Updating config + calling dispose() only drains the pool;
+    # the engine object (and its placeholder URI) persists.
+    # Directly replacing engines[None] is the correct swap in FSA 3.x.
+    if app_instance:
+        with app_instance.app_context():
+            db.session.remove()
+            app_instance.extensions["sqlalchemy"].engines[None] = engine
+            db_engine = engine
+            logging.info("Flask-SQLAlchemy engine replaced with real connection")
+
     with db_lock:
-        db_connected = False
-        db_error = "Database wake-up timeout: The database did not become available within the expected time."
+        db_connected = True
+        db_error = None
         db_waking = False
 
+    logging.info("Database connected successfully in background and app reconfigured")
+
 
 def build_engine(timeout=120):
+    """Create the engine and check it with SELECT 1 (raises if the database doesn't answer)."""
+    engine = create_db_engine(timeout)
+
+    # Test connection
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        logging.info("Successfully connected to the database")
+
+    return engine
+
+
+class SchemaOutOfDate(RuntimeError):
+    """The database lacks tables or columns the models use: the migrations have not been run."""
+
+
+def check_schema(engine):
+    """
+    Raise SchemaOutOfDate unless every model table exists with all its columns. Run after
+    connecting, so code deployed ahead of 'alembic upgrade head' fails loudly instead of
+    every query failing inside _run_with_db_retry and returning empty data.
+    """
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import NoSuchTableError
+    import app.models  # noqa: F401  (registers the models on db.metadata)
+
+    inspector = inspect(engine)
+    problems = []
+    for table in db.metadata.sorted_tables:
+        try:
+            present = {column["name"].lower() for column in inspector.get_columns(table.name, schema=table.schema)}
+        except NoSuchTableError:
+            present = set()
+        if not present:
+            problems.append(f"{table.fullname} does not exist")
+            continue
+        missing = [column.name for column in table.columns if column.name.lower() not in present]
+        if missing:
+            problems.append(f"{table.fullname} has no {', '.join(missing)}")
+    if problems:
+        raise SchemaOutOfDate(f"Database schema is out of date ({'; '.join(problems)}); run 'alembic upgrade head'")
+
+
+def create_db_engine(timeout=120):
+    """Create the SQL Server engine without connecting; raises if secrets or driver are missing."""
     from urllib.parse import quote_plus
     
     # Debug: Check available drivers
@@ -278,10 +558,5 @@ def build_engine(timeout=120):
         }
     )
 
-    # Test connection
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
-        logging.info(f"Successfully connected using driver: {driver}")
-    
     return engine
 
@@ -3,21 +3,26 @@
 import requests
 from sqlalchemy import true
 from app.classes import Company, Contact, Requirement, Candidate, C7User
-from app.helper import load_config, formatName, debugMode
+from app.helper import load_config, formatName
+from app.log import get_logger
+from app.metrics import call_dependency
+from app.tracing import traced
 import re
 from datetime import date, datetime
 from app.chquery import searchCH, getCHbasics 
 from dateutil.relativedelta import relativedelta 
 from typing import Optional, cast
 
+log = get_logger(__name__)
 
+
+@traced
 def getC7Company(company_id):
     """
     Fetch company details from C7 by CompanyId. Includes custom fields and formatted address.
     """
     
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getC7Company: Fetching data for CompanyId {company_id}")
+    log.debug("getC7Company: Fetching data for CompanyId %s", company_id)
     
     cfg = load_config()
     user_id = cfg["C7_USERID"]
@@ -36,7 +41,7 @@ def getC7Company(company_id):
 
     url = "https://coll7openapi.azure-api.net/api/Company/AdvancedSearch"
 
-    response = requests.post(url, headers=hdr, json=request_body)
+    response = call_dependency("C7", requests.post, url, headers=hdr, json=request_body)
     if response.status_code != 200:
         return {"status_code": response.status_code, "error": response.text}
 
@@ -61,10 +66,10 @@ def getC7Company(company_id):
     return company_data
 
 
+@traced
 def getC7Contact(contact_id):
 
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getC7Contact: Fetching data for ContactId {contact_id}")
+    log.debug("getC7Contact: Fetching data for ContactId %s", contact_id)
 
     # bail early if no contact_id
     if contact_id == '' or contact_id is None:
@@ -76,7 +81,7 @@ def getC7Contact(contact_id):
 
     url = f"https://coll7openapi.azure-api.net/api/Contact/Get?UserId={user_id}&ContactId={contact_id}&IncludeArchivedRecords=false"
 
-    response = requests.get(url, headers=hdr)
+    response = call_dependency("C7", requests.get, url, headers=hdr)
 
     # Parse JSON
     response_json = response.json()
@@ -101,10 +106,10 @@ def getC7Contact(contact_id):
     return result
 
 
+@traced
 def getC7ContactsByCompany(CompanyName):
 
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getC7ContactsByCompany: Searching contacts for CompanyName {CompanyName}")
+    log.debug("getC7ContactsByCompany: Searching contacts for CompanyName %s", CompanyName)
 
     cfg = load_config()
     user_id = cfg["C7_USERID"]
@@ -123,7 +128,7 @@ def getC7ContactsByCompany(CompanyName):
         }]
     }
 
-    response = requests.post(url, headers=hdr , json=body)
+    response = call_dependency("C7", requests.post, url, headers=hdr , json=body)
     response_json = response.json()
 
     contacts = []
@@ -162,10 +167,10 @@ def getC7ContactsByCompany(CompanyName):
     return contacts
 
 
+@traced
 def getC7Requirements(company_name,contact_name):
 
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getC7Requirements: Searching requirements for CompanyName {company_name} and ContactName {contact_name}")
+    log.debug("getC7Requirements: Searching requirements for CompanyName %s and ContactName %s", company_name, contact_name)
     
     cfg = load_config()
 
@@ -176,7 +181,7 @@ def getC7Requirements(company_name,contact_name):
         url = f"https://coll7openapi.azure-api.net/api/Requirement/Search?UserId={user_id}&CompanyName={company_name}&ContactName={contact_name}"
         
         if isinstance(hdr, dict):
-            response = requests.get(url, headers=hdr)
+            response = call_dependency("C7", requests.get, url, headers=hdr)
             response_json = response.json()
         else:
             response_json = {}
@@ -212,10 +217,10 @@ def getC7Requirements(company_name,contact_name):
         return e
 
 
+@traced
 def getC7RequirementCandidates(requirementId):
 
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getC7RequirementCandidates: Fetching candidates for RequirementId {requirementId}")
+    log.debug("getC7RequirementCandidates: Fetching candidates for RequirementId %s", requirementId)
     
     cfg = load_config()
 
@@ -224,7 +229,7 @@ def getC7RequirementCandidates(requirementId):
 
     url = f"https://coll7openapi.azure-api.net/api/Requirement/GetRequirementCandidates?UserId={user_id}&RequirementId={requirementId}"
 
-    response = requests.get(url, headers=hdr)
+    response = call_dependency("C7", requests.get, url, headers=hdr)
 
     # Read and decode response
     response_json = response.json()
@@ -247,10 +252,10 @@ def getC7RequirementCandidates(requirementId):
     return candidates
 
 
+@traced
 def searchC7Candidate(candidate_name):
 
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} searchC7Candidate: Searching for candidate {candidate_name}")
+    log.debug("searchC7Candidate: Searching for candidate %s", candidate_name)
 
     cfg = load_config()
 
@@ -259,24 +264,24 @@ def searchC7Candidate(candidate_name):
 
     C7_candidate_name = candidate_name.split(",").strip()
     candidate_search_url = f"https://coll7openapi.azure-api.net/api/Candidate/Search?UserId={user_id}&Surname={C7_candidate_name}"
-    found_candidate = requests.get(candidate_search_url, headers=hdr)
+    found_candidate = call_dependency("C7", requests.get, candidate_search_url, headers=hdr)
     candidate_record = {}
 
     if found_candidate.status_code == 200:
         candidate_json = found_candidate.json()
         candidate_id = candidate_json[0]
         candidate_url = f"https://coll7openapi.azure-api.net/api/Candidate/Get?UserId={user_id}&candidateId={candidate_id}"
-        candidate_response = requests.get(candidate_url, headers=hdr)
+        candidate_response = call_dependency("C7", requests.get, candidate_url, headers=hdr)
 
         candidate_record = candidate_response.json()
         
     return(candidate_record)
 
 
+@traced
 def getC7contract(candidate_id):
     
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getC7contract: Fetching contract data for CandidateId {candidate_id}")
+    log.debug("getC7contract: Fetching contract data for CandidateId %s", candidate_id)
     
     # Initialize variables
     candidate_address = ""
@@ -357,7 +362,7 @@ def getC7contract(candidate_id):
                 "fieldValue": candidate_id
             }]
         }
-    placement_response = requests.post(placement_url, headers=hdr, json=placement_body)
+    placement_response = call_dependency("C7", requests.post, placement_url, headers=hdr, json=placement_body)
     
     if placement_response.status_code == 200:
         placement_data_list = placement_response.json()
@@ -495,8 +500,7 @@ def getC7contract(candidate_id):
 
 def gatherC7data(session_contract):
     
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} gatherC7data: Gathering contract data from C7")
+    log.debug("gatherC7data: Gathering contract data from C7")
 
     contract = {}
     c7contractdata = {}
@@ -578,10 +582,10 @@ def gatherC7data(session_contract):
     return contract
 
 
-def getC7Candidate(candidate_id, search_term: Optional[str] = None) -> dict: 
+@traced
+def getC7Candidate(candidate_id, search_term: Optional[str] = None, ch_lookup: bool = True) -> dict: 
 
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getC7Candidate: Fetching data for CandidateId {candidate_id} with search term '{search_term}'")
+    log.debug("getC7Candidate: Fetching data for CandidateId %s with search term '%s'", candidate_id, search_term)
 
 
     candidate_name = ""
@@ -601,7 +605,7 @@ def getC7Candidate(candidate_id, search_term: Optional[str] = None) -> dict:
     hdr = cast(dict[str, str], cfg["C7_HDR"])
 
     candidate_url = f"https://coll7openapi.azure-api.net/api/Candidate/Get?UserId={user_id}&candidateId={candidate_id}"
-    candidate_response = requests.get(candidate_url, headers=hdr)
+    candidate_response = call_dependency("C7", requests.get, candidate_url, headers=hdr)
 
     # move on to next candidate if no record found - very unlikely?
     if candidate_response.status_code != 200:
@@ -637,7 +641,7 @@ def getC7Candidate(candidate_id, search_term: Optional[str] = None) -> dict:
 
         # for candiate-specific calls, search Companies House API using name and company number
         # populate registered address when a match is found
-        if search_term is None and (candidate_ltd_name and candidate_reg_number):
+        if search_term is None and ch_lookup and (candidate_ltd_name and candidate_reg_number):
             candidate_reg_address, candidate_jurisdiction = getCHbasics(candidate_ltd_name.strip(), candidate_reg_number.strip())
             if candidate_jurisdiction == "england-wales":
                 candidate_jurisdiction = "England and Wales"
@@ -657,10 +661,53 @@ def getC7Candidate(candidate_id, search_term: Optional[str] = None) -> dict:
     }
 
 
+@traced
+def getC7ActivePlacements() -> list[dict]:
+    """
+    Fetch every placement that has not yet ended (EndDate today or later).
+    The AdvancedSearch endpoint needs at least one parameter, so a DateCreated
+    catch-all is used as in loadC7Clients and the end date is filtered here.
+    """
+
+    log.debug("getC7ActivePlacements: Fetching active placements")
+
+    cfg = load_config()
+    user_id = cfg["C7_USERID"]
+    hdr = cast(dict[str, str], cfg["C7_HDR"])
+
+    body = {
+        "userId": user_id,
+        "allColumns": True,
+        "columns": [],
+        "splitJobTitle": True,
+        "parameters": [{
+            "fieldName": "DateCreated",
+            "fieldValue": "1 Jan 2010"
+        }]
+    }
+
+    url = "https://coll7openapi.azure-api.net/api/Placement/AdvancedSearch"
+    response = call_dependency("C7", requests.post, url, headers=hdr, json=body)
+    if response.status_code != 200:
+        return []
+
+    today = date.today()
+    active = []
+    for placement in response.json() or []:
+        try:
+            end_date = datetime.strptime(placement.get('EndDate', ''), "%d %b %Y").date()
+        except (TypeError, ValueError):
+            continue
+        if end_date >= today:
+            active.append(placement)
+
+    return active
+
+
+@traced
 def getC7Candidates(query):
     
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getC7Candidates: Searching candidates with query '{query}'")    
+    log.debug("getC7Candidates: Searching candidates with query '%s'", query)
     
     # load config
     cfg = load_config()
@@ -672,7 +719,7 @@ def getC7Candidates(query):
     payload = []
     try:
         candidate_url = f"https://coll7openapi.azure-api.net/api/Candidate/Search?UserId={user_id}&Surname={query}"            
-        candidate_search_response = requests.get(candidate_url, headers=hdr)                   
+        candidate_search_response = call_dependency("C7", requests.get, candidate_url, headers=hdr)                   
         if candidate_search_response.status_code == 200:
             payload = candidate_search_response.json()
     except:        
@@ -681,6 +728,7 @@ def getC7Candidates(query):
     return payload
 
 
+@traced
 def loadC7Clients() -> list[Company] | None:
     
     if Company.count() == 0:
@@ -693,8 +741,7 @@ def loadC7Clients() -> list[Company] | None:
         company_number = ""
         company_jurisdiction = ""
 
-        if debugMode():
-            print(f"{datetime.now().strftime('%H:%M:%S')} loadC7Clients: Fetching all clients")
+        log.debug("loadC7Clients: Fetching all clients")
         
         cfg = load_config()
         user_id = cfg["C7_USERID"]
@@ -711,7 +758,7 @@ def loadC7Clients() -> list[Company] | None:
         }
 
         url = "https://coll7openapi.azure-api.net/api/Company/AdvancedSearch"
-        response = requests.post(url, headers=hdr, json=body)
+        response = call_dependency("C7", requests.post, url, headers=hdr, json=body)
 
         if response.status_code != 200:
             return None
@@ -752,11 +799,10 @@ def setC7CandidateMSASent(candidate_id):
         - Requires configuration to be loaded via load_config() containing
         C7_USERID and C7_HDR keys.
         - Sets the MSA Sent date to the current date and time.
-        - Prints debug information if debugMode() returns True.
+        - Logs debug information when debug logging is enabled.
     """
   
-    if debugMode():
-            print(f"{datetime.now().strftime('%H:%M:%S')} setC7CandidateMSASent: Setting MSA Sent date for candidate")
+    log.debug("setC7CandidateMSASent: Setting MSA Sent date for candidate")
 
     msa_date = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
     cfg = load_config()
@@ -0,0 +1,308 @@
+# chbatch.py - stored Companies House verdicts and the nightly revalidation job
+# The batch job checks every active placement's limited company and client ahead of time
+# so that validateC7 can show a stored verdict instead of waiting on Companies House.
+from __future__ import annotations
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Sequence
+
+import click
+from sqlalchemy import select, update
+
+from app import db
+from app.c7query import getC7ActivePlacements, getC7Candidate, getC7Company
+from app.chquery import validateCH, validateCHMany
+from app.helper import _run_with_db_retry, db_add, db_commit, db_query_scalars, formatName, is_database_connected
+from app.metrics import record_cache
+from app.models import CompanyValidation
+from app.namematch import normalise_name
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+
+# -----------------------------
+# Configuration
+# -----------------------------
+def verdict_max_age_hours() -> float:
+    # a little over a day so a nightly run keeps verdicts fresh until the next one
+    return float(os.environ.get("CH_VERDICT_MAX_AGE_HOURS", "30"))
+
+
+def checks_per_second() -> float:
+    # Companies House allows 600 requests per 5 minutes; a check makes up to three
+    return float(os.environ.get("CH_BATCH_CHECKS_PER_SECOND", "0.5"))
+
+
+# -----------------------------
+# Rate limiting
+# -----------------------------
+class RateLimiter:
+    """
+    Token bucket shared by the batch worker threads: allows `rate` acquisitions per
+    second on average with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# -----------------------------
+# Verdict store
+# -----------------------------
+def director_key(director: Optional[str]) -> str:
+    """
+    Normalised director name for verdict keys. The batch passes C7's 'Surname:ID, Forename'
+    formatted by formatName and validateC7 the session's 'Forename Surname (...)'; both
+    reduce to the same upper-case tokens.
+    """
+    return " ".join(normalise_name((director or "").split("(")[0]))
+
+
+def verdict_key(check: Sequence) -> tuple[str, str, str]:
+    """ (ch_number, ch_name[, director]) -> normalised key used to store the verdict """
+    ch_number, ch_name = check[0], check[1]
+    director = check[2] if len(check) > 2 else None
+    return (
+        (ch_number or "").strip().upper(),
+        (ch_name or "").strip().upper(),
+        director_key(director),
+    )
+
+
+def loadVerdicts(checks: Sequence[tuple], max_age_hours: Optional[float] = None) -> dict[tuple, CompanyValidation]:
+    """
+    Fresh stored verdicts for the given checks, keyed by verdict_key. One query for all checks.
+    """
+    keys = {verdict_key(check) for check in checks}
+    regnos = sorted({key[0] for key in keys if key[0]})
+    if not regnos:
+        return {}
+
+    max_age = verdict_max_age_hours() if max_age_hours is None else max_age_hours
+    cutoff = datetime.now() - timedelta(hours=max_age)
+    stmt = select(CompanyValidation).where(
+        CompanyValidation.regno.in_(regnos),
+        CompanyValidation.checkedat >= cutoff,
+        # stored before the address was kept (0003): check live once so the result is complete
+        CompanyValidation.address.isnot(None),
+    )
+
+    verdicts = {}
+    for row in db_query_scalars(stmt, operation_name="loadVerdicts"):
+        key = (row.regno, row.companyname, row.director)
+        if key in keys:
+            verdicts[key] = row
+    return verdicts
+
+
+def saveVerdicts(results: Sequence[tuple[tuple, Dict[str, Any]]], checked_at: Optional[datetime] = None) -> bool:
+    """
+    Store (check, validateCH result) pairs, replacing any earlier verdict for the same check.
+    """
+    if not results:
+        return True
+
+    checked_at = checked_at or datetime.now()
+    regnos = sorted({verdict_key(check)[0] for check, _ in results})
+    stmt = select(CompanyValidation).where(CompanyValidation.regno.in_(regnos))
+    existing = {(row.regno, row.companyname, row.director): row
+                for row in db_query_scalars(stmt, operation_name="saveVerdicts.fetch")}
+
+    for check, result in results:
+        key = verdict_key(check)
+        row = existing.get(key)
+        if row is None:
+            row = CompanyValidation(regno=key[0], companyname=key[1], director=key[2])
+            db_add(row)
+            existing[key] = row
+        row.valid = bool(result.get("Valid", False))
+        row.narrative = (result.get("Narrative") or "")[:500]
+        row.isdirector = bool(result.get("Is Director", False))
+        row.jurisdiction = result.get("Jurisdiction")
+        row.status = result.get("Status")
+        row.address = (result.get("Address") or "")[:500]
+        row.checkedat = checked_at
+
+    return db_commit(operation_name="saveVerdicts")
+
+
+def loadWatchedCompanies() -> Optional[set[str]]:
+    """
+    Company numbers we hold verdicts for - the companies worth tracking for changes.
+    None when the database could not be read, which is not the same as watching nothing.
+    """
+    stmt = select(CompanyValidation.regno).distinct()
+    regnos = _run_with_db_retry(
+        action=lambda: db.session.execute(stmt).scalars().all(),
+        operation_name="loadWatchedCompanies",
+        default=None,
+    )
+    if regnos is None:
+        return None
+    return {regno for regno in regnos if regno}
+
+
+def invalidateVerdicts(company_numbers: Sequence[str]) -> Optional[int]:
+    """
+    Mark stored verdicts for these companies as stale so the next validateC7 checks live.
+    The rows are kept so the companies stay watched. Returns rows invalidated, or None
+    when the update failed.
+    """
+    regnos = sorted({(n or "").strip().upper() for n in company_numbers} - {""})
+    if not regnos:
+        return 0
+
+    def action() -> int:
+        count = db.session.execute(
+            update(CompanyValidation).where(CompanyValidation.regno.in_(regnos)).values(checkedat=None)
+        ).rowcount
+        db.session.commit()
+        return count
+
+    return _run_with_db_retry(action=action, operation_name="invalidateVerdicts", default=None)
+
+
+def verdict_result(row: CompanyValidation) -> Dict[str, Any]:
+    """ Stored verdict in the shape returned by validateCH, plus when it was checked """
+    return {
+        "Valid": bool(row.valid),
+        "Narrative": row.narrative or "",
+        "CompanyNumber": row.regno,
+        "Address": row.address or "",
+        "Is Director": bool(row.isdirector),
+        "Director": row.director or None,
+        "Jurisdiction": row.jurisdiction,
+        "Status": row.status,
+        "CheckedAt": row.checkedat,
+    }
+
+
+def validateCHStored(checks: Sequence[tuple]) -> list[Dict[str, Any]]:
+    """
+    validateCHMany that answers from fresh stored verdicts where it can. Checks without
+    one are validated live and the results written back. Results keep check order.
+    """
+    if not checks:
+        return []
+
+    stored = loadVerdicts(checks)
+    results: list[Optional[Dict[str, Any]]] = [None] * len(checks)
+    live = []
+    for i, check in enumerate(checks):
+        row = stored.get(verdict_key(check))
+        if row is not None:
+            results[i] = verdict_result(row)
+        else:
+            live.append(i)
+
+    record_cache("ch_verdicts", hits=len(checks) - len(live), misses=len(live))
+    log.debug("validateCHStored: %s stored, %s live", len(checks) - len(live), len(live))
+
+    if live:
+        live_results = validateCHMany([checks[i] for i in live])
+        for i, result in zip(live, live_results):
+            results[i] = result
+        saveVerdicts([(checks[i], result) for i, result in zip(live, live_results)])
+
+    return [r for r in results if r is not None]
+
+
+# -----------------------------
+# Batch revalidation
+# -----------------------------
+def gatherActiveChecks(max_workers: int = 4) -> list[tuple]:
+    """
+    validateCH checks for every active placement: the service provider's limited
+    company with the candidate as director, and the client company. De-duplicated.
+    """
+    placements = getC7ActivePlacements()
+    candidate_ids = sorted({p.get("CandidateId") or p.get("CandidateID") for p in placements} - {None, 0, ""})
+    company_ids = sorted({p.get("CompanyId") or p.get("CompanyID") for p in placements} - {None, 0, ""})
+
+    log.debug("gatherActiveChecks: %s active placements, %s candidates, %s clients", len(placements), len(candidate_ids), len(company_ids))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gatherActiveChecks") as executor:
+        candidates = list(executor.map(lambda cid: getC7Candidate(cid, ch_lookup=False), candidate_ids))
+        companies = list(executor.map(getC7Company, company_ids))
+
+    checks = {}
+    for candidate in candidates:
+        if candidate.get("registration_number") and candidate.get("ltd_name"):
+            check = (candidate["registration_number"].strip(), candidate["ltd_name"].strip(), formatName(candidate.get("name", "")))
+            checks.setdefault(verdict_key(check), check)
+    for company in companies:
+        regno = company.get("CUSTOM_Company Registration Number")
+        if regno and company.get("CompanyName"):
+            check = (regno.strip(), company["CompanyName"].strip())
+            checks.setdefault(verdict_key(check), check)
+
+    return list(checks.values())
+
+
+def revalidate(checks: Sequence[tuple], rate: Optional[float] = None, max_workers: int = 4) -> dict[str, int]:
+    """
+    Run validateCH for each check concurrently, no faster than `rate` checks per second,
+    and store the verdicts. Checks that raise are counted as errors and keep their old verdict.
+    """
+    limiter = RateLimiter(rate or checks_per_second())
+
+    def run(check):
+        limiter.acquire()
+        try:
+            return validateCH(*check)
+        except Exception as e:
+            log.debug("revalidate: %s failed: %s", check[0], e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="revalidate") as executor:
+        outcomes = list(executor.map(run, checks))
+
+    results = [(check, result) for check, result in zip(checks, outcomes) if result is not None]
+    saveVerdicts(results)
+
+    return {
+        "checked": len(results),
+        "invalid": sum(1 for _, result in results if not result.get("Valid", False)),
+        "errors": len(checks) - len(results),
+    }
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+@click.command("ch-revalidate")
+@click.option("--rate", type=float, default=None, help="Checks per second; defaults to CH_BATCH_CHECKS_PER_SECOND.")
+@click.option("--workers", type=int, default=4, show_default=True, help="Concurrent checks.")
+@click.option("--wait", type=int, default=300, show_default=True, help="Seconds to wait for the database to wake.")
+def ch_revalidate_command(rate, workers, wait):
+    """Revalidate every active placement's companies against Companies House and store the verdicts."""
+    waited = 0
+    while not is_database_connected() and waited < wait:
+        time.sleep(5)
+        waited += 5
+    if not is_database_connected():
+        raise click.ClickException("Database not available")
+
+    checks = gatherActiveChecks(max_workers=workers)
+    summary = revalidate(checks, rate=rate, max_workers=workers)
+    click.echo(f"Checked {summary['checked']} companies: {summary['invalid']} failed validation, {summary['errors']} errors")
@@ -0,0 +1,383 @@
+# chindex.py - local Companies House index
+# Built from the free bulk "Company data product" snapshot so that name searches (searchCH)
+# and profile lookups that only need basic details (getCHRecord(use_index=True), e.g. the
+# jurisdiction) can be answered without a round trip to the live API. validateCH does not
+# use it for the profile: the bulk data lacks the dispute and insolvency-history flags.
+from __future__ import annotations
+import csv
+import io
+import os
+import re
+import sqlite3
+import threading
+import zipfile
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional
+
+import click
+
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[str] = None
+_conn_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS company (
+    company_number TEXT PRIMARY KEY,
+    company_name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    company_status TEXT,
+    company_category TEXT,
+    address_snippet TEXT,
+    jurisdiction TEXT,
+    accounts_next_due TEXT,
+    returns_next_due TEXT,
+    confstmt_next_due TEXT,
+    mortgage_charges INTEGER,
+    as_of TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_company_name_key ON company (name_key);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Bulk CSV status text -> live API company_status
+_STATUS_MAP = {
+    "active": "active",
+    "active - proposal to strike off": "active",
+    "in administration": "administration",
+    "administration order": "administration",
+    "administrative receiver": "receivership",
+    "receiver action": "receivership",
+    "receivership": "receivership",
+    "liquidation": "liquidation",
+    "voluntary arrangement": "voluntary-arrangement",
+    "insolvency proceedings": "insolvency-proceedings",
+    "dissolved": "dissolved",
+    "converted/closed": "converted-closed",
+}
+
+_INSOLVENCY_STATUSES = {"administration", "receivership", "liquidation", "voluntary-arrangement", "insolvency-proceedings"}
+
+_SCOTTISH_PREFIXES = ("SC", "SO", "SL", "SZ", "SA", "SF", "SP", "SR", "SE", "SG")
+_NI_PREFIXES = ("NI", "NC", "NF", "NL", "NR", "NO", "NP", "NA", "R0")
+
+
+# -----------------------------
+# Configuration
+# -----------------------------
+def index_path() -> str:
+    default = os.path.join(os.path.dirname(__file__), "instance", "ch_index.db")
+    return os.environ.get("CH_INDEX_PATH", default)
+
+
+def max_age_days() -> int:
+    return int(os.environ.get("CH_INDEX_MAX_AGE_DAYS", "35"))
+
+
+# -----------------------------
+# Normalisation
+# -----------------------------
+def normalise_company_name(name: str) -> str:
+    """
+    Lookup key for a company name: upper case, punctuation removed, whitespace collapsed
+    and LTD folded to LIMITED (callers still compare the real title exactly).
+    """
+    key = (name or "").upper().replace("&", " AND ")
+    key = re.sub(r"[^A-Z0-9 ]+", " ", key)
+    key = re.sub(r"\bLTD\b", "LIMITED", key)
+    key = re.sub(r"\bPLC\b", "PUBLIC LIMITED COMPANY", key)
+    return " ".join(key.split())
+
+
+def jurisdiction_for(company_number: str) -> str:
+    number = (company_number or "").upper()
+    if number.startswith(_SCOTTISH_PREFIXES):
+        return "scotland"
+    if number.startswith(_NI_PREFIXES):
+        return "northern-ireland"
+    return "england-wales"
+
+
+def _iso_date(value: str) -> Optional[str]:
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").date().isoformat()
+    except ValueError:
+        return None
+
+
+# -----------------------------
+# Connections
+# -----------------------------
+def _query(sql: str, params: tuple) -> list[sqlite3.Row]:
+    """
+    Run a read against the index; empty when no index has been built.
+    One shared read-only connection serves every thread (validateCH looks
+    companies up from worker threads), so access is serialised by a lock.
+    """
+    global _conn, _conn_path
+
+    path = index_path()
+    with _conn_lock:
+        if _conn is None or _conn_path != path:
+            if not os.path.exists(path):
+                return []
+            if _conn is not None:
+                _conn.close()
+            _conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            _conn.row_factory = sqlite3.Row
+            _conn_path = path
+        return _conn.execute(sql, params).fetchall()
+
+
+def writable_connection(path: Optional[str] = None) -> sqlite3.Connection:
+    path = path or index_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # the stream consumer and ingest may write at the same time
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+# -----------------------------
+# Ingest
+# -----------------------------
+def _open_csv(path: str) -> Iterator[dict]:
+    """
+    Stream rows from the bulk CSV, or from the CSV inside the published zip.
+    The bulk header has stray leading spaces on some column names.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            name = next(n for n in zf.namelist() if n.lower().endswith(".csv"))
+            with zf.open(name) as raw:
+                yield from _read_rows(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as fh:
+            yield from _read_rows(fh)
+
+
+def _read_rows(fh) -> Iterator[dict]:
+    reader = csv.reader(fh)
+    header = [h.strip() for h in next(reader)]
+    for values in reader:
+        yield dict(zip(header, values))
+
+
+def _address_snippet(row: dict) -> str:
+    parts = [
+        row.get("RegAddress.CareOf"), row.get("RegAddress.POBox"),
+        row.get("RegAddress.AddressLine1"), row.get("RegAddress.AddressLine2"),
+        row.get("RegAddress.PostTown"), row.get("RegAddress.County"),
+        row.get("RegAddress.Country"), row.get("RegAddress.PostCode"),
+    ]
+    return ", ".join(p.strip() for p in parts if p and p.strip())
+
+
+def _to_index_row(row: dict, as_of: str) -> Optional[tuple]:
+    number = (row.get("CompanyNumber") or "").strip().upper()
+    name = (row.get("CompanyName") or "").strip()
+    if not number or not name:
+        return None
+    status = (row.get("CompanyStatus") or "").strip().lower()
+    try:
+        charges = int(row.get("Mortgages.NumMortCharges") or 0)
+    except ValueError:
+        charges = 0
+    return (
+        number,
+        name,
+        normalise_company_name(name),
+        _STATUS_MAP.get(status, status.replace(" ", "-")),
+        (row.get("CompanyCategory") or "").strip(),
+        _address_snippet(row),
+        jurisdiction_for(number),
+        _iso_date(row.get("Accounts.NextDueDate", "")),
+        _iso_date(row.get("Returns.NextDueDate", "")),
+        _iso_date(row.get("ConfStmtNextDueDate", "")),
+        charges,
+        as_of,
+    )
+
+
+def snapshot_date_from_filename(path: str) -> Optional[str]:
+    """ BasicCompanyDataAsOneFile-2025-10-01.zip -> 2025-10-01 """
+    match = re.search(r"(\d{4}-\d{2}-\d{2})", os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def ingest(csv_path: str, snapshot_date: Optional[str] = None, db_path: Optional[str] = None,
+           batch_size: int = 10000) -> int:
+    """
+    Stream the bulk CSV into the index, replacing existing entries. Returns rows written.
+    """
+    as_of = snapshot_date or snapshot_date_from_filename(csv_path) or date.today().isoformat()
+    conn = writable_connection(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    insert_sql = "INSERT OR REPLACE INTO company VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    written = 0
+    batch = []
+    try:
+        for row in _open_csv(csv_path):
+            index_row = _to_index_row(row, as_of)
+            if index_row is None:
+                continue
+            batch.append(index_row)
+            if len(batch) >= batch_size:
+                conn.executemany(insert_sql, batch)
+                written += len(batch)
+                batch.clear()
+                log.debug("chindex.ingest: %s companies written", written)
+        if batch:
+            conn.executemany(insert_sql, batch)
+            written += len(batch)
+
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('snapshot_date', ?)", (as_of,))
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('ingested_at', ?)", (datetime.now().isoformat(timespec="seconds"),))
+        conn.commit()
+    finally:
+        conn.close()
+
+    return written
+
+
+# -----------------------------
+# Updates from the live API / streaming API
+# -----------------------------
+def _profile_address_snippet(address: dict) -> str:
+    parts = [
+        address.get("care_of"), address.get("po_box"), address.get("premises"),
+        address.get("address_line_1"), address.get("address_line_2"), address.get("locality"),
+        address.get("region"), address.get("country"), address.get("postal_code"),
+    ]
+    return ", ".join(p.strip() for p in parts if p and p.strip())
+
+
+def upsertProfile(conn: sqlite3.Connection, profile: dict, as_of: str) -> bool:
+    """
+    Replace a company's index entry with a live /company/{number} profile. Not committed.
+    """
+    number = (profile.get("company_number") or "").strip().upper()
+    name = (profile.get("company_name") or "").strip()
+    if not number or not name:
+        return False
+    conn.execute(
+        "INSERT OR REPLACE INTO company VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            number,
+            name,
+            normalise_company_name(name),
+            profile.get("company_status"),
+            profile.get("type"),
+            _profile_address_snippet(profile.get("registered_office_address") or {}),
+            profile.get("jurisdiction") or jurisdiction_for(number),
+            (profile.get("accounts") or {}).get("next_due"),
+            (profile.get("annual_return") or {}).get("next_due"),
+            (profile.get("confirmation_statement") or {}).get("next_due"),
+            1 if profile.get("has_charges") else 0,
+            as_of,
+        ),
+    )
+    return True
+
+
+def deleteCompany(conn: sqlite3.Connection, company_number: str) -> None:
+    """ Drop a company's index entry so lookups fall back to the live API. Not committed. """
+    conn.execute("DELETE FROM company WHERE company_number = ?", ((company_number or "").strip().upper(),))
+
+
+# -----------------------------
+# Lookups
+# -----------------------------
+def _is_fresh(row: sqlite3.Row) -> bool:
+    try:
+        as_of = date.fromisoformat(row["as_of"][:10])
+    except (TypeError, ValueError):
+        return False
+    return as_of >= date.today() - timedelta(days=max_age_days())
+
+
+def _overdue(iso_date: Optional[str]) -> bool:
+    return bool(iso_date) and iso_date < date.today().isoformat()
+
+
+def getIndexedRecord(company_number: str) -> Optional[dict]:
+    """
+    Company profile shaped like the live /company/{number} response, or None when the
+    company is not indexed or its entry is stale.
+    The bulk data has no officers, dispute or insolvency-history flags; insolvency
+    history is inferred from the current status only, so this must not be used to
+    validate a company (see getCHRecord).
+    """
+    rows = _query(
+        "SELECT * FROM company WHERE company_number = ?",
+        ((company_number or "").strip().upper(),),
+    )
+    if not rows or not _is_fresh(rows[0]):
+        return None
+
+    row = rows[0]
+    status = row["company_status"]
+    return {
+        "company_name": row["company_name"],
+        "company_number": row["company_number"],
+        "company_status": status,
+        "type": row["company_category"],
+        "jurisdiction": row["jurisdiction"],
+        "registered_office_address": {"address_snippet": row["address_snippet"]},
+        "accounts": {"next_due": row["accounts_next_due"], "overdue": _overdue(row["accounts_next_due"])},
+        "annual_return": {"next_due": row["returns_next_due"], "overdue": _overdue(row["returns_next_due"])},
+        "confirmation_statement": {"next_due": row["confstmt_next_due"], "overdue": _overdue(row["confstmt_next_due"])},
+        "has_charges": (row["mortgage_charges"] or 0) > 0,
+        "has_been_liquidated": status == "liquidation",
+        "has_insolvency_history": status in _INSOLVENCY_STATUSES,
+        "source": "index",
+        "as_of": row["as_of"],
+    }
+
+
+def searchIndex(company_name: str) -> list[dict]:
+    """
+    Search items shaped like the live /search/companies response for fresh entries
+    whose normalised name matches. Empty when nothing local matches.
+    """
+    rows = _query(
+        "SELECT * FROM company WHERE name_key = ?",
+        (normalise_company_name(company_name),),
+    )
+
+    return [
+        {
+            "title": row["company_name"],
+            "company_number": row["company_number"],
+            "company_status": row["company_status"],
+            "address_snippet": row["address_snippet"],
+            "source": "index",
+        }
+        for row in rows
+        if _is_fresh(row)
+    ]
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+@click.command("ch-ingest")
+@click.argument("csv_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--snapshot-date", default=None, help="Date of the snapshot (YYYY-MM-DD); defaults to the date in the file name.")
+@click.option("--db", "db_path", default=None, help="Index file to write; defaults to CH_INDEX_PATH.")
+def ch_ingest_command(csv_path, snapshot_date, db_path):
+    """Load a Companies House bulk company data CSV (or zip) into the local index."""
+    written = ingest(csv_path, snapshot_date=snapshot_date, db_path=db_path)
+    click.echo(f"Indexed {written} companies into {db_path or index_path()}")
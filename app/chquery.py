@@ -1,17 +1,36 @@
 from __future__ import annotations
 import requests, json
-from app.helper import load_config, formatName, debugMode
-from typing import Optional, Dict, Any
+from app.helper import load_config, formatName
+from app.metrics import call_dependency, register_cache
+from app.tracing import in_context, traced
+from typing import Optional, Dict, Any, Sequence
 import os
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from app.keyvault import get_secret
+from app.namematch import best_match
+from app.chindex import getIndexedRecord, searchIndex
+from app.log import get_logger
 
+log = get_logger(__name__)
 
-def getCHRecord(companyNo):
+
+@traced
+def getCHRecord(companyNo, use_index: bool = False):
+    """
+    The Companies House company profile. Pass use_index=True to accept the local
+    bulk-data index entry when there is a fresh one: it has no registered-office dispute
+    flag or insolvency history, so validateCH always reads the live profile.
+    """
     
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getCHRecord: Fetching record for CompanyNo {companyNo}")
+    log.debug("getCHRecord: Fetching record for CompanyNo %s", companyNo)
     
+    if use_index:
+        # returns None for unknown or stale entries
+        indexed = getIndexedRecord(companyNo)
+        if indexed:
+            return indexed
+
     subscription_key = os.environ.get("CH_KEY", None)
     
     if not subscription_key:
@@ -23,7 +42,7 @@ def getCHRecord(companyNo):
 
     if isinstance(subscription_key, dict):
         subscription_key = subscription_key.get("CH_KEY", "")
-    response = requests.get(url, auth=(subscription_key, ""))
+    response = call_dependency("CH", requests.get, url, auth=(subscription_key, ""))
 
     if response.status_code == 200:
         return response.json()
@@ -31,10 +50,15 @@ def getCHRecord(companyNo):
         raise Exception(f"Error: {response.status_code} - {response.text}")
 
 
+@traced
 def searchCH(companyName):
 
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} searchCH: Searching for company '{companyName}'")
+    log.debug("searchCH: Searching for company '%s'", companyName)
+
+    # Callers only use exact name matches, which the local index can answer
+    indexed_items = searchIndex(companyName)
+    if indexed_items:
+        return {"items": indexed_items}
 
     subscription_key = os.environ.get("CH_KEY", None)
     if not subscription_key:
@@ -46,29 +70,38 @@ def searchCH(companyName):
 
     if isinstance(subscription_key, dict):
         subscription_key = subscription_key.get("CH_KEY", "")
-    response = requests.get(url, auth=(subscription_key, ""))
+    response = call_dependency("CH", requests.get, url, auth=(subscription_key, ""))
 
     if response.status_code == 200:
         return response.json()
     else:
         raise Exception(f"Error: {response.status_code} - {response.text}")
-    
 
+
+@traced
+def getCHOfficers(companyNo):
+
+    log.debug("getCHOfficers: Fetching active officers for CompanyNo %s", companyNo)
+
+    subscription_key = get_secret("CHKEY")
+
+    sCompanyNo = companyNo.strip()
+    url = f"https://api.company-information.service.gov.uk/company/{sCompanyNo}/officers?filter=active"
+
+    response = call_dependency("CH", requests.get, url, auth=(subscription_key, ""))
+    response.raise_for_status()
+    return response.json()
+
+
+@traced
 def validateCH(ch_number: str, ch_name: str, director: Optional[str] = None) -> Dict[str, Any]:
     """
     Validate a Companies House entry and (optionally) confirm a director.
-    Returns a dict with keys: Valid, Narrative, CompanyNumber, Is Director, Director, Jurisdiction, Status.
+    Returns a dict with keys: Valid, Narrative, CompanyNumber, Address, Is Director, Director, Jurisdiction, Status.
     """
     
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} validateCH: Validating company '{ch_name}' with number '{ch_number}' and director '{director}'")
+    log.debug("validateCH: Validating company '%s' with number '%s' and director '%s'", ch_name, ch_number, director)
     
-    # --- config --------------------------------------------------------------
-    subscription_key = get_secret("CHKEY")
-    name_prefix = get_secret("NAMEAPI-KEYPREFIX")
-    name_suffix = get_secret("NAMEAPI-KEYSUFFIX")
-    nameapi_key = f"{name_prefix}-{name_suffix}"
-        
     # --- helpers -------------------------------------------------------------
     def make_result(*, valid: bool, narrative: str = "", is_director: bool = False,
                     jurisdiction: Optional[str] = None, status: Optional[str] = None) -> Dict[str, Any]:
@@ -102,8 +135,17 @@ def validateCH(ch_number: str, ch_name: str, director: Optional[str] = None) ->
     reg_address = ""
     director_input = director.strip().upper() if director else None
 
+    # The name search, company profile and officers list are independent, so
+    # start all three now; each check below waits only on the lookup it needs.
+    # shutdown(wait=False) lets an early return skip waiting on the others.
+    executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="validateCH")
+    search_future = executor.submit(in_context(searchCH), ltd_name_input)
+    record_future = executor.submit(in_context(getCHRecord), reg_number)
+    officers_future = executor.submit(in_context(getCHOfficers), reg_number) if director_input else None
+    executor.shutdown(wait=False)
+
     # --- 1) find the company by name + number -------------------------------
-    ch_result = searchCH(ltd_name_input)
+    ch_result = search_future.result()
     items = ch_result.get("items", [])
 
     match = next(
@@ -124,7 +166,7 @@ def validateCH(ch_number: str, ch_name: str, director: Optional[str] = None) ->
     reg_address = match.get("address_snippet")
 
     # --- 2) pull full record and check status -------------------------------
-    company_record = getCHRecord(reg_number)
+    company_record = record_future.result()
     jurisdiction = company_record.get("jurisdiction")
     company_status = company_record.get("company_status")    
     if company_status != "active":
@@ -161,10 +203,7 @@ def validateCH(ch_number: str, ch_name: str, director: Optional[str] = None) ->
 
         search_director = formatName(director_input) 
 
-        officers_url = f"https://api.company-information.service.gov.uk/company/{reg_number}/officers?filter=active"
-        resp = requests.get(officers_url, auth=(subscription_key, ""))
-        resp.raise_for_status()
-        officers_json = resp.json()
+        officers_json = officers_future.result()
 
         is_director = False
         arr_officers = []
@@ -178,40 +217,15 @@ def validateCH(ch_number: str, ch_name: str, director: Optional[str] = None) ->
             arr_officers.append({"string": formatted, "fieldType": "FULLNAME"})
 
         if arr_officers:
-            nameapi_url = f"https://api.nameapi.org/rest/v5.3/matcher/personmatcher?apiKey={nameapi_key}"
-            body_dict = {
-                "context": {
-                    "priority": "REALTIME",
-                    "properties": []
-                },
-                "inputPerson1": {
-                    "type": "NaturalInputPerson",
-                    "personName": {
-                        "nameFields": [
-                            {
-                                "string": search_director,
-                                "fieldType": "FULLNAME"
-                            }
-                        ]
-                    }
-                },
-                "inputPerson2": {
-                    "type": "NaturalInputPerson",
-                    "personName": {
-                        "nameFields": arr_officers  # <-- should be a list of dicts
-                    }
-                }
-            }
-            header_dict = {
-                "Content-Type": "application/json"
-            }
+            # Settle exact / trivially different names locally, only ask NameAPI when unsure
+            local_match = best_match(search_director, [o["string"] for o in arr_officers])
+            log.debug("validateCH: Local name match for '%s': %s (%s)", search_director, local_match.match_type, local_match.confidence)
 
-            nameapi_body = json.dumps(body_dict)
-            nameapi_response = requests.post(nameapi_url, data=nameapi_body, headers=header_dict)
-            nameapi_response.raise_for_status() 
-            nameapi_result = nameapi_response.json()
-
-            is_director = nameapi_result.get("matchType") in "EQUAL,MATCHING,SIMILAR,RELATION" # Tech Debt: may need to remove RELATION ?
+            if local_match.decisive:
+                is_director = local_match.is_match
+            else:
+                match_type = matchNameAPI(search_director, tuple(o["string"] for o in arr_officers))
+                is_director = match_type in NAMEAPI_MATCH_TYPES
 
         if not is_director:
             return make_result(
@@ -228,13 +242,83 @@ def validateCH(ch_number: str, ch_name: str, director: Optional[str] = None) ->
     return make_result(valid=True, narrative="", is_director=False, jurisdiction=jurisdiction, status=company_status)
 
 
+@traced
+def validateCHMany(checks: Sequence[tuple]) -> list[Dict[str, Any]]:
+    """
+    Run several validateCH checks at once.
+    Each check is a (ch_number, ch_name[, director]) tuple; results come back in the same order.
+    """
+    if not checks:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix="validateCHMany") as executor:
+        futures = [executor.submit(in_context(validateCH), *check) for check in checks]
+        return [future.result() for future in futures]
+
+
+# NameAPI matchTypes that count as the same person; anything else, or no matchType, is no match
+NAMEAPI_MATCH_TYPES = {"EQUAL", "MATCHING", "SIMILAR", "RELATION"}  # Tech Debt: may need to remove RELATION ?
+
+
+@lru_cache(maxsize=512)
+def matchNameAPI(search_director: str, officer_names: tuple[str, ...]) -> str:
+    """
+    Ask the NameAPI person matcher whether search_director matches any of officer_names.
+    Returns the NameAPI matchType, or "" when the reply has none. Results are memoized
+    per (name, officers) pair.
+    """
+
+    log.debug("matchNameAPI: Matching '%s' against %s officers", search_director, len(officer_names))
+
+    name_prefix = get_secret("NAMEAPI-KEYPREFIX")
+    name_suffix = get_secret("NAMEAPI-KEYSUFFIX")
+    nameapi_key = f"{name_prefix}-{name_suffix}"
+    nameapi_url = f"https://api.nameapi.org/rest/v5.3/matcher/personmatcher?apiKey={nameapi_key}"
+    body_dict = {
+        "context": {
+            "priority": "REALTIME",
+            "properties": []
+        },
+        "inputPerson1": {
+            "type": "NaturalInputPerson",
+            "personName": {
+                "nameFields": [
+                    {
+                        "string": search_director,
+                        "fieldType": "FULLNAME"
+                    }
+                ]
+            }
+        },
+        "inputPerson2": {
+            "type": "NaturalInputPerson",
+            "personName": {
+                "nameFields": [{"string": name, "fieldType": "FULLNAME"} for name in officer_names]
+            }
+        }
+    }
+    header_dict = {
+        "Content-Type": "application/json"
+    }
+
+    nameapi_body = json.dumps(body_dict)
+    nameapi_response = call_dependency("NameAPI", requests.post, nameapi_url, data=nameapi_body, headers=header_dict)
+    nameapi_response.raise_for_status() 
+    nameapi_result = nameapi_response.json()
+
+    return nameapi_result.get("matchType") or ""
+
+
+register_cache("nameapi_match", lambda: matchNameAPI.cache_info()[:2])
+
+
+@traced
 def getCHbasics(ltd_name, reg_number):
     """
     returns registered address and jurisdiction 
     """
     
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} getCHbasics: Getting basics for company '{ltd_name}' with number '{reg_number}'")
+    log.debug("getCHbasics: Getting basics for company '%s' with number '%s'", ltd_name, reg_number)
     
     return_address = ""
     return_jurisdiction = ""
@@ -250,8 +334,8 @@ def getCHbasics(ltd_name, reg_number):
                     return_address = item.get('address_snippet')
                     break
 
-    # Use company number to get jurisdiction from CH record
-    company_record = getCHRecord(reg_number)
+    # Use company number to get jurisdiction from CH record; the index has it
+    company_record = getCHRecord(reg_number, use_index=True)
 
     # Extract jurisdiction
     found = False
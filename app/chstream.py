@@ -0,0 +1,274 @@
+# chstream.py - Companies House streaming API consumer
+# Follows the companies and officers streams so that cached data for the companies we hold
+# (local index entries and stored verdicts) is refreshed or invalidated as soon as it changes.
+from __future__ import annotations
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from typing import Iterator, Optional
+
+import click
+import requests
+from flask import current_app
+
+from app.chbatch import invalidateVerdicts, loadWatchedCompanies
+from app.chindex import deleteCompany, upsertProfile, writable_connection
+from app.keyvault import get_secret
+from app.log import get_logger
+from app.metrics import call_dependency
+
+log = get_logger(__name__)
+
+STREAMS = ("companies", "officers")
+
+_STREAM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stream_position (
+    stream TEXT PRIMARY KEY,
+    timepoint INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS change_event (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stream TEXT NOT NULL,
+    timepoint INTEGER,
+    company_number TEXT NOT NULL,
+    resource_kind TEXT,
+    event_type TEXT,
+    published_at TEXT,
+    action TEXT NOT NULL,
+    recorded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_change_event_company ON change_event (company_number);
+"""
+
+class TimepointExpired(Exception):
+    """ The stream no longer holds the resume point, so the events since then are lost """
+
+    def __init__(self, stream: str, timepoint: int):
+        super().__init__(f"{stream} stream no longer holds timepoint {timepoint}")
+        self.stream = stream
+        self.timepoint = timepoint
+
+
+# How often progress is committed and the watched companies reloaded
+FLUSH_INTERVAL = 5.0
+WATCH_REFRESH_INTERVAL = 300.0
+
+
+# -----------------------------
+# Configuration
+# -----------------------------
+def stream_base_url() -> str:
+    return os.environ.get("CH_STREAM_URL", "https://stream.companieshouse.gov.uk").rstrip("/")
+
+
+# -----------------------------
+# Resume points and change events
+# -----------------------------
+def stream_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """ Writable connection to the local index with the stream tables in place """
+    conn = writable_connection(db_path)
+    conn.executescript(_STREAM_SCHEMA)
+    return conn
+
+
+def loadTimepoint(conn: sqlite3.Connection, stream: str) -> Optional[int]:
+    row = conn.execute("SELECT timepoint FROM stream_position WHERE stream = ?", (stream,)).fetchone()
+    return row["timepoint"] if row else None
+
+
+def saveTimepoint(conn: sqlite3.Connection, stream: str, timepoint: int) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO stream_position VALUES (?, ?, ?)",
+        (stream, timepoint, datetime.now().isoformat(timespec="seconds")),
+    )
+
+
+def recentChanges(company_number: str, limit: int = 20, db_path: Optional[str] = None) -> list[dict]:
+    """ Most recent recorded change events for a company, newest first """
+    conn = stream_connection(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT * FROM change_event WHERE company_number = ? ORDER BY id DESC LIMIT ?",
+            ((company_number or "").strip().upper(), limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+# -----------------------------
+# Stream reading
+# -----------------------------
+def company_number_for(event: dict) -> Optional[str]:
+    """ /company/{number} or /company/{number}/appointments/{id} -> number """
+    match = re.match(r"^/company/([A-Za-z0-9]+)", event.get("resource_uri") or "")
+    return match.group(1).upper() if match else None
+
+
+def readStream(stream: str, timepoint: Optional[int] = None, heartbeats: bool = False) -> Iterator[Optional[dict]]:
+    """
+    Yield events from a stream, starting at timepoint when given. Blank heartbeat
+    lines are skipped, or yielded as None when heartbeats is set. A timepoint the
+    service no longer holds (HTTP 416) raises TimepointExpired; the caller decides how
+    to cover the gap before reading on from now.
+    """
+    key = get_secret("CHSTREAMKEY", "CH-STREAM-KEY")
+    url = f"{stream_base_url()}/{stream}"
+    params = {"timepoint": timepoint} if timepoint is not None else None
+
+    with call_dependency("CHStream", requests.get, url, params=params, auth=(key, ""), stream=True, timeout=(10, 90)) as response:
+        if response.status_code == 416 and timepoint is not None:
+            log.warning("readStream: %s stream no longer holds timepoint %s; events since then were missed",
+                        stream, timepoint, stream=stream, timepoint=timepoint)
+            raise TimepointExpired(stream, timepoint)
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+            elif heartbeats:
+                yield None
+
+
+def applyEvent(conn: sqlite3.Connection, stream: str, event: dict, company_number: str) -> str:
+    """
+    Update the local index for a company profile change and record the change event.
+    Returns the action taken; the caller invalidates stored verdicts.
+    """
+    meta = event.get("event") or {}
+    event_type = meta.get("type")
+    published_at = meta.get("published_at") or ""
+
+    action = "invalidated"
+    if stream == "companies":
+        if event_type == "deleted":
+            deleteCompany(conn, company_number)
+            action = "deleted"
+        elif upsertProfile(conn, event.get("data") or {}, published_at[:10] or date.today().isoformat()):
+            action = "updated"
+
+    conn.execute(
+        "INSERT INTO change_event (stream, timepoint, company_number, resource_kind, event_type, published_at, action, recorded_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (stream, meta.get("timepoint"), company_number, event.get("resource_kind"), event_type,
+         published_at, action, datetime.now().isoformat(timespec="seconds")),
+    )
+    return action
+
+
+def consume(stream: str, watched: Optional[set[str]] = None, once: bool = False,
+            db_path: Optional[str] = None) -> dict[str, int]:
+    """
+    Follow a stream from its saved resume point. Events for watched companies update the
+    index and invalidate stored verdicts; all others only move the resume point on.
+    watched defaults to the companies we hold verdicts for, reloaded periodically; if
+    they cannot be loaded at the start this raises rather than watching nothing.
+    Reconnects with backoff unless once is set, in which case it returns at the end of
+    the response. Progress is committed every FLUSH_INTERVAL, on events or heartbeats.
+    The resume point and the index changes are only committed once the verdicts are
+    invalidated, so an interrupted run or a database outage repeats events rather than
+    missing them. If the saved resume point has expired, the missed events cannot be
+    replayed: every watched company's verdict is invalidated instead, and the stream is
+    read from now. Until that succeeds the expired resume point is kept, so a restart
+    covers the gap again.
+    """
+    if stream not in STREAMS:
+        raise ValueError(f"Unknown stream '{stream}'")
+
+    watch_set = watched if watched is not None else loadWatchedCompanies()
+    if watch_set is None:
+        raise RuntimeError("Could not load the watched companies; is the database available?")
+    watch_loaded = time.monotonic()
+
+    conn = stream_connection(db_path)
+    timepoint = loadTimepoint(conn, stream)
+    last_flush = time.monotonic()
+    pending: set[str] = set()
+    stats = {"events": 0, "matched": 0}
+    backoff = 1.0
+
+    def flush():
+        nonlocal pending, last_flush
+        last_flush = time.monotonic()
+        if pending:
+            if invalidateVerdicts(sorted(pending)) is None:
+                # keep everything uncommitted; the next flush (or a restart) tries again
+                log.warning("consume: %s could not invalidate %s verdicts, keeping timepoint %s",
+                            stream, len(pending), loadTimepoint(conn, stream))
+                return
+            pending = set()
+        if timepoint is not None:
+            saveTimepoint(conn, stream, timepoint)
+        conn.commit()
+
+    try:
+        while True:
+            try:
+                for event in readStream(stream, None if timepoint is None else timepoint + 1, heartbeats=True):
+                    backoff = 1.0
+                    if event is not None:
+                        stats["events"] += 1
+                        company_number = company_number_for(event)
+                        if company_number and company_number in watch_set:
+                            action = applyEvent(conn, stream, event, company_number)
+                            pending.add(company_number)
+                            stats["matched"] += 1
+                            log.debug("consume: %s %s %s", stream, company_number, action)
+                        timepoint = (event.get("event") or {}).get("timepoint", timepoint)
+
+                    if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                        flush()
+                        if watched is None and time.monotonic() - watch_loaded >= WATCH_REFRESH_INTERVAL:
+                            reloaded = loadWatchedCompanies()
+                            if reloaded is None:
+                                log.warning("consume: %s could not reload the watched companies, keeping %s", stream, len(watch_set))
+                            else:
+                                watch_set = reloaded
+                            watch_loaded = time.monotonic()
+                if once:
+                    break
+            except TimepointExpired as e:
+                # any watched company may have changed in the gap
+                log.warning("consume: %s, invalidating all %s watched verdicts", e, len(watch_set))
+                pending |= watch_set
+                timepoint = None
+                flush()
+            except (requests.RequestException, ValueError) as e:
+                if once:
+                    raise
+                flush()
+                log.debug("consume: %s disconnected (%s), retrying in %.0fs", stream, e, backoff)
+                time.sleep(backoff + random.uniform(0, 1))
+                backoff = min(backoff * 2, 60.0)
+    finally:
+        flush()
+        conn.close()
+
+    return stats
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+@click.command("ch-stream")
+@click.option("--stream", "streams", multiple=True, type=click.Choice(STREAMS), help="Streams to follow; defaults to all.")
+def ch_stream_command(streams):
+    """Follow the Companies House streaming API, refreshing cached data for companies we hold."""
+    app = current_app._get_current_object()
+
+    def run(stream):
+        with app.app_context():
+            consume(stream)
+
+    threads = [threading.Thread(target=run, args=(stream,), name=f"ch-stream-{stream}", daemon=True)
+               for stream in (streams or STREAMS)]
+    for thread in threads:
+        thread.start()
+    click.echo(f"Following {', '.join(t.name for t in threads)}")
+    for thread in threads:
+        thread.join()
@@ -1,69 +1,479 @@
 # dbquery.py
-from datetime import datetime
-from flask import session
-from app.models import ServiceArrangement, ServiceStandard
-from app.helper import db_query_scalars, is_database_connected, debugMode
-from sqlalchemy import select, func
-
-def loadServiceStandards(service_id):
-
-    from app import db_engine
-    import logging
-    
-    if not is_database_connected():
-        logging.warning("loadServiceStandards: Database not connected, returning empty list")
-        if debugMode():
-            print("Database not connected yet, returning empty list")
-        return []   
-    
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} loadServiceStandards: Fetching standards for Service ID {service_id}")
-        print(f"{datetime.now().strftime('%H:%M:%S')} loadServiceStandards: service_id type: {type(service_id)}, value: '{service_id}'")
-        print(f"{datetime.now().strftime('%H:%M:%S')} loadServiceStandards: DB engine ready: {db_engine is not None}")
-    
-    logging.info(f"loadServiceStandards: Fetching standards for service_id='{service_id}'")
-    
-    if not service_id:                
-        if debugMode():
-            print(f"{datetime.now().strftime('%H:%M:%S')} loadServiceStandards: No Service ID provided")
-        return []
-    
-    # Use case-insensitive comparison for Azure SQL Server compatibility
-    stmt = select(ServiceStandard).where(func.upper(ServiceStandard.sid) == func.upper(service_id))
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} loadServiceStandards: SQL statement: {stmt}")
-    logging.info(f"loadServiceStandards: Executing query for sid='{service_id}'")
-    standards = db_query_scalars(stmt, operation_name="loadServiceStandards")
-    logging.info(f"loadServiceStandards: Query returned {len(standards) if standards else 0} records")
-
-    # Store SP standards in session for later use
-    if service_id != "CS" and standards:    
-        session['serviceStandards'] = [s.to_dict() for s in standards]
-
-    return standards
-
-
-def loadServiceArrangements(service_id):
-    
-    if not is_database_connected():
-        if debugMode():
-            print("Database not connected yet, returning empty list")
-        return []   
-    
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} loadServiceArrangements: Fetching arrangements for Service ID {service_id}")
-        from app import db_engine
-        print(f"{datetime.now().strftime('%H:%M:%S')} loadServiceArrangements: DB engine ready: {db_engine is not None}")
-    
-    if not service_id:
-        return []
-
-    # Use case-insensitive comparison for Azure SQL Server compatibility
-    stmt = select(ServiceArrangement).where(func.upper(ServiceArrangement.sid) == func.upper(service_id))
-    arrangements = db_query_scalars(stmt, operation_name="loadServiceArrangements")
-
-    # Store arrangements in session for later use
-    if arrangements:
-        session['serviceArrangements'] = [a.to_dict() for a in arrangements]
-
-    return arrangements
\ No newline at end of file
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from flask import has_request_context
+from app.models import ServiceArrangement, ServiceContract, ServiceStandard
+from app import db, metrics, replica
+from app.helper import _run_with_db_retry, db_query_all, is_database_connected
+from app.log import get_logger
+from sqlalchemy import select, insert, update, literal_column, null, cast, union_all, String
+
+log = get_logger(__name__)
+
+def normalise_sid(service_id) -> str:
+    """ The value held in the persisted sid_norm column for a given SID """
+    return (service_id or "").strip().upper()
+
+
+def sid_matches(model, service_id):
+    """
+    Sargable case-insensitive SID filter. Compares the indexed sid_norm column with a
+    VARCHAR parameter (an NVARCHAR one would force a conversion and a scan).
+    """
+    return model.sid_norm == cast(normalise_sid(service_id), String(10))
+
+
+class ServiceBundle(NamedTuple):
+    """
+    Everything held for a service ID, as dicts shaped like the models' to_dict().
+    cs_standards is only populated when requested (the SP exports need both sets).
+    """
+    sid: str
+    standards: list[dict]
+    arrangements: list[dict]
+    contract: Optional[dict]
+    cs_standards: list[dict]
+
+
+def _bundle_select(kind: str, model, pk, columns: list, service_id: str):
+    # every branch of the UNION has the same layout: kind, id, sid, c1..c5 (VARCHAR(max) on SQL Server)
+    values = [cast(c, String()) for c in columns] + [cast(null(), String())] * (5 - len(columns))
+    return select(
+        literal_column(f"'{kind}'").label("kind"),
+        pk.label("id"),
+        model.sid.label("sid"),
+        *[v.label(f"c{i}") for i, v in enumerate(values, start=1)],
+    ).where(sid_matches(model, service_id))
+
+
+# -----------------------------
+# Read-through cache for service data
+# -----------------------------
+# Each worker keeps a bounded LRU of (standards, arrangements, contract) per normalised
+# SID. Writes bump a per-SID version stamp file in a directory shared by all workers,
+# so an entry is only used while its stamp is unchanged (and for at most the TTL).
+_sid_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_sid_cache_lock = threading.Lock()
+_sid_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def cache_max_entries() -> int:
+    return int(os.environ.get("SID_CACHE_MAX_ENTRIES", "256"))
+
+
+def cache_ttl_seconds() -> float:
+    # safety net for changes made outside the app
+    return float(os.environ.get("SID_CACHE_TTL", "600"))
+
+
+def cache_version_dir() -> str:
+    default = os.path.join(os.path.dirname(__file__), "instance", "sid_versions")
+    return os.environ.get("SID_CACHE_DIR", default)
+
+
+def _version_path(sid_norm: str) -> str:
+    safe = re.sub(r"[^A-Z0-9_-]", "_", sid_norm) or "_"
+    return os.path.join(cache_version_dir(), f"{safe}.version")
+
+
+def _cache_version(sid_norm: str) -> tuple:
+    try:
+        stat = os.stat(_version_path(sid_norm))
+    except FileNotFoundError:
+        return (0, 0)
+    # replaced atomically on every bump, so the inode changes even within one mtime tick
+    return (stat.st_mtime_ns, stat.st_ino)
+
+
+def _cache_get(sid_norm: str, version: tuple) -> Optional[tuple]:
+    with _sid_cache_lock:
+        entry = _sid_cache.get(sid_norm)
+        if entry and entry[0] == version and time.monotonic() - entry[1] < cache_ttl_seconds():
+            _sid_cache.move_to_end(sid_norm)
+            _sid_cache_stats["hits"] += 1
+            return entry[2]
+        _sid_cache_stats["misses"] += 1
+        return None
+
+
+def _cache_put(sid_norm: str, version: tuple, data: tuple) -> None:
+    with _sid_cache_lock:
+        _sid_cache[sid_norm] = (version, time.monotonic(), data)
+        _sid_cache.move_to_end(sid_norm)
+        while len(_sid_cache) > cache_max_entries():
+            _sid_cache.popitem(last=False)
+            _sid_cache_stats["evictions"] += 1
+
+
+def invalidateServiceCache(service_id) -> None:
+    """
+    Drop cached data for a SID in this worker and, by bumping its version stamp, in
+    every other worker. Call after committing a change to its standards, arrangements
+    or contract record.
+    """
+    sid_norm = normalise_sid(service_id)
+    path = _version_path(sid_norm)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as fh:
+            fh.write(f"{time.time_ns()}\n")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.error(f"invalidateServiceCache: could not bump version for {sid_norm}: {e}")
+
+    with _sid_cache_lock:
+        _sid_cache.pop(sid_norm, None)
+        _sid_cache_stats["invalidations"] += 1
+
+    # and the current request's memoized bundle, so the route re-reads what it just saved
+    if has_request_context():
+        from app.loader import get_loader
+        get_loader().invalidate(sid_norm)
+
+    # keep the read-replica in step with every commit (the fetch writes through to it)
+    if replica.replica_enabled() and is_database_connected():
+        _fetchServiceData([sid_norm])
+
+
+def clearServiceCache() -> None:
+    """ Empty this worker's cache (version stamps are left alone) """
+    with _sid_cache_lock:
+        _sid_cache.clear()
+
+
+def serviceCacheStats() -> dict:
+    with _sid_cache_lock:
+        return {**_sid_cache_stats, "entries": len(_sid_cache), "max_entries": cache_max_entries()}
+
+
+metrics.register_cache("service_bundle", lambda: (_sid_cache_stats["hits"], _sid_cache_stats["misses"]))
+
+
+def _query_all(stmt, operation_name: str, default: list) -> list:
+    """ db_query_all, or the same query against the read-replica while it is serving """
+    if replica.is_serving():
+        return replica.execute_all(stmt)
+    return db_query_all(stmt, operation_name=operation_name, default=default)
+
+
+def _fetchServiceData(sid_norms: list[str]) -> Optional[dict[str, tuple]]:
+    """
+    Standards, arrangements and contract for each SID in a single round trip: one UNION
+    ALL query whose kind column says which table each row came from.
+    Returns sid_norm -> (standards, arrangements, contract), or None if the query failed.
+    """
+    selects = []
+    for sid_norm in sid_norms:
+        selects += [
+            _bundle_select("standard", ServiceStandard, ServiceStandard.stdid,
+                           [ServiceStandard.ssn, ServiceStandard.description], sid_norm),
+            _bundle_select("arrangement", ServiceArrangement, ServiceArrangement.arrid,
+                           [ServiceArrangement.day, ServiceArrangement.defaultserviceperiod, ServiceArrangement.atservicebase,
+                            ServiceArrangement.atclientlocation, ServiceArrangement.atotherlocation], sid_norm),
+            _bundle_select("contract", ServiceContract, ServiceContract.conid,
+                           [ServiceContract.specialconditions, ServiceContract.context], sid_norm),
+        ]
+
+    failed: list = []
+    stmt = union_all(*selects)
+    rows = _query_all(stmt.order_by(stmt.selected_columns.kind, stmt.selected_columns.id),
+                      operation_name="loadServiceBundle", default=failed)
+    if rows is failed:
+        return None
+
+    data = {sid_norm: ([], [], []) for sid_norm in sid_norms}
+    for row in rows:
+        standards, arrangements, contracts = data[normalise_sid(row["sid"])]
+        kind = row["kind"]
+        if kind == "standard":
+            standards.append({"stdid": row["id"], "sid": row["sid"], "ssn": row["c1"], "description": row["c2"]})
+        elif kind == "arrangement":
+            arrangements.append({
+                "arrid": row["id"], "sid": row["sid"], "day": row["c1"], "defaultserviceperiod": row["c2"],
+                "atservicebase": row["c3"], "atclientlocation": row["c4"], "atotherlocation": row["c5"],
+            })
+        elif kind == "contract":
+            contracts.append({"conid": row["id"], "sid": row["sid"], "specialconditions": row["c1"], "context": row["c2"]})
+
+    fetched = {sid_norm: (standards, arrangements, contracts[0] if contracts else None)
+               for sid_norm, (standards, arrangements, contracts) in data.items()}
+    if replica.replica_enabled() and not replica.is_serving():
+        replica.storeServiceData(fetched)
+    return fetched
+
+
+def loadServiceBundle(service_id, include_cs: bool = False, use_cache: bool = True) -> ServiceBundle:
+    """
+    Load standards, arrangements and the contract record for a service ID (plus the CS
+    standards when include_cs is set). Served from the cache where the entry is current;
+    whatever is missing is fetched in a single round trip and cached.
+    Pass use_cache=False to read straight from the database (e.g. before a write).
+    While the read-replica is serving, everything comes from it and nothing is cached.
+    """
+    sid = (service_id or "").strip()
+    sid_norm = normalise_sid(sid)
+    wanted = [s for s in dict.fromkeys([sid_norm] + (["CS"] if include_cs else [])) if s]
+    if not wanted:
+        return ServiceBundle(sid, [], [], None, [])
+
+    serving = replica.is_serving()
+    versions = {s: _cache_version(s) for s in wanted}
+    found = {}
+    if use_cache and not serving:
+        found = {s: data for s in wanted if (data := _cache_get(s, versions[s])) is not None}
+    missing = [s for s in wanted if s not in found]
+
+    log.debug("loadServiceBundle: Service ID %s (include_cs=%s) cached %s, fetching %s", sid, include_cs, list(found), missing)
+
+    if missing:
+        fetched = _fetchServiceData(missing)
+        for s in missing:
+            if fetched is None:
+                found[s] = ([], [], None)
+            else:
+                found[s] = fetched[s]
+                if not serving:
+                    _cache_put(s, versions[s], fetched[s])
+
+    # copies, so callers can't alter what is cached
+    standards, arrangements, contract = found.get(sid_norm, ([], [], None))
+    cs_standards = found["CS"][0] if include_cs else []
+    return ServiceBundle(
+        sid,
+        [dict(r) for r in standards],
+        [dict(r) for r in arrangements],
+        dict(contract) if contract else None,
+        [dict(r) for r in cs_standards],
+    )
+
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+ARRANGEMENT_FIELDS = ('defaultserviceperiod', 'atservicebase', 'atclientlocation', 'atotherlocation')
+
+# Values used for a field the form leaves out when the row has no value yet
+ARRANGEMENT_DEFAULTS = {
+    'weekday': {
+        'defaultserviceperiod': 'As specified 0800 - 1800',
+        'atservicebase': 'As specified',
+        'atclientlocation': 'As specified',
+        'atotherlocation': 'Prior approval required',
+    },
+    'weekend': {
+        'defaultserviceperiod': 'As agreed if required',
+        'atservicebase': 'As agreed if required',
+        'atclientlocation': 'As agreed if required',
+        'atotherlocation': 'Prior approval required',
+    },
+}
+
+
+def _apply_and_commit(apply) -> bool:
+    apply(db.session)
+    db.session.commit()
+    return True
+
+
+def saveServiceArrangements(service_id, form_values: dict, specialconditions: str) -> Optional[ServiceBundle]:
+    """
+    Save the arrangements page in bulk: one round trip reads the seven rows and the
+    contract record (loadServiceBundle), then only changed rows are written - updates as
+    one executemany by primary key, missing days as one multi-row insert - and committed.
+    form_values maps day -> {field: value}; a None value keeps the stored value (or the
+    default for a new row). Returns the written state, or None if the write failed.
+    While the read-replica is serving, the change goes to the replica and the write queue.
+    """
+    sid = (service_id or "").strip()
+    if not sid:
+        return None
+
+    bundle = loadServiceBundle(sid, use_cache=False)
+    by_day = {}
+    for row in bundle.arrangements:
+        by_day.setdefault(row['day'], row)
+
+    updates, inserts, written = [], [], {}
+    for day in WEEKDAYS:
+        existing = by_day.get(day)
+        defaults = ARRANGEMENT_DEFAULTS['weekend' if day in ('Saturday', 'Sunday') else 'weekday']
+        values = {}
+        for field in ARRANGEMENT_FIELDS:
+            submitted = (form_values.get(day) or {}).get(field)
+            values[field] = submitted if submitted is not None else ((existing or {}).get(field) or defaults[field])
+
+        if existing is None:
+            inserts.append({'sid': sid, 'day': day, **values})
+        elif any(existing.get(field) != values[field] for field in ARRANGEMENT_FIELDS):
+            updates.append({'arrid': existing['arrid'], **values})
+        written[day] = {**(existing or {'arrid': None, 'sid': sid, 'day': day}), **values}
+
+    contract = bundle.contract
+    contract_changed = contract is None or contract.get('specialconditions') != specialconditions
+
+    log.debug("saveServiceArrangements: %s updated, %s inserted, contract %s for Service ID %s", len(updates), len(inserts), 'changed' if contract_changed else 'unchanged', sid)
+
+    def apply(db_session) -> None:
+        if updates:
+            # ORM bulk UPDATE by primary key - a single executemany
+            db_session.execute(update(ServiceArrangement), updates)
+        if inserts:
+            inserted = db_session.execute(
+                insert(ServiceArrangement).returning(ServiceArrangement.arrid, ServiceArrangement.day), inserts
+            )
+            for arrid, day in inserted:
+                written[day]['arrid'] = arrid
+        if contract is None:
+            contract_row = {'sid': sid, 'specialconditions': specialconditions}
+            if contract_key is not None:
+                contract_row['conid'] = contract_key
+            db_session.execute(insert(ServiceContract), [contract_row])
+        elif contract_changed:
+            db_session.execute(update(ServiceContract), [{'conid': contract['conid'], 'specialconditions': specialconditions}])
+
+    contract_key = None
+    if (updates or inserts or contract_changed) and replica.is_serving():
+        for row, arrid in zip(inserts, replica.provisionalKeys(ServiceArrangement.arrid, len(inserts))):
+            row['arrid'] = arrid
+        if contract is None:
+            contract_key = replica.provisionalKeys(ServiceContract.conid, 1)[0]
+        replica.queueWrite("saveServiceArrangements", {
+            'service_id': sid, 'form_values': form_values, 'specialconditions': specialconditions,
+        }, apply)
+    elif updates or inserts or contract_changed:
+        if not _run_with_db_retry(action=lambda: _apply_and_commit(apply), operation_name="saveServiceArrangements", default=False):
+            return None
+        invalidateServiceCache(sid)
+
+    saved_contract = {**(contract or {'conid': None, 'sid': sid, 'context': None}), 'specialconditions': specialconditions}
+    return bundle._replace(arrangements=[written[day] for day in WEEKDAYS], contract=saved_contract)
+
+
+def saveServiceStandards(service_id, rows) -> Optional[list[dict]]:
+    """
+    Save the standards page in bulk. rows are the submitted (stdid, ssn, description)
+    triples. One IN (...) query fetches the submitted IDs held for this SID; only changed
+    rows are written, updates as one executemany by primary key (fast_executemany on SQL
+    Server) and new rows as one multi-row insert returning their keys, then committed.
+    As before, rows without an SSN are left untouched and new rows need both fields.
+    Returns the submitted rows as written, in stdid order, or None if the existing rows
+    could not be read or the write failed.
+    Rows added while the replica is serving get negative stdids until the queue is replayed.
+    """
+    sid = (service_id or "").strip()
+    submitted, provisional = [], {}
+    for stdid, ssn, desc in rows:
+        if str(stdid or '').startswith('-'):
+            # added while the database was waking: its insert is already queued
+            provisional[int(stdid)] = ((ssn or "").strip(), (desc or "").strip().strip('"'))
+            continue
+        key = int(stdid) if stdid and str(stdid).isdigit() else None
+        submitted.append((key, (ssn or "").strip(), (desc or "").strip().strip('"'), bool((desc or "").strip())))
+
+    if provisional:
+        # the queued insert holds the values it was added with; a later edit cannot be applied
+        # until the replay gives the row its real key, so it is dropped - but not silently
+        queued = {}
+        if replica.replica_enabled():
+            stmt = select(ServiceStandard.stdid, ServiceStandard.ssn, ServiceStandard.description).where(
+                ServiceStandard.stdid.in_(list(provisional)))
+            queued = {row['stdid']: (row['ssn'], row['description']) for row in replica.execute_all(stmt)}
+        dropped = sorted(key for key, values in provisional.items() if queued.get(key) != values)
+        if dropped:
+            log.warning("saveServiceStandards: dropped edits to standards %s for Service ID %s, added while the "
+                        "database was unavailable; they can be edited once the queued save is replayed",
+                        dropped, sid, sid=sid)
+
+    # Only this SID's rows can be updated; a submitted ID that belongs to another SID is
+    # not found here and is inserted as a new row for this one
+    ids = sorted({key for key, _, _, _ in submitted if key is not None})
+    existing = {}
+    if ids:
+        stmt = select(ServiceStandard.stdid, ServiceStandard.sid, ServiceStandard.ssn, ServiceStandard.description).where(
+            ServiceStandard.stdid.in_(ids), sid_matches(ServiceStandard, sid))
+        failed: list = []
+        found = _query_all(stmt, operation_name="saveServiceStandards.fetch", default=failed)
+        if found is failed:
+            # without the existing rows every submitted row would be inserted again
+            return None
+        existing = {row['stdid']: dict(row) for row in found}
+
+    updates, inserts, written = [], [], dict(existing)
+    for key, ssn, description, has_desc in submitted:
+        if not ssn:
+            continue
+        record = existing.get(key)
+        if record:
+            if record['ssn'] != ssn or record['description'] != description:
+                updates.append({'stdid': key, 'ssn': ssn, 'description': description})
+                written[key] = {**record, 'ssn': ssn, 'description': description}
+        elif has_desc:
+            inserts.append({'sid': sid, 'ssn': ssn, 'description': description})
+
+    log.debug("saveServiceStandards: %s updated, %s inserted for Service ID %s", len(updates), len(inserts), sid)
+
+    def apply(db_session) -> None:
+        if updates:
+            db_session.execute(update(ServiceStandard), updates)
+        if inserts:
+            # RETURNING rows from a batched insert come back in no particular order, so
+            # each key is taken with the values it was stored with (as the arrangements use day)
+            inserted = db_session.execute(
+                insert(ServiceStandard).returning(ServiceStandard.stdid, ServiceStandard.ssn, ServiceStandard.description),
+                inserts,
+            )
+            for stdid, ssn, description in inserted:
+                written[stdid] = {'sid': sid, 'ssn': ssn, 'description': description, 'stdid': stdid}
+
+    if (updates or inserts) and replica.is_serving():
+        for row, stdid in zip(inserts, replica.provisionalKeys(ServiceStandard.stdid, len(inserts))):
+            row['stdid'] = stdid
+        replica.queueWrite("saveServiceStandards", {'service_id': sid, 'rows': [list(row) for row in rows]}, apply)
+    elif updates or inserts:
+        if not _run_with_db_retry(action=lambda: _apply_and_commit(apply), operation_name="saveServiceStandards", default=False):
+            return None
+        invalidateServiceCache(sid)
+
+    return [written[key] for key in sorted(written)]
+
+
+def saveServiceContract(service_id, context: str, specialconditions: str) -> Optional[dict]:
+    """
+    Save the contract context and special conditions for a service ID, creating the
+    record if there is none. Returns the saved record, or None if the write failed.
+    """
+    sid = (service_id or "").strip()
+    if not sid:
+        return None
+
+    contract = loadServiceBundle(sid, use_cache=False).contract
+    saved = {**(contract or {'conid': None, 'sid': sid}), 'context': context, 'specialconditions': specialconditions}
+    if contract and contract.get('context') == context and contract.get('specialconditions') == specialconditions:
+        return saved
+
+    def apply(db_session) -> None:
+        if contract is None:
+            row = {'sid': sid, 'context': context, 'specialconditions': specialconditions}
+            if saved['conid'] is not None:
+                row['conid'] = saved['conid']
+            saved['conid'] = db_session.execute(insert(ServiceContract).returning(ServiceContract.conid), [row]).scalar()
+        else:
+            db_session.execute(update(ServiceContract), [{'conid': contract['conid'], 'context': context,
+                                                          'specialconditions': specialconditions}])
+
+    if replica.is_serving():
+        if contract is None:
+            saved['conid'] = replica.provisionalKeys(ServiceContract.conid, 1)[0]
+        replica.queueWrite("saveServiceContract", {
+            'service_id': sid, 'context': context, 'specialconditions': specialconditions,
+        }, apply)
+        return saved
+
+    if not _run_with_db_retry(action=lambda: _apply_and_commit(apply), operation_name="saveServiceContract", default=False):
+        return None
+    invalidateServiceCache(sid)
+    return saved
@@ -0,0 +1,230 @@
+# dbwake.py - wake-up and keep-warm scheduling for Azure SQL serverless
+# Pre-wakes the database shortly before working hours, starts a wake as soon as the
+# home page is hit, and optionally pings it during busy windows so it never auto-pauses.
+# Wake timings are kept for /db-status.
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Callable, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+_lock = threading.Lock()
+_timings: deque = deque(maxlen=20)
+_last_ping: Optional[float] = None
+_last_ping_at: Optional[str] = None
+_prewakes_fired: set[tuple[date, str]] = set()
+_scheduler: Optional[threading.Thread] = None
+
+
+def wake_timezone() -> ZoneInfo:
+    return ZoneInfo(os.environ.get("DB_WAKE_TZ", "Europe/London"))
+
+
+def prewake_times() -> list[str]:
+    """ DB_PREWAKE_AT, e.g. "08:15" or "07:45,12:50" (HH:MM, local to DB_WAKE_TZ) """
+    return [t.strip().zfill(5) for t in os.environ.get("DB_PREWAKE_AT", "").split(",") if t.strip()]
+
+
+def prewake_days() -> set[int]:
+    """ DB_PREWAKE_DAYS, e.g. "Mon-Fri" (the default) or "Mon,Wed,Fri" """
+    return parse_days(os.environ.get("DB_PREWAKE_DAYS", "Mon-Fri"))
+
+
+def keepwarm_windows() -> list[tuple[set[int], str, str]]:
+    """ DB_KEEPWARM_WINDOWS, e.g. "Mon-Fri 09:00-12:30, Mon-Thu 13:30-17:30" """
+    return parse_windows(os.environ.get("DB_KEEPWARM_WINDOWS", ""))
+
+
+def keepwarm_interval_seconds() -> float:
+    # well inside the shortest auto-pause delay Azure allows (one hour)
+    return float(os.environ.get("DB_KEEPWARM_INTERVAL_SECONDS", "600"))
+
+
+def parse_days(spec: str) -> set[int]:
+    days = set()
+    for part in [p.strip() for p in spec.split(",") if p.strip()]:
+        first, _, last = part.partition("-")
+        start = DAYS.index(first.strip()[:3].title())
+        end = DAYS.index(last.strip()[:3].title()) if last else start
+        days.update(range(start, end + 1) if start <= end else [*range(start, 7), *range(0, end + 1)])
+    return days
+
+
+def parse_windows(spec: str) -> list[tuple[set[int], str, str]]:
+    windows = []
+    for part in [p.strip() for p in spec.split(",") if p.strip()]:
+        days, _, hours = part.rpartition(" ")
+        start, _, end = hours.partition("-")
+        windows.append((parse_days(days) if days else set(range(7)), start.strip().zfill(5), end.strip().zfill(5)))
+    return windows
+
+
+def in_keepwarm_window(now: datetime) -> bool:
+    hhmm = now.strftime("%H:%M")
+    return any(now.weekday() in days and start <= hhmm < end for days, start, end in keepwarm_windows())
+
+
+def next_prewake(now: datetime) -> Optional[datetime]:
+    """ The next scheduled pre-wake after now, or None if none is configured """
+    times, days = prewake_times(), prewake_days()
+    if not times or not days:
+        return None
+    for offset in range(8):
+        day = now.date() + timedelta(days=offset)
+        if day.weekday() not in days:
+            continue
+        for hhmm in sorted(times):
+            hour, minute = (int(v) for v in hhmm.split(":"))
+            at = datetime(day.year, day.month, day.day, hour, minute, tzinfo=now.tzinfo)
+            if at > now:
+                return at
+    return None
+
+
+def _record(reason: str, started: float, connected: bool) -> None:
+    seconds = round(time.monotonic() - started, 1)
+    with _lock:
+        _timings.append({
+            "reason": reason,
+            "finished": datetime.now(wake_timezone()).isoformat(timespec="seconds"),
+            "seconds": seconds,
+            "connected": connected,
+        })
+    logging.info(f"Database wake ({reason}) {'connected' if connected else 'failed'} after {seconds}s")
+
+
+def timed_wake(connect: Callable[[], None], reason: str) -> None:
+    """ Run connect (connect_database_background) and record how long the wake took """
+    import app as app_package
+
+    started = time.monotonic()
+    connect()
+    _record(reason, started, bool(app_package.db_connected))
+
+
+def ping(reason: str) -> bool:
+    """ SELECT 1 on the connected engine; resumes a paused database and resets its idle timer """
+    import app as app_package
+    global _last_ping, _last_ping_at
+
+    engine = app_package.db_engine
+    if engine is None:
+        return False
+    with _lock:
+        _last_ping = time.monotonic()
+        _last_ping_at = datetime.now(wake_timezone()).isoformat(timespec="seconds")
+
+    started = time.monotonic()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        logging.warning(f"Database ping ({reason}) failed: {e}")
+        _record(reason, started, False)
+        return False
+    seconds = time.monotonic() - started
+    # a slow ping means the database had paused and this ping woke it
+    if seconds > 5:
+        _record(reason, started, True)
+    log.debug("dbwake: ping (%s) took %.2fs", reason, seconds)
+    return True
+
+
+def request_wake(reason: str) -> str:
+    """
+    Start waking the database without blocking the caller. Starts the background
+    connect if not connected (unless one is already running); otherwise pings in the
+    background, at most once a minute. Returns what was done.
+    """
+    import app as app_package
+
+    if not app_package.db_connected:
+        return "started" if app_package.start_background_connect(reason) else "in-progress"
+
+    with _lock:
+        recently = _last_ping is not None and time.monotonic() - _last_ping < 60
+    if recently:
+        return "recent"
+    threading.Thread(target=ping, args=(reason,), name="db-ping", daemon=True).start()
+    return "ping"
+
+
+def tick(now: datetime) -> list[str]:
+    """ One scheduler step at local time now; returns the reasons it woke the database for """
+    woke = []
+    hhmm = now.strftime("%H:%M")
+    for at in prewake_times():
+        key = (now.date(), at)
+        if now.weekday() in prewake_days() and at <= hhmm and key not in _prewakes_fired:
+            with _lock:
+                _prewakes_fired.add(key)
+                # forget earlier days so the set stays small
+                for old in [k for k in _prewakes_fired if k[0] < now.date()]:
+                    _prewakes_fired.discard(old)
+            # only fire close to the scheduled time, not on a restart hours later (compared as
+            # datetimes: a string limit for 23:55 would wrap to "00:05" and never be reached)
+            hour, minute = (int(v) for v in at.split(":"))
+            scheduled = datetime(now.year, now.month, now.day, hour, minute, tzinfo=now.tzinfo)
+            if now <= scheduled + timedelta(minutes=10):
+                request_wake("prewake")
+                woke.append("prewake")
+
+    if in_keepwarm_window(now):
+        with _lock:
+            due = _last_ping is None or time.monotonic() - _last_ping >= keepwarm_interval_seconds()
+        if due:
+            request_wake("keep-warm")
+            woke.append("keep-warm")
+    return woke
+
+
+def _scheduler_loop() -> None:
+    while True:
+        try:
+            tick(datetime.now(wake_timezone()))
+        except Exception as e:
+            logging.error(f"dbwake scheduler: {e}")
+        time.sleep(30)
+
+
+def start_wake_scheduler() -> Optional[threading.Thread]:
+    """ Start the scheduler thread when pre-wake times or keep-warm windows are configured """
+    global _scheduler
+    if not (prewake_times() or keepwarm_windows()):
+        return None
+    if _scheduler is None or not _scheduler.is_alive():
+        _scheduler = threading.Thread(target=_scheduler_loop, name="db-wake", daemon=True)
+        _scheduler.start()
+    return _scheduler
+
+
+def wake_status() -> dict:
+    """ Wake timings and schedule, for /db-status """
+    import app as app_package
+
+    now = datetime.now(wake_timezone())
+    upcoming = next_prewake(now)
+    thread = app_package.db_wake_thread
+    with _lock:
+        recent = list(_timings)
+        last_ping = _last_ping_at
+    return {
+        "in_progress": bool(thread is not None and thread.is_alive()),
+        "last_wake": recent[-1] if recent else None,
+        "recent": recent,
+        "next_prewake": upcoming.isoformat(timespec="minutes") if upcoming else None,
+        "keep_warm": in_keepwarm_window(now),
+        "last_ping": last_ping,
+    }
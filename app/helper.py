@@ -6,12 +6,15 @@ import time
 from typing import Optional, Dict, Callable, TypeVar, Any
 from sqlalchemy.exc import OperationalError, DisconnectionError
 from app.keyvault import get_secret
-from docx import Document
-from flask import send_file, Response
+from flask import send_file, Response, has_request_context
 from datetime import datetime
 import tempfile
-from azure.identity import DefaultAzureCredential
-from app import db
+import threading
+from app import db, metrics, tracing
+from app.metrics import call_dependency, record_cache
+from app.log import get_logger
+
+log = get_logger(__name__)
 
 T = TypeVar("T")
 
@@ -23,7 +26,20 @@ def load_config() -> dict[str, str | dict]:
     """
     Load core application secrets.
     Prefers environment variables; falls back to AKV if available.
-    Returns a plain dict; nothing is cached globally.
+    Returns a plain dict. Within a request the secrets are read once and reused (see
+    app/loader.py); a preloaded gunicorn master or the start-up warm-up reads them once
+    for the whole process (see app/preload.py and app/warmup.py).
+    """
+    if has_request_context():
+        from app.loader import get_loader
+        return get_loader().config()
+    from app.preload import config_snapshot
+    return config_snapshot() or read_config()
+
+
+def read_config() -> dict[str, str | dict]:
+    """
+    Read core application secrets, uncached. Prefer load_config.
     """
     # C7 / CH / NameAPI
     c7_key = get_secret("C7APIKey")
@@ -85,16 +101,14 @@ def formatName(name_string: str) -> str:
     return f"{forename_part} {surname_only}".strip()
 
 
-def uploadToSharePoint(file_bytes: bytes, filename: str, target_url):
+def graph_credential():
     """
-    Upload a file to SharePoint using Microsoft Graph API and managed identity.
-    """    
-
-    if debugMode():
-        print(f"{datetime.now().strftime('%H:%M:%S')} uploadToSharePoint: Uploading file '{filename}' to SharePoint at '{target_url}'")
+    Managed identity credential for Microsoft Graph. azure.identity is imported here, on
+    the first SharePoint call, rather than when the app starts.
+    """
+    from azure.identity import DefaultAzureCredential
 
-    # Configure credential for Microsoft Graph API access
-    credential = DefaultAzureCredential(
+    return DefaultAzureCredential(
         additionally_allowed_tenants=["*"],
         # Add exclude options to speed up credential resolution
         exclude_visual_studio_code_credential=True,
@@ -102,6 +116,17 @@ def uploadToSharePoint(file_bytes: bytes, filename: str, target_url):
         exclude_powershell_credential=True
     )
 
+
+def uploadToSharePoint(file_bytes: bytes, filename: str, target_url):
+    """
+    Upload a file to SharePoint using Microsoft Graph API and managed identity.
+    """    
+
+    log.debug("uploadToSharePoint: Uploading file '%s' to SharePoint at '%s'", filename, target_url)
+
+    # Configure credential for Microsoft Graph API access
+    credential = graph_credential()
+
     token = credential.get_token("https://graph.microsoft.com/.default")
     access_token = token.token
 
@@ -113,7 +138,7 @@ def uploadToSharePoint(file_bytes: bytes, filename: str, target_url):
 
     # Get Site ID
     site_url = f'https://graph.microsoft.com/v1.0/sites/{site_domain}:/sites/{site_name}'
-    site_response = requests.get(site_url, headers={'Authorization': f'Bearer {access_token}'})
+    site_response = call_dependency("Graph", requests.get, site_url, headers={'Authorization': f'Bearer {access_token}'})
 
     if site_response.status_code != 200:
         print(f"Error getting site ID: {site_response.status_code} - {site_response.text}")
@@ -125,7 +150,7 @@ def uploadToSharePoint(file_bytes: bytes, filename: str, target_url):
     upload_url = f'https://graph.microsoft.com/v1.0/sites/{site_id}/drive/root:/{library}/{folder_path}/{file_name}:/content'
     print(f"Uploading to URL: {upload_url}")
 
-    upload_response = requests.put(upload_url, headers={
+    upload_response = call_dependency("Graph", requests.put, upload_url, headers={
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/octet-stream'
     }, data=file_bytes)
@@ -139,13 +164,7 @@ def downloadFromSharePoint(folder_path: str, filename: str) -> Optional[bytes]:
     Returns the file bytes if successful, else None.
     """
     # Configure credential for Microsoft Graph API access
-    credential = DefaultAzureCredential(
-        additionally_allowed_tenants=["*"],
-        # Add exclude options to speed up credential resolution
-        exclude_visual_studio_code_credential=True,
-        exclude_shared_token_cache_credential=True,
-        exclude_powershell_credential=True
-    )
+    credential = graph_credential()
 
     token = credential.get_token("https://graph.microsoft.com/.default")
     access_token = token.token
@@ -156,7 +175,7 @@ def downloadFromSharePoint(folder_path: str, filename: str) -> Optional[bytes]:
 
     # Get Site ID
     site_url = f'https://graph.microsoft.com/v1.0/sites/{site_domain}:/sites/{site_name}'
-    site_response = requests.get(site_url, headers={'Authorization': f'Bearer {access_token}'})
+    site_response = call_dependency("Graph", requests.get, site_url, headers={'Authorization': f'Bearer {access_token}'})
 
     if site_response.status_code != 200:
         print(f"Error getting site ID: {site_response.status_code} - {site_response.text}")
@@ -168,7 +187,7 @@ def downloadFromSharePoint(folder_path: str, filename: str) -> Optional[bytes]:
     metadata_url = f'https://graph.microsoft.com/v1.0/sites/{site_id}/drive/root:/{library}/{folder_path}/{filename}'
     print(f"Getting file metadata from: {metadata_url}")
 
-    metadata_response = requests.get(metadata_url, headers={
+    metadata_response = call_dependency("Graph", requests.get, metadata_url, headers={
         'Authorization': f'Bearer {access_token}'
     })
 
@@ -180,15 +199,14 @@ def downloadFromSharePoint(folder_path: str, filename: str) -> Optional[bytes]:
             print(f"Downloading file content from: {download_url}")
             
             # Download the actual file content using the download URL
-            file_response = requests.get(download_url)
+            file_response = call_dependency("Graph", requests.get, download_url)
             
             if file_response.status_code == 200:
                 content = file_response.content
                 
                 # Check if content looks like a valid DOCX file (should start with PK)
                 if len(content) > 0 and content[:2] == b'PK':
-                    if debugMode():
-                        print(f"Downloaded file size: {len(content)} bytes")
+                    log.debug("Downloaded file size: %s bytes", len(content))
                     return content
                 else:
                     print(f"Downloaded content is not a valid DOCX file, size: {len(content)} bytes")
@@ -205,6 +223,42 @@ def downloadFromSharePoint(folder_path: str, filename: str) -> Optional[bytes]:
         return None
 
 
+# Merge templates change rarely; previews reuse a downloaded copy for a few minutes
+_template_cache: dict[tuple[str, str], tuple[float, bytes]] = {}
+_template_lock = threading.Lock()
+
+
+def template_cache_seconds() -> float:
+    """ How long a downloaded template is reused (TEMPLATE_CACHE_SECONDS, default 300; 0 turns it off) """
+    return float(os.environ.get("TEMPLATE_CACHE_SECONDS", "300"))
+
+
+def downloadTemplate(folder_path: str, filename: str) -> Optional[bytes]:
+    """
+    downloadFromSharePoint for merge templates, reusing the last download for
+    TEMPLATE_CACHE_SECONDS. Failed downloads are not cached.
+    """
+    key = (folder_path, filename)
+    ttl = template_cache_seconds()
+    with _template_lock:
+        cached = _template_cache.get(key)
+    if cached and ttl > 0 and time.monotonic() - cached[0] <= ttl:
+        record_cache("sharepoint_template", hits=1)
+        return cached[1]
+
+    record_cache("sharepoint_template", misses=1)
+    content = downloadFromSharePoint(folder_path, filename)
+    if content and ttl > 0:
+        with _template_lock:
+            _template_cache[key] = (time.monotonic(), content)
+    return content
+
+
+def clearTemplateCache() -> None:
+    with _template_lock:
+        _template_cache.clear()
+
+
 def wait_for_db(max_wait=120, interval=5):
     """Wait for the Azure database to be available before starting the app."""
     waited = 0
@@ -223,16 +277,59 @@ def wait_for_db(max_wait=120, interval=5):
 
 
 def debugMode():
+    """ True in DevelopmentConfig. Read on every call; app.log loggers cache this check instead """
     config_mode = os.environ.get('FLASK_CONFIG', 'DevelopmentConfig')
     return config_mode == 'DevelopmentConfig'
 
 
+def build_export_workbook(data_rows: list[dict]):
+    """
+    Write the rows to Sheet1 as an Excel table (Table1) for the mail merge templates.
+    Returns the workbook as a BytesIO at position 0. pandas and openpyxl are imported
+    on the first export rather than when the app starts.
+    """
+    from io import BytesIO
+    import pandas as pd
+    from openpyxl import load_workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.table import Table, TableStyleInfo
+
+    df = pd.DataFrame(data_rows)
+
+    # Write to Excel in-memory
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Sheet1')
+
+    output.seek(0)
+    wb = load_workbook(output)
+    ws = wb['Sheet1']
+
+    # add table
+    df_rows = len(df) + 1
+    df_cols = len(df.columns)
+    df_range = f"A1:{get_column_letter(df_cols)}{df_rows}"
+
+    table1 = Table(displayName="Table1", ref=df_range)
+    table1.tableStyleInfo = TableStyleInfo(
+        name="TableStyleMedium9", showRowStripes=False, showColumnStripes=False
+    )
+    ws.add_table(table1)
+
+    # Save final output
+    final_output = BytesIO()
+    wb.save(final_output)
+    final_output.seek(0)
+    return final_output
+
+
 def serve_docx(file_bytes: bytes, filename: str, replacements: Optional[dict] = None):
     """
     Open a docx from bytes, replace placeholders, convert to PDF and serve for viewing
     """
     import tempfile
     import os
+    from docx import Document
     from flask import Response
     
     # Default replacements if none provided
@@ -268,15 +365,12 @@ def serve_docx(file_bytes: bytes, filename: str, replacements: Optional[dict] =
         with open(tmp_path, 'wb') as f:
             f.write(file_bytes)
 
-        if debugMode():
-            print(f"Created temp file: {tmp_path}")
-            print(f"File exists: {os.path.exists(tmp_path)}")
-            print(f"File size: {os.path.getsize(tmp_path)} bytes")
+        if log.debug_enabled:
+            log.debug("Created temp file: %s", tmp_path, exists=os.path.exists(tmp_path), size=os.path.getsize(tmp_path))
 
         # Open and modify the document
         doc = Document(tmp_path)
-        if debugMode():
-            print("Document loaded successfully")
+        log.debug("Document loaded successfully")
             
         # Replace placeholders in the document
         replace_text_in_document(doc, replacements)
@@ -284,17 +378,15 @@ def serve_docx(file_bytes: bytes, filename: str, replacements: Optional[dict] =
         # Save the modified document to a new file
         doc.save(modified_path)
 
-        if debugMode():
-            print(f"Document modifications completed and saved to: {modified_path}")
-            print(f"Modified file exists: {os.path.exists(modified_path)}")
-            print(f"Modified file size: {os.path.getsize(modified_path)} bytes")
+        if log.debug_enabled:
+            log.debug("Document modifications completed and saved to: %s", modified_path,
+                      exists=os.path.exists(modified_path), size=os.path.getsize(modified_path))
 
         # Convert the MODIFIED DOCX to PDF
         convert_docx_to_pdf(modified_path, pdf_path)
 
-        if debugMode():
-            print("Document converted to PDF successfully")
-            print(f"PDF file exists: {os.path.exists(pdf_path)}")
+        if log.debug_enabled:
+            log.debug("Document converted to PDF successfully", exists=os.path.exists(pdf_path))
 
         # Read the PDF file and return it
         with open(pdf_path, 'rb') as pdf_file:
@@ -310,17 +402,13 @@ def serve_docx(file_bytes: bytes, filename: str, replacements: Optional[dict] =
         )
 
     except Exception as e:
-        if debugMode():
-            print(f"Error in serve_docx: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        log.exception("Error in serve_docx: %s", e)
         raise  # Re-raise the exception so Flask can handle it properly
         
     finally:
         # Clean up temp files
         try:
-            if debugMode():
-                print(f"Cleaning up temp files")
+            log.debug("Cleaning up temp files")
             if tmp_path and os.path.exists(tmp_path):
                 os.unlink(tmp_path)
             if modified_path and os.path.exists(modified_path):
@@ -328,8 +416,7 @@ def serve_docx(file_bytes: bytes, filename: str, replacements: Optional[dict] =
             if pdf_path and os.path.exists(pdf_path):
                 os.unlink(pdf_path)
         except Exception as cleanup_error:
-            if debugMode():
-                print(f"Cleanup error: {str(cleanup_error)}")
+            log.debug("Cleanup error: %s", str(cleanup_error))
 
 
 def convert_docx_to_pdf(docx_path: str, pdf_path: str):
@@ -340,12 +427,10 @@ def convert_docx_to_pdf(docx_path: str, pdf_path: str):
         # Use python-docx with reportlab (basic conversion)
         try:
             convert_docx_to_pdf_reportlab(docx_path, pdf_path)
-            if debugMode():
-                print("Converted using reportlab")
+            log.debug("Converted using reportlab")
             return
         except Exception as e:
-            if debugMode():
-                print(f"reportlab conversion failed: {e}")
+            log.debug("reportlab conversion failed: %s", e)
         
         # If all methods fail, raise an error
         raise Exception("No PDF conversion method available. Please install docx2pdf, pypandoc, or ensure Microsoft Word is available.")
@@ -365,8 +450,7 @@ def convert_docx_to_pdf_reportlab(docx_path: str, pdf_path: str):
         from docx import Document
         from docx.enum.text import WD_ALIGN_PARAGRAPH
         
-        if debugMode():
-            print(f"Converting DOCX to PDF: {docx_path} -> {pdf_path}")
+        log.debug("Converting DOCX to PDF: %s -> %s", docx_path, pdf_path)
         
         # Open the document
         doc = Document(docx_path)
@@ -385,8 +469,7 @@ def convert_docx_to_pdf_reportlab(docx_path: str, pdf_path: str):
         c.setFont("Helvetica", 12)
         c.setFillColor(black)
         
-        if debugMode():
-            print(f"Processing {len(doc.paragraphs)} paragraphs")
+        log.debug("Processing %s paragraphs", len(doc.paragraphs))
         
         def get_alignment_from_paragraph(paragraph):
             """Get text alignment from Word paragraph"""
@@ -487,9 +570,8 @@ def convert_docx_to_pdf_reportlab(docx_path: str, pdf_path: str):
                 # Get paragraph alignment
                 alignment = get_alignment_from_paragraph(paragraph)
                 
-                if debugMode() and i < 10:  # Only log first 10 paragraphs
-                    text_preview = text[:100].replace('\n', '\\n')
-                    print(f"Paragraph {i} ({alignment}): {text_preview}...")
+                if log.debug_enabled and i < 10:  # Only log first 10 paragraphs
+                    log.debug("Paragraph %s (%s): %r...", i, alignment, text[:100])
                 
                 y_position = draw_text_with_wrapping_and_alignment(text, y_position, alignment)
                 
@@ -505,8 +587,7 @@ def convert_docx_to_pdf_reportlab(docx_path: str, pdf_path: str):
         
         # Process tables as simple text (tables will use left alignment)
         for table_idx, table in enumerate(doc.tables):
-            if debugMode():
-                print(f"Processing table {table_idx}")
+            log.debug("Processing table %s", table_idx)
             
             y_position -= 10  # Extra space before table
             
@@ -535,17 +616,13 @@ def convert_docx_to_pdf_reportlab(docx_path: str, pdf_path: str):
         # Save the PDF
         c.save()
         
-        if debugMode():
-            print(f"PDF created successfully: {os.path.exists(pdf_path)}")
-            print(f"PDF file size: {os.path.getsize(pdf_path)} bytes")
+        if log.debug_enabled:
+            log.debug("PDF created successfully: %s", pdf_path, exists=os.path.exists(pdf_path), size=os.path.getsize(pdf_path))
         
     except ImportError:
         raise Exception("reportlab not available for PDF conversion")
     except Exception as e:
-        if debugMode():
-            print(f"Error in convert_docx_to_pdf_reportlab: {e}")
-            import traceback
-            traceback.print_exc()
+        log.exception("Error in convert_docx_to_pdf_reportlab: %s", e)
         raise
 
 
@@ -553,8 +630,7 @@ def replace_text_in_document(doc, replacements: dict):
     """
     Simple text replacement throughout the document
     """
-    if debugMode():
-        print(f"Starting document replacement with {len(replacements)} replacements")
+    log.debug("Starting document replacement with %s replacements", len(replacements))
     
     # Simple paragraph-based replacement
     for i, paragraph in enumerate(doc.paragraphs):
@@ -574,11 +650,7 @@ def replace_text_in_document(doc, replacements: dict):
             # Add new run with replacement text, preserving newlines
             new_run = paragraph.add_run(new_text)
             
-            if debugMode():
-                # Fix: Move the string replacement outside the f-string
-                original_preview = original_text[:50].replace('\n', '\\n')
-                new_preview = new_text[:50].replace('\n', '\\n')
-                print(f"Replaced paragraph {i}: '{original_preview}...' -> '{new_preview}...'")
+            log.debug("Replaced paragraph %s: %r... -> %r...", i, original_text[:50], new_text[:50])
     
     # Simple table replacement
     for table in doc.tables:
@@ -601,11 +673,7 @@ def replace_text_in_document(doc, replacements: dict):
                         # Add new run with replacement text
                         paragraph.add_run(new_text)
                         
-                        if debugMode():
-                            # Fix: Move the string replacement outside the f-string
-                            original_preview = original_text[:30].replace('\n', '\\n')
-                            new_preview = new_text[:30].replace('\n', '\\n')
-                            print(f"Replaced table cell: '{original_preview}...' -> '{new_preview}...'")
+                        log.debug("Replaced table cell: %r... -> %r...", original_text[:30], new_text[:30])
 
 
 def execute_db_query_with_retry(stmt, operation_name="database query"):
@@ -641,42 +709,51 @@ def _run_with_db_retry(
     max_retries: int = 3,
     initial_delay: float = 1.0,
 ) -> T:
-    import logging
-
     if not is_database_connected():
-        logging.warning(f"{operation_name}: Database not connected, returning default")
+        log.warning("%s: Database not connected, returning default", operation_name, operation=operation_name)
+        metrics.record_skipped(operation_name)
         return default
 
-    retry_delay = initial_delay
-    for attempt in range(max_retries):
+    # Label statements run by action() with operation_name (slow-query log), time the call and trace it
+    token = metrics.current_operation.set(operation_name)
+    started = time.perf_counter()
+    ok, attempt = False, 0
+    with tracing.span(f"SQL {operation_name}", kind="client", dependency="SQL") as db_span:
         try:
-            return action()
-        except (OperationalError, DisconnectionError) as e:
-            error_msg = f"{operation_name}: Database connection error on attempt {attempt + 1}: {str(e)}"
-            logging.error(error_msg)
-            if debugMode():
-                print(f"{datetime.now().strftime('%H:%M:%S')} {error_msg}")
-
-            _rollback_session_safely()
-
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-                retry_delay *= 2
-                continue
-
-            logging.error(f"{operation_name}: All retry attempts failed, returning default")
-            if debugMode():
-                print(f"{datetime.now().strftime('%H:%M:%S')} {operation_name}: All retry attempts failed, returning default")
-            return default
-        except Exception as e:
-            error_msg = f"{operation_name}: Unexpected error: {str(e)}"
-            logging.error(error_msg)
-            if debugMode():
-                print(f"{datetime.now().strftime('%H:%M:%S')} {error_msg}")
-            _rollback_session_safely()
-            return default
+            retry_delay = initial_delay
+            for attempt in range(max_retries):
+                try:
+                    result = action()
+                    ok = True
+                    return result
+                except (OperationalError, DisconnectionError) as e:
+                    log.error("%s: Database connection error on attempt %s: %s", operation_name, attempt + 1, e,
+                              operation=operation_name)
+
+                    _rollback_session_safely()
+                    metrics.record_rollback(operation_name)
+
+                    if attempt < max_retries - 1:
+                        time.sleep(retry_delay)
+                        retry_delay *= 2
+                        continue
+
+                    log.error("%s: All retry attempts failed, returning default", operation_name, operation=operation_name)
+                    return default
+                except Exception as e:
+                    log.error("%s: Unexpected error: %s", operation_name, e, operation=operation_name)
+                    _rollback_session_safely()
+                    metrics.record_rollback(operation_name)
+                    return default
 
-    return default
+            return default
+        finally:
+            metrics.record_operation(operation_name, time.perf_counter() - started, ok, retries=attempt)
+            metrics.current_operation.reset(token)
+            if db_span:
+                db_span.set(retries=attempt or None)
+                if not ok:
+                    db_span.status = "error"
 
 
 def db_query_scalars(stmt, operation_name: str = "database query", default: Optional[list[Any]] = None) -> list[Any]:
@@ -688,6 +765,15 @@ def db_query_scalars(stmt, operation_name: str = "database query", default: Opti
     )
 
 
+def db_query_all(stmt, operation_name: str = "database rows query", default: Optional[list[Any]] = None) -> list[Any]:
+    fallback = [] if default is None else default
+    return _run_with_db_retry(
+        action=lambda: db.session.execute(stmt).mappings().all(),
+        operation_name=operation_name,
+        default=fallback,
+    )
+
+
 def db_query_scalar(stmt, operation_name: str = "database scalar query", default: Any = None) -> Any:
     return _run_with_db_retry(
         action=lambda: db.session.scalar(stmt),
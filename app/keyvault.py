@@ -1,10 +1,15 @@
 # Azure Key Vault access
 # NOTE: This module is maintained in the CS-DOCUMENT-GENERATOR app, do not edit elsewhere.
 
+from __future__ import annotations
 import os
-from typing import Optional
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
+import time
+from typing import TYPE_CHECKING, Optional
+from app.metrics import record_dependency
+from app.tracing import span
+
+if TYPE_CHECKING:
+    from azure.keyvault.secrets import SecretClient
 
 
 def get_kv_client() -> Optional[SecretClient]:
@@ -13,6 +18,10 @@ def get_kv_client() -> Optional[SecretClient]:
     if not kv_name:
         return None
     vault_uri = f"https://{kv_name}.vault.azure.net"
+
+    # Only loaded when Key Vault is used; most settings come from the environment
+    from azure.identity import DefaultAzureCredential
+    from azure.keyvault.secrets import SecretClient
     
     # Configure credential for Azure Key Vault access
     credential = DefaultAzureCredential(
@@ -41,10 +50,14 @@ def get_secret(env_name: str, kv_secret_name: Optional[str] = None) -> str:
         )
 
     secret_name = kv_secret_name or env_name
+    started = time.perf_counter()
     try:
-        result = client.get_secret(secret_name).value 
+        with span("KeyVault get_secret", kind="client", dependency="KeyVault", secret=secret_name):
+            result = client.get_secret(secret_name).value 
+        record_dependency("KeyVault", time.perf_counter() - started, "200")
         return result if result is not None else ""
     except Exception as exc:
+        record_dependency("KeyVault", time.perf_counter() - started, "error")
         raise KeyError(
             f"Failed to retrieve '{secret_name}' from Azure Key Vault '{os.environ.get('KEY_VAULT_NAME', '')}'."
         ) from exc
\ No newline at end of file
@@ -0,0 +1,78 @@
+# loader.py - request-scoped data loader
+# Memoizes each service ID's bundle (standards, arrangements and contract record) and the
+# config on flask.g so each is fetched at most once per request, however many places in
+# the route ask for it.
+from __future__ import annotations
+from typing import Any, Callable, Optional
+
+from flask import g, has_request_context
+
+from app.dbquery import ServiceBundle, loadServiceBundle
+from app.helper import read_config
+from app.metrics import record_cache
+from app.preload import config_snapshot
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+
+class RequestLoader:
+    """
+    Lazy, memoized accessors for the data a route needs. One instance per request
+    (see get_loader). counts records how many times each entity was actually fetched
+    and hits how many times a memoized value was reused.
+    """
+
+    def __init__(self):
+        self._values: dict[tuple, Any] = {}
+        self.counts: dict[str, int] = {}
+        self.hits: dict[str, int] = {}
+
+    def _load(self, kind: str, key: Any, fetch: Callable[[], Any]) -> Any:
+        memo_key = (kind, key)
+        if memo_key in self._values:
+            self.hits[kind] = self.hits.get(kind, 0) + 1
+            return self._values[memo_key]
+        value = fetch()
+        self._values[memo_key] = value
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        return value
+
+    @staticmethod
+    def _sid_key(sid: Optional[str]) -> str:
+        return (sid or "").strip().upper()
+
+    def bundle(self, sid: str, include_cs: bool = False) -> ServiceBundle:
+        """ Standards, arrangements and contract for sid in one round trip (see loadServiceBundle) """
+        return self._load("bundle", (self._sid_key(sid), include_cs), lambda: loadServiceBundle(sid, include_cs))
+
+    def config(self) -> dict:
+        """ load_config() result; the master's snapshot when preloaded under gunicorn """
+        return self._load("config", None, lambda: config_snapshot() or read_config())
+
+    def invalidate(self, sid: Optional[str] = None) -> None:
+        """ Forget memoized data for sid (all data when sid is None); dbquery.invalidateServiceCache calls it after each write """
+        if sid is None:
+            self._values.clear()
+            return
+        key = self._sid_key(sid)
+        for memo_key in [k for k in self._values if k[1] == key or (isinstance(k[1], tuple) and k[1][0] == key)]:
+            del self._values[memo_key]
+
+
+def get_loader() -> RequestLoader:
+    """ The current request's loader, created on first use """
+    loader = g.get("_request_loader")
+    if loader is None:
+        loader = RequestLoader()
+        g._request_loader = loader
+    return loader
+
+
+def log_loader_counts(response):
+    """ after_request hook: add per-request fetch counts to the metrics; report them in debug mode """
+    loader = g.get("_request_loader") if has_request_context() else None
+    if loader is not None:
+        record_cache("request_loader", hits=sum(loader.hits.values()), misses=sum(loader.counts.values()))
+        log.debug("RequestLoader: fetched %s, reused %s", loader.counts, loader.hits)
+    return response
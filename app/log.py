@@ -0,0 +1,127 @@
+# log.py - logging facade
+# Level checks are cached on each logger when logging is configured (at import and again
+# in create_app), so a disabled log.debug(...) costs one attribute test. Messages use
+# %-style args and are only formatted when emitted; keyword arguments become structured
+# fields, written as key=value pairs (or JSON with LOG_FORMAT=json) with the trace ID.
+from __future__ import annotations
+import json
+import logging
+import os
+import sys
+from typing import Any, Optional
+
+ROOT = "app"
+_loggers: dict[str, "Logger"] = {}
+_handler: Optional[logging.Handler] = None
+
+
+def configured_level(config_mode: Optional[str] = None) -> int:
+    """ LOG_LEVEL if set, otherwise DEBUG in DevelopmentConfig (as debugMode()) and INFO elsewhere """
+    level = logging.getLevelName(os.environ.get("LOG_LEVEL", "").strip().upper() or "NOTSET")
+    if isinstance(level, int) and level != logging.NOTSET:
+        return level
+    config_mode = config_mode or os.environ.get("FLASK_CONFIG", "DevelopmentConfig")
+    return logging.DEBUG if config_mode == "DevelopmentConfig" else logging.INFO
+
+
+class StructuredFormatter(logging.Formatter):
+    """ time level logger [trace] message key=value ..., or one JSON object per line """
+
+    def __init__(self, as_json: bool = False):
+        super().__init__(datefmt="%H:%M:%S")
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        from app.tracing import current_trace_id
+
+        fields = getattr(record, "fields", None) or {}
+        trace_id = getattr(record, "trace_id", None)
+        if not trace_id or trace_id == "-":
+            trace_id = current_trace_id()
+        message = record.getMessage()
+
+        if self.as_json:
+            entry = {"time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"), "level": record.levelname,
+                     "logger": record.name, "message": message, **fields}
+            if trace_id:
+                entry["trace_id"] = trace_id
+            if record.exc_info:
+                entry["exception"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+
+        text = f"{self.formatTime(record, self.datefmt)} {record.levelname} {record.name}"
+        if trace_id:
+            text += f" [{trace_id[:16]}]"
+        text += f" {message}"
+        if fields:
+            text += " " + " ".join(f"{k}={v!r}" if isinstance(v, str) and " " in v else f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class Logger:
+    """
+    Thin wrapper over a stdlib logger. debug_enabled/info_enabled are plain attributes
+    refreshed by configure(); use them to guard work done only to build a message.
+    """
+
+    __slots__ = ("_logger", "debug_enabled", "info_enabled")
+
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(name)
+        self.refresh()
+
+    def refresh(self) -> None:
+        self.debug_enabled = self._logger.isEnabledFor(logging.DEBUG)
+        self.info_enabled = self._logger.isEnabledFor(logging.INFO)
+
+    def _log(self, level: int, msg: str, args: tuple, fields: dict, exc_info: Any = None) -> None:
+        self._logger.log(level, msg, *args, extra={"fields": fields} if fields else None, exc_info=exc_info, stacklevel=3)
+
+    def debug(self, msg: str, *args, **fields) -> None:
+        if self.debug_enabled:
+            self._log(logging.DEBUG, msg, args, fields)
+
+    def info(self, msg: str, *args, **fields) -> None:
+        if self.info_enabled:
+            self._log(logging.INFO, msg, args, fields)
+
+    def warning(self, msg: str, *args, **fields) -> None:
+        self._log(logging.WARNING, msg, args, fields)
+
+    def error(self, msg: str, *args, **fields) -> None:
+        self._log(logging.ERROR, msg, args, fields)
+
+    def exception(self, msg: str, *args, **fields) -> None:
+        self._log(logging.ERROR, msg, args, fields, exc_info=True)
+
+
+def get_logger(name: str) -> Logger:
+    """ Facade for a module, e.g. log = get_logger(__name__) """
+    logger = _loggers.get(name)
+    if logger is None:
+        if _handler is None:
+            configure()
+        logger = _loggers[name] = Logger(name)
+    return logger
+
+
+def configure(level: Optional[int] = None, stream=None, config_mode: Optional[str] = None) -> None:
+    """
+    Set the level and handler of the "app" logger tree and refresh every facade's cached
+    level checks. Safe to call again (create_app does, after loading .env).
+    """
+    global _handler
+    base = logging.getLogger(ROOT)
+    base.setLevel(level if level is not None else configured_level(config_mode))
+
+    if _handler is not None:
+        base.removeHandler(_handler)
+    _handler = logging.StreamHandler(stream or sys.stdout)
+    _handler.setFormatter(StructuredFormatter(as_json=os.environ.get("LOG_FORMAT", "").lower() == "json"))
+    base.addHandler(_handler)
+    base.propagate = False
+
+    for logger in _loggers.values():
+        logger.refresh()
@@ -0,0 +1,341 @@
+# metrics.py - in-process metrics
+# Per-operation database latency histograms, retry/rollback/failure counters (fed by
+# helper._run_with_db_retry, keyed by its operation_name) and a slow-query log fed by
+# SQLAlchemy cursor events, so each slow statement is attributed to its operation.
+# Also request latency per Flask endpoint, outbound latency/status/bytes per dependency
+# and cache hit counts, all rendered in Prometheus text format for /metrics.
+# Metrics are per worker process; the endpoints report the worker that answers.
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.tracing import span
+
+# Upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+current_operation: ContextVar[Optional[str]] = ContextVar("current_operation", default=None)
+
+_lock = threading.Lock()
+_operations: dict[str, "OperationStats"] = {}
+_slow_queries: deque = deque(maxlen=50)
+_slow_query_count = 0
+_requests: dict[tuple[str, str], "OperationStats"] = {}
+_request_statuses: dict[tuple[str, str, int], int] = {}
+_dependencies: dict[str, "OperationStats"] = {}
+_dependency_statuses: dict[tuple[str, str], int] = {}
+_dependency_bytes: dict[str, int] = {}
+_cache_counts: dict[str, list[int]] = {}
+_cache_sources: dict[str, Callable[[], tuple[int, int]]] = {}
+_slow_query_seconds = 0.5
+
+
+def configure() -> None:
+    """
+    Read DB_SLOW_QUERY_MS (default 500). The cursor listeners run for every statement, so
+    they use this cached value; called at import and again by create_app after .env loads.
+    """
+    global _slow_query_seconds
+    _slow_query_seconds = float(os.environ.get("DB_SLOW_QUERY_MS", "500")) / 1000
+
+
+def slow_query_seconds() -> float:
+    return _slow_query_seconds
+
+
+configure()
+
+
+class OperationStats:
+    """ Counters and a latency histogram for one operation_name """
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.rollbacks = 0
+        self.skipped = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds: float) -> None:
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rollbacks": self.rollbacks,
+            "skipped": self.skipped,
+            "total_seconds": round(self.total_seconds, 4),
+            "mean_seconds": round(self.total_seconds / self.calls, 4) if self.calls else None,
+            "max_seconds": round(self.max_seconds, 4),
+            "buckets": {**{str(b): n for b, n in zip(LATENCY_BUCKETS, self.buckets)}, "+Inf": self.buckets[-1]},
+        }
+
+
+def _stats(operation: str) -> OperationStats:
+    stats = _operations.get(operation)
+    if stats is None:
+        stats = _operations[operation] = OperationStats()
+    return stats
+
+
+def record_operation(operation: str, seconds: float, ok: bool, retries: int = 0) -> None:
+    with _lock:
+        stats = _stats(operation)
+        stats.observe(seconds)
+        stats.retries += retries
+        if not ok:
+            stats.failures += 1
+    # every operation also counts towards the SQL dependency
+    record_dependency("SQL", seconds, "ok" if ok else "error")
+
+
+def record_rollback(operation: str) -> None:
+    with _lock:
+        _stats(operation).rollbacks += 1
+
+
+def record_skipped(operation: str) -> None:
+    """ Call made while the database was not connected (returned its default) """
+    with _lock:
+        _stats(operation).skipped += 1
+
+
+def operation_stats() -> dict[str, dict]:
+    """ Per-operation stats, the operations taking the most total time first """
+    with _lock:
+        ordered = sorted(_operations.items(), key=lambda item: item[1].total_seconds, reverse=True)
+        return {name: stats.to_dict() for name, stats in ordered}
+
+
+def slow_queries() -> list[dict]:
+    with _lock:
+        return list(_slow_queries)
+
+
+def record_request(endpoint: str, method: str, status: int, seconds: float) -> None:
+    """ after_request hook data: one request to a Flask endpoint """
+    with _lock:
+        key = (endpoint, method)
+        stats = _requests.get(key)
+        if stats is None:
+            stats = _requests[key] = OperationStats()
+        stats.observe(seconds)
+        status_key = (endpoint, method, status)
+        _request_statuses[status_key] = _request_statuses.get(status_key, 0) + 1
+
+
+def record_dependency(dependency: str, seconds: float, status: str, size: int = 0) -> None:
+    with _lock:
+        stats = _dependencies.get(dependency)
+        if stats is None:
+            stats = _dependencies[dependency] = OperationStats()
+        stats.observe(seconds)
+        if status == "error":
+            stats.failures += 1
+        _dependency_statuses[(dependency, status)] = _dependency_statuses.get((dependency, status), 0) + 1
+        _dependency_bytes[dependency] = _dependency_bytes.get(dependency, 0) + size
+
+
+def call_dependency(dependency: str, send: Callable[..., Any], *args, **kwargs):
+    """
+    Call send(*args, **kwargs) - requests.get, requests.post etc. - and record its
+    latency, status code and response size against dependency (C7, CH, NameAPI, Graph).
+    Exceptions are recorded with status "error" and re-raised.
+    """
+    method = getattr(send, "__name__", "call").upper()
+    url = str(args[0] if args else kwargs.get("url", "")).split("?", 1)[0]
+    with span(f"{dependency} {method}", kind="client", dependency=dependency, url=url) as call_span:
+        started = time.perf_counter()
+        try:
+            response = send(*args, **kwargs)
+        except Exception:
+            record_dependency(dependency, time.perf_counter() - started, "error")
+            raise
+        size = 0
+        if not kwargs.get("stream"):
+            size = len(getattr(response, "content", b"") or b"")
+        status = str(getattr(response, "status_code", ""))
+        record_dependency(dependency, time.perf_counter() - started, status, size)
+        if call_span:
+            call_span.set(status_code=status, bytes=size)
+        return response
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0) -> None:
+    """ Add to the hit/miss counts of a cache that doesn't keep its own """
+    with _lock:
+        counts = _cache_counts.setdefault(cache, [0, 0])
+        counts[0] += hits
+        counts[1] += misses
+
+
+def register_cache(cache: str, source: Callable[[], tuple[int, int]]) -> None:
+    """ A cache that keeps its own counts; source() returns (hits, misses) at render time """
+    with _lock:
+        _cache_sources[cache] = source
+
+
+def cache_stats() -> dict[str, dict]:
+    with _lock:
+        counts = {name: tuple(c) for name, c in _cache_counts.items()}
+        sources = dict(_cache_sources)
+    for name, source in sources.items():
+        try:
+            counts[name] = tuple(source())
+        except Exception as e:
+            logging.warning(f"cache_stats: {name}: {e}")
+    return {
+        name: {"hits": hits, "misses": misses, "ratio": round(hits / (hits + misses), 4) if hits + misses else None}
+        for name, (hits, misses) in sorted(counts.items())
+    }
+
+
+def reset() -> None:
+    global _slow_query_count
+    with _lock:
+        for store in (_operations, _requests, _request_statuses, _dependencies, _dependency_statuses,
+                      _dependency_bytes, _cache_counts):
+            store.clear()
+        _slow_queries.clear()
+        _slow_query_count = 0
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_label_value(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram(lines: list[str], name: str, labels: dict, stats: "OperationStats") -> None:
+    cumulative = 0
+    for bound, count in zip([*LATENCY_BUCKETS, "+Inf"], stats.buckets):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_sum{_labels(**labels)} {stats.total_seconds:.6f}")
+    lines.append(f"{name}_count{_labels(**labels)} {stats.calls}")
+
+
+def render_prometheus() -> str:
+    """ Everything above in Prometheus text exposition format (version 0.0.4) """
+    lines: list[str] = []
+    with _lock:
+        requests_ = sorted(_requests.items())
+        request_statuses = sorted(_request_statuses.items())
+        dependencies = sorted(_dependencies.items())
+        dependency_statuses = sorted(_dependency_statuses.items())
+        dependency_bytes = sorted(_dependency_bytes.items())
+        operations = sorted(_operations.items())
+        slow_count = _slow_query_count
+
+    lines += ["# HELP cs_http_request_duration_seconds Request latency by Flask endpoint.",
+              "# TYPE cs_http_request_duration_seconds histogram"]
+    for (endpoint, method), stats in requests_:
+        _histogram(lines, "cs_http_request_duration_seconds", {"endpoint": endpoint, "method": method}, stats)
+    lines += ["# HELP cs_http_requests_total Requests by Flask endpoint and status code.",
+              "# TYPE cs_http_requests_total counter"]
+    lines += [f"cs_http_requests_total{_labels(endpoint=e, method=m, status=st)} {n}" for (e, m, st), n in request_statuses]
+
+    lines += ["# HELP cs_dependency_request_duration_seconds Outbound call latency by dependency.",
+              "# TYPE cs_dependency_request_duration_seconds histogram"]
+    for dependency, stats in dependencies:
+        _histogram(lines, "cs_dependency_request_duration_seconds", {"dependency": dependency}, stats)
+    lines += ["# HELP cs_dependency_requests_total Outbound calls by dependency and status code.",
+              "# TYPE cs_dependency_requests_total counter"]
+    lines += [f"cs_dependency_requests_total{_labels(dependency=d, status=st)} {n}" for (d, st), n in dependency_statuses]
+    lines += ["# HELP cs_dependency_response_bytes_total Response bytes received by dependency.",
+              "# TYPE cs_dependency_response_bytes_total counter"]
+    lines += [f"cs_dependency_response_bytes_total{_labels(dependency=d)} {n}" for d, n in dependency_bytes]
+
+    lines += ["# HELP cs_db_operation_duration_seconds Database operation latency (including retries) by operation_name.",
+              "# TYPE cs_db_operation_duration_seconds histogram"]
+    for operation, stats in operations:
+        _histogram(lines, "cs_db_operation_duration_seconds", {"operation": operation}, stats)
+    for counter, attr, help_text in (
+        ("cs_db_operation_retries_total", "retries", "Retries after connection errors"),
+        ("cs_db_operation_rollbacks_total", "rollbacks", "Session rollbacks after errors"),
+        ("cs_db_operation_failures_total", "failures", "Operations that returned their default after an error"),
+        ("cs_db_operation_skipped_total", "skipped", "Operations skipped because the database was not connected"),
+    ):
+        lines += [f"# HELP {counter} {help_text}.", f"# TYPE {counter} counter"]
+        lines += [f"{counter}{_labels(operation=op)} {getattr(stats, attr)}" for op, stats in operations]
+    lines += ["# HELP cs_db_slow_queries_total Statements slower than DB_SLOW_QUERY_MS.",
+              "# TYPE cs_db_slow_queries_total counter", f"cs_db_slow_queries_total {slow_count}"]
+
+    caches = cache_stats()
+    lines += ["# HELP cs_cache_hits_total Cache hits.", "# TYPE cs_cache_hits_total counter"]
+    lines += [f"cs_cache_hits_total{_labels(cache=c)} {v['hits']}" for c, v in caches.items()]
+    lines += ["# HELP cs_cache_misses_total Cache misses.", "# TYPE cs_cache_misses_total counter"]
+    lines += [f"cs_cache_misses_total{_labels(cache=c)} {v['misses']}" for c, v in caches.items()]
+    lines += ["# HELP cs_cache_hit_ratio Hits over lookups since the worker started.", "# TYPE cs_cache_hit_ratio gauge"]
+    lines += [f"cs_cache_hit_ratio{_labels(cache=c)} {v['ratio']}" for c, v in caches.items() if v["ratio"] is not None]
+
+    return "\n".join(lines) + "\n"
+
+
+def _format_parameters(parameters, executemany: bool) -> str:
+    if executemany and isinstance(parameters, (list, tuple)):
+        shown = f"{len(parameters)} rows, first {parameters[0]!r}" if parameters else "0 rows"
+    else:
+        shown = repr(parameters)
+    return shown if len(shown) <= 500 else shown[:497] + "..."
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute; drop its start time so the
+    # stack on a pooled connection does not grow and mistime the next statement
+    if context.connection is not None and context.execution_context is not None:
+        started = context.connection.info.get("query_started")
+        if started:
+            started.pop()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    if seconds < _slow_query_seconds:
+        return
+
+    entry = {
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "operation": current_operation.get() or "unlabelled",
+        "seconds": round(seconds, 4),
+        "statement": " ".join(statement.split())[:2000],
+        "parameters": _format_parameters(parameters, executemany),
+    }
+    global _slow_query_count
+    with _lock:
+        _slow_queries.append(entry)
+        _slow_query_count += 1
+    logging.warning(f"Slow query ({entry['operation']}, {entry['seconds']}s): {entry['statement']} -- {entry['parameters']}")
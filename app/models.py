@@ -1,14 +1,22 @@
 from app import db
-from sqlalchemy import Integer, String, Text, Identity
+from sqlalchemy import Integer, String, Text, Identity, Boolean, DateTime, Computed, Index
+
+# Case- and whitespace-insensitive SID, persisted and indexed so lookups can seek
+# (see normalise_sid / sid_matches in app/dbquery.py)
+SID_NORM_SQL = "UPPER(LTRIM(RTRIM(sid)))"
 
 # Service Standard Model - typically 8 standard per service ID (sid)
 class ServiceStandard(db.Model):
 
     __tablename__ = "ServiceStandard"      # <- exact table name in SQL Server
-    __table_args__ = {"schema": "dbo"}     # <- schema name in SQL Server
+    __table_args__ = (
+        Index("ix_ServiceStandard_sid_norm", "sid_norm"),
+        {"schema": "dbo"},                 # <- schema name in SQL Server
+    )
 
     stdid = db.Column(Integer, Identity(start=1, increment=1), primary_key=True, name='stdid')
     sid = db.Column(String(10))
+    sid_norm = db.Column(String(10), Computed(SID_NORM_SQL, persisted=True))
     ssn = db.Column(String(10))
     description = db.Column(String(255))
 
@@ -29,10 +37,14 @@ class ServiceStandard(db.Model):
 class ServiceArrangement(db.Model):
     
     __tablename__ = "ServiceArrangement"      # <- exact table name in SQL Server
-    __table_args__ = {"schema": "dbo"}       # <- schema name in SQL Server
+    __table_args__ = (
+        Index("ix_ServiceArrangement_sid_norm_day", "sid_norm", "day"),
+        {"schema": "dbo"},                    # <- schema name in SQL Server
+    )
 
     arrid = db.Column(Integer, Identity(start=1, increment=1), primary_key=True, name='arrid')
     sid = db.Column(String(10))
+    sid_norm = db.Column(String(10), Computed(SID_NORM_SQL, persisted=True))
     day = db.Column(String(10))
     defaultserviceperiod = db.Column(String(255))
     atservicebase = db.Column(String(255))
@@ -62,10 +74,14 @@ class ServiceArrangement(db.Model):
 class ServiceContract(db.Model):
 
     __tablename__ = "ServiceContract"      # <- exact table name in SQL Server
-    __table_args__ = {"schema": "dbo"}     # <- schema name in SQL Server
+    __table_args__ = (
+        Index("ix_ServiceContract_sid_norm", "sid_norm"),
+        {"schema": "dbo"},                 # <- schema name in SQL Server
+    )
 
     conid = db.Column(Integer, Identity(start=1, increment=1), primary_key=True, name='conid')
     sid = db.Column(String(10))    
+    sid_norm = db.Column(String(10), Computed(SID_NORM_SQL, persisted=True))
     specialconditions = db.Column(Text)
     context = db.Column(Text)
     
@@ -82,8 +98,48 @@ class ServiceContract(db.Model):
             "context": self.context
         }
 
+# Company Validation Model - latest Companies House verdict per company / director check
+class CompanyValidation(db.Model):
 
+    __tablename__ = "CompanyValidation"    # <- exact table name in SQL Server
+    __table_args__ = {"schema": "dbo"}     # <- schema name in SQL Server
 
+    cvid = db.Column(Integer, Identity(start=1, increment=1), primary_key=True, name='cvid')
+    regno = db.Column(String(10), index=True)
+    companyname = db.Column(String(255))
+    director = db.Column(String(255))
+    valid = db.Column(Boolean)
+    narrative = db.Column(String(500))
+    isdirector = db.Column(Boolean)
+    jurisdiction = db.Column(String(50))
+    status = db.Column(String(50))
+    address = db.Column(String(500))
+    checkedat = db.Column(DateTime)
+
+    def __init__(self, regno=None, companyname=None, director=None, valid=None, narrative=None,
+                 isdirector=None, jurisdiction=None, status=None, address=None, checkedat=None):
+        self.regno = regno
+        self.companyname = companyname
+        self.director = director
+        self.valid = valid
+        self.narrative = narrative
+        self.isdirector = isdirector
+        self.jurisdiction = jurisdiction
+        self.status = status
+        self.address = address
+        self.checkedat = checkedat
 
-
-
+    def to_dict(self):
+        return {
+            "cvid": self.cvid,
+            "regno": self.regno,
+            "companyname": self.companyname,
+            "director": self.director,
+            "valid": self.valid,
+            "narrative": self.narrative,
+            "isdirector": self.isdirector,
+            "jurisdiction": self.jurisdiction,
+            "status": self.status,
+            "address": self.address,
+            "checkedat": self.checkedat
+        }
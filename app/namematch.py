@@ -0,0 +1,129 @@
+# namematch.py - in-process person name matching
+# Used by validateCH to settle clear-cut director matches without a NameAPI round trip;
+# names that do not clearly match are always referred to NameAPI.
+from __future__ import annotations
+import re
+import unicodedata
+from typing import Iterable, NamedTuple
+
+# Honorifics and post-nominals that carry no identity information
+_IGNORED_TOKENS = {
+    "MR", "MRS", "MS", "MISS", "MX", "DR", "PROF", "SIR", "DAME", "LORD", "LADY", "REV",
+    "JR", "JNR", "SR", "SNR", "II", "III", "OBE", "MBE", "CBE", "KBE", "QC", "KC",
+}
+
+# Confidence at or above which a local match is trusted without asking NameAPI
+MATCH_THRESHOLD = 0.8
+
+
+class NameMatch(NamedTuple):
+    """
+    Result of comparing two person names.
+    match_type uses the NameAPI vocabulary (EQUAL, MATCHING, SIMILAR, NO_MATCH)
+    plus AMBIGUOUS for cases that should be referred to NameAPI.
+    """
+    match_type: str
+    confidence: float
+
+    @property
+    def decisive(self) -> bool:
+        return self.match_type != "AMBIGUOUS"
+
+    @property
+    def is_match(self) -> bool:
+        return self.confidence >= MATCH_THRESHOLD
+
+
+def normalise_name(name: str) -> list[str]:
+    """
+    Convert a name to comparable tokens: accents and punctuation removed, upper case,
+    honorifics dropped and 'Surname, Forenames' reordered to 'Forenames Surname'.
+    """
+    name = (name or "").strip()
+    if "," in name:
+        surname, forenames = name.split(",", 1)
+        name = f"{forenames} {surname.split(':')[0]}"
+
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    name = name.upper().replace("'", "").replace("’", "")
+    tokens = re.split(r"[^A-Z]+", name)
+    return [t for t in tokens if t and t not in _IGNORED_TOKENS]
+
+
+def _forenames_match(short: list[str], long: list[str]) -> float:
+    """
+    Score forenames in order: 1.0 when all agree exactly, 0.8 when some are only
+    initials of the other, 0.0 otherwise. Extra middle names on one side are allowed,
+    but the first forenames must agree (MICHAEL JOHN HORN is not JOHN HORN); a surname
+    with no forename at all is not enough to decide.
+    """
+    if not short:
+        return 0.5
+    used_initial = False
+    remaining = list(long)
+    for position, token in enumerate(short):
+        # later forenames may skip the other side's middle names, the first may not
+        for i, other in enumerate(remaining if position else remaining[:1]):
+            if token == other:
+                break
+            if (len(token) == 1 or len(other) == 1) and token[0] == other[0]:
+                used_initial = True
+                break
+        else:
+            return 0.0
+        del remaining[:i + 1]
+    return 0.8 if used_initial else 1.0
+
+
+def match_names(name1: str, name2: str) -> NameMatch:
+    """
+    Compare two person names, returning a match type and a 0..1 confidence.
+    """
+    a = normalise_name(name1)
+    b = normalise_name(name2)
+
+    if not a or not b:
+        return NameMatch("AMBIGUOUS", 0.5)
+    if a == b:
+        return NameMatch("EQUAL", 1.0)
+    if sorted(a) == sorted(b):
+        # forename / surname transposition
+        return NameMatch("MATCHING", 0.95)
+
+    shared = set(a) & set(b)
+    if not shared:
+        # could still be a spelling variant (Smyth / Smith) - let NameAPI decide
+        return NameMatch("AMBIGUOUS", 0.0)
+
+    # Surnames must agree exactly; try both the natural and the transposed reading
+    best = 0.0
+    for sa, fa in ((a[-1], a[:-1]), (a[0], a[1:])):
+        for sb, fb in ((b[-1], b[:-1]), (b[0], b[1:])):
+            if sa != sb:
+                continue
+            short, long = (fa, fb) if len(fa) <= len(fb) else (fb, fa)
+            best = max(best, _forenames_match(short, long))
+
+    if best >= 1.0:
+        return NameMatch("MATCHING", 0.9)
+    if best >= MATCH_THRESHOLD:
+        return NameMatch("SIMILAR", best)
+
+    # e.g. nicknames or a changed surname - let NameAPI decide
+    return NameMatch("AMBIGUOUS", round(len(shared) / len(set(a) | set(b)), 2))
+
+
+def best_match(name: str, candidates: Iterable[str]) -> NameMatch:
+    """
+    Best match for name among candidates. Any decisive match wins; an ambiguous
+    candidate outranks a clear NO_MATCH so that it still gets referred to NameAPI.
+    """
+    best = NameMatch("NO_MATCH", 0.0)
+    for candidate in candidates:
+        result = match_names(name, candidate)
+        if result.is_match and result.confidence > best.confidence:
+            best = result
+        elif not best.is_match and result.match_type == "AMBIGUOUS":
+            best = result
+    return best
@@ -0,0 +1,109 @@
+# preload.py - fork-safe start-up for gunicorn --preload
+# With preload_app, create_app() runs once in the gunicorn master and the workers are
+# forked from it. Anything holding sockets or threads - the SQL engine and its pool, the
+# startup probe and background connect, replica sync and the wake scheduler - must not be
+# created before the fork, so create_app defers them while APP_PRELOAD is set and each
+# worker starts its own in post_fork (start_worker). What is safe to share read-only is
+# built once in the master instead (warm): the secrets config, the compiled templates,
+# the Colleague 7 client directory and the lazily imported libraries.
+from __future__ import annotations
+import os
+import time
+from typing import Optional
+
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+_config: Optional[dict] = None
+_warm_timings: dict[str, float] = {}
+
+
+def deferred() -> bool:
+    """ True in a gunicorn master with preload_app (gunicorn.conf.py sets APP_PRELOAD) """
+    return os.environ.get("APP_PRELOAD", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def preload_clients() -> bool:
+    """ Load the client directory in the master (PRELOAD_CLIENTS, default on) """
+    return os.environ.get("PRELOAD_CLIENTS", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+def config_snapshot() -> Optional[dict]:
+    """ The secrets config read in the master, or None when not preloaded """
+    return _config
+
+
+def snapshot_config() -> dict:
+    """ Read the secrets config now and keep it for config_snapshot() """
+    from app.helper import read_config
+
+    global _config
+    _config = read_config()
+    return _config
+
+
+def warm_timings() -> dict[str, float]:
+    return dict(_warm_timings)
+
+
+def _timed(name: str, step) -> None:
+    started = time.perf_counter()
+    try:
+        step()
+    except Exception as e:
+        log.warning("preload: %s failed, workers will load it on first use: %s", name, e)
+        return
+    _warm_timings[name] = round(time.perf_counter() - started, 3)
+
+
+def warm(app) -> dict[str, float]:
+    """
+    Build the read-only warm state in this process before workers are forked from it.
+    Each step is best effort; returns seconds taken per step that succeeded.
+    """
+    from app import preload_modules
+
+    def templates():
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+
+    def clients():
+        from app.c7query import loadC7Clients
+
+        if loadC7Clients() is None:
+            raise RuntimeError("Colleague 7 did not return the client list")
+
+    _timed("config", snapshot_config)
+    _timed("templates", templates)
+    if preload_clients():
+        with app.app_context():
+            _timed("clients", clients)
+    _timed("modules", preload_modules)
+    log.info("preload: warm state built", **_warm_timings)
+    return warm_timings()
+
+
+def start_worker(app=None) -> None:
+    """
+    Called in each worker after fork (gunicorn post_fork): drop anything inherited that
+    holds connections, then connect to the database and start this worker's threads.
+    """
+    import app as app_package
+    from app import dbwake, metrics, replica, warmup
+
+    target = app or app_package.app_instance
+    with target.app_context():
+        for engine in target.extensions["sqlalchemy"].engines.values():
+            # the master's pool (if any) belongs to the master; close=False leaves its sockets alone
+            engine.dispose(close=False)
+    app_package.db_wake_thread = None
+    # counts recorded while warming belong to the master, not to every worker
+    metrics.reset()
+    warmup.reset()
+
+    app_package.initialize_database_connection(target)
+    warmup.start(target)
+    replica.start_replica_sync(target)
+    dbwake.start_wake_scheduler()
+    log.debug("preload: worker %s started", os.getpid())
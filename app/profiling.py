@@ -0,0 +1,178 @@
+# profiling.py - on-demand cProfile of single requests
+# A request is profiled when an admin asks for it (X-Profile: 1 header or ?profile=1,
+# with the METRICS_TOKEN bearer token) or when it is picked by PROFILE_SAMPLE_RATE.
+# Each profile is written to PROFILE_DIR as a .prof file named after the route and time,
+# alongside a small JSON summary; only the newest PROFILE_KEEP are kept.
+from __future__ import annotations
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+_write_lock = threading.Lock()
+NAME_PATTERN = re.compile(r"^[\w.-]+$")
+UNSAFE_CHARS = re.compile(r"[^\w.-]")
+
+
+def profile_dir() -> str:
+    default = os.path.join(os.path.dirname(__file__), "instance", "profiles")
+    return os.environ.get("PROFILE_DIR", default)
+
+
+def sample_rate() -> float:
+    """ Fraction of requests profiled without being asked (PROFILE_SAMPLE_RATE, default 0) """
+    return float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+
+
+def keep_count() -> int:
+    return int(os.environ.get("PROFILE_KEEP", "20"))
+
+
+def requested(headers, args) -> bool:
+    """ True if the request asks to be profiled (X-Profile header or ?profile query flag) """
+    flag = headers.get("X-Profile") or args.get("profile") or ""
+    return flag.strip().lower() in ("1", "true", "yes", "on")
+
+
+def should_profile(asked: bool, allowed: bool) -> Optional[str]:
+    """ Why this request should be profiled ("requested" or "sampled"), or None """
+    if asked and allowed:
+        return "requested"
+    rate = sample_rate()
+    if rate > 0 and random.random() < rate:
+        return "sampled"
+    return None
+
+
+def start() -> Optional[cProfile.Profile]:
+    """
+    Start profiling the current thread. Returns None if another profiler is already
+    active here (only one can run per thread), so the request just isn't profiled.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        log.debug("profiling: could not start profiler: %s", e)
+        return None
+    return profiler
+
+
+def report(stats: pstats.Stats, limit: int = 40, sort: str = "cumulative") -> str:
+    """ pstats text report of the top `limit` functions """
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+def top_functions(stats: pstats.Stats, limit: int = 10) -> list[dict]:
+    """ The functions with the most cumulative time, for the summary """
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({name})" if line else name,
+            "calls": calls,
+            "own_ms": round(own * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def finish(profiler: cProfile.Profile, endpoint: str, method: str, path: str, status: int,
+           seconds: float, reason: str, trace_id: Optional[str] = None) -> Optional[str]:
+    """ Stop profiling and store the profile; returns its name, or None if it could not be written """
+    profiler.disable()
+    now = datetime.now(timezone.utc)
+    name = f"{now.strftime('%Y%m%dT%H%M%S%f')}-{UNSAFE_CHARS.sub('_', endpoint)}"
+    summary = {
+        "name": name,
+        "endpoint": endpoint,
+        "method": method,
+        "path": path,
+        "status": status,
+        "ms": round(seconds * 1000, 3),
+        "reason": reason,
+        "trace_id": trace_id,
+        "profiled_at": now.isoformat(timespec="seconds"),
+    }
+    directory = profile_dir()
+    try:
+        stats = pstats.Stats(profiler)
+        summary["top"] = top_functions(stats)
+        with _write_lock:
+            os.makedirs(directory, exist_ok=True)
+            stats.dump_stats(os.path.join(directory, f"{name}.prof"))
+            with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as fh:
+                json.dump(summary, fh)
+            _prune(directory)
+    except (OSError, TypeError) as e:
+        log.warning("profiling: could not store profile for %s: %s", endpoint, e)
+        return None
+    log.info("profiling: stored %s", name, endpoint=endpoint, ms=summary["ms"], reason=reason)
+    return name
+
+
+def _prune(directory: str) -> None:
+    summaries = sorted(f for f in os.listdir(directory) if f.endswith(".json"))
+    for old in summaries[:-keep_count()] if keep_count() > 0 else summaries:
+        base = old[:-len(".json")]
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(directory, base + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def latest(limit: int = 20) -> list[dict]:
+    """ Summaries of the newest stored profiles, newest first """
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((f for f in os.listdir(directory) if f.endswith(".json")), reverse=True)[:limit]
+    summaries = []
+    for filename in names:
+        try:
+            with open(os.path.join(directory, filename), encoding="utf-8") as fh:
+                summaries.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return summaries
+
+
+def profile_path(name: str) -> Optional[str]:
+    """ Path of a stored .prof file, or None for an unknown or unsafe name """
+    if not NAME_PATTERN.match(name):
+        return None
+    path = os.path.join(profile_dir(), f"{name}.prof")
+    return path if os.path.exists(path) else None
+
+
+def profile_report(name: str, limit: int = 40, sort: str = "cumulative") -> Optional[str]:
+    path = profile_path(name)
+    if path is None:
+        return None
+    return report(pstats.Stats(path), limit, sort)
+
+
+class RequestProfiler:
+    """ Per-request state kept on flask.g between before_request and after_request """
+
+    __slots__ = ("profiler", "reason", "started")
+
+    def __init__(self, profiler: cProfile.Profile, reason: str):
+        self.profiler = profiler
+        self.reason = reason
+        self.started = time.perf_counter()
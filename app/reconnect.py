@@ -0,0 +1,162 @@
+# reconnect.py - background reconnect manager for Azure SQL serverless
+# One engine is built up front and reused for every attempt; attempts back off
+# exponentially with jitter while the database resumes, and once it answers the pool
+# is pre-warmed so the first user request doesn't pay for connection setup.
+from __future__ import annotations
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+_history: deque = deque(maxlen=50)
+_prewarm: dict = {}
+_history_lock = threading.Lock()
+
+
+def reconnect_timeout() -> int:
+    """ Connection/login timeout for each attempt, in seconds """
+    return int(os.environ.get("DB_RECONNECT_TIMEOUT", "30"))
+
+
+def is_waking_error(error: str) -> bool:
+    """ Errors Azure SQL serverless returns while resuming (or that look like it) """
+    return '40613' in error or '08001' in error or 'timeout' in error.lower()
+
+
+def _remember(entry: dict) -> None:
+    with _history_lock:
+        _history.append(entry)
+
+
+def prewarm(engine, connections: Optional[int] = None) -> int:
+    """
+    Open pool_size connections at once and hand them back to the pool, so they are
+    ready for the first requests. Returns how many were opened.
+    """
+    count = connections if connections is not None else engine.pool.size()
+    started = time.monotonic()
+    opened = []
+    try:
+        for _ in range(count):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        logging.warning(f"prewarm: opened {len(opened)} of {count} connections: {e}")
+    finally:
+        for conn in opened:
+            conn.close()
+
+    seconds = round(time.monotonic() - started, 3)
+    with _history_lock:
+        _prewarm.update({"connections": len(opened), "seconds": seconds, "at": datetime.now().isoformat(timespec="seconds")})
+    log.debug("prewarm: %s connection(s) in %ss", len(opened), seconds)
+    return len(opened)
+
+
+def prewarm_in_background(engine) -> threading.Thread:
+    thread = threading.Thread(target=prewarm, args=(engine,), name="db-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+class ReconnectManager:
+    """
+    Retries the database until it answers, reusing one engine. The delay before
+    attempt n+1 is min(max_delay, base_delay * 2**n) scaled by a random factor in
+    [0.5, 1], so workers started together don't retry in lockstep.
+    """
+
+    def __init__(
+        self,
+        engine_factory: Callable[[int], object],
+        timeout: Optional[int] = None,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+        max_attempts: int = 30,
+        sleep: Callable[[float], None] = time.sleep,
+        rng: Optional[random.Random] = None,
+    ):
+        self.engine_factory = engine_factory
+        self.timeout = timeout if timeout is not None else reconnect_timeout()
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.last_error: Optional[str] = None
+        self.timed_out = False
+
+    def delay(self, attempt: int) -> float:
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return ceiling * self.rng.uniform(0.5, 1.0)
+
+    def run(self):
+        """
+        Try until the database answers, then pre-warm the pool and return the engine.
+        Returns None on a non-waking error or when attempts run out (timed_out);
+        last_error says why.
+        """
+        try:
+            engine = self.engine_factory(self.timeout)
+        except Exception as e:
+            self.last_error = str(e)
+            logging.error(f"Database engine could not be created: {e}")
+            return None
+
+        for attempt in range(self.max_attempts):
+            started = time.monotonic()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            except Exception as e:
+                self.last_error = str(e)
+                waking = is_waking_error(self.last_error)
+                wait = self.delay(attempt) if waking and attempt < self.max_attempts - 1 else 0.0
+                _remember({
+                    "attempt": attempt + 1, "at": datetime.now().isoformat(timespec="seconds"),
+                    "seconds": round(time.monotonic() - started, 3), "ok": False,
+                    "error": self.last_error[:200], "retry_in": round(wait, 1),
+                })
+                if not waking:
+                    logging.error(f"Database connection failed with non-waking error: {e}")
+                    engine.dispose()
+                    return None
+                logging.info(f"Database still waking up, attempt {attempt + 1}/{self.max_attempts}, retrying in {wait:.1f}s")
+                if wait:
+                    self.sleep(wait)
+                continue
+
+            _remember({
+                "attempt": attempt + 1, "at": datetime.now().isoformat(timespec="seconds"),
+                "seconds": round(time.monotonic() - started, 3), "ok": True, "error": None, "retry_in": None,
+            })
+            prewarm(engine)
+            return engine
+
+        self.timed_out = True
+        engine.dispose()
+        return None
+
+
+def reconnect_status() -> dict:
+    """ Attempt history and the last pre-warm, for /db-status """
+    with _history_lock:
+        attempts = list(_history)
+        warmed = dict(_prewarm) or None
+    connected = [a for a in attempts if a["ok"]]
+    return {
+        "attempts": attempts,
+        "last_connect_seconds": connected[-1]["seconds"] if connected else None,
+        "prewarm": warmed,
+    }
@@ -0,0 +1,303 @@
+# replica.py - local SQLite read-replica of the service tables
+# While the Azure SQL serverless database resumes, service standards, arrangements and
+# contract records are read from a local copy, and the bulk saves are applied to that
+# copy and queued, then replayed against Azure SQL once it is back.
+# The copy is refreshed by a scheduled full sync, by every read from the primary
+# (write-through) and after every commit (see dbquery.invalidateServiceCache).
+from __future__ import annotations
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, create_engine, delete, event, func, insert, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.helper import db_query_all, is_database_connected
+from app.models import ServiceArrangement, ServiceContract, ServiceStandard
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+# Replicated models with their primary keys, in bundle order (standard, arrangement, contract)
+REPLICATED = (
+    (ServiceStandard, ServiceStandard.stdid),
+    (ServiceArrangement, ServiceArrangement.arrid),
+    (ServiceContract, ServiceContract.conid),
+)
+
+# Bookkeeping tables that only exist in the replica file, never in Azure SQL
+replica_metadata = MetaData(schema="dbo")
+write_queue = Table(
+    "ReplicaWriteQueue", replica_metadata,
+    Column("qid", Integer, primary_key=True),
+    Column("operation", String(50), nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("queuedat", String(32), nullable=False),
+    # the process replaying the write, so only one worker sends it to Azure SQL
+    Column("claimedby", String(100)),
+    Column("claimedat", String(32)),
+)
+sync_state = Table(
+    "ReplicaSyncState", replica_metadata,
+    Column("name", String(50), primary_key=True),
+    Column("value", String(64)),
+)
+
+_engine = None
+_engine_path: Optional[str] = None
+_engine_lock = threading.Lock()
+
+
+def replica_enabled() -> bool:
+    return os.environ.get("DB_REPLICA", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def replica_path() -> str:
+    default = os.path.join(os.path.dirname(__file__), "instance", "replica.db")
+    return os.environ.get("DB_REPLICA_PATH", default)
+
+
+def sync_interval_seconds() -> float:
+    return float(os.environ.get("DB_REPLICA_SYNC_SECONDS", "900"))
+
+
+def claim_timeout_seconds() -> float:
+    """ How long a claimed write waits before another process takes it over (DB_REPLICA_CLAIM_SECONDS, default 600) """
+    return float(os.environ.get("DB_REPLICA_CLAIM_SECONDS", "600"))
+
+
+def replica_engine():
+    """
+    Engine for the replica. The file is attached as the dbo schema, so the same models
+    and statements run against it as against Azure SQL.
+    """
+    global _engine, _engine_path
+    path = replica_path()
+    with _engine_lock:
+        if _engine is None or _engine_path != path:
+            if _engine is not None:
+                _engine.dispose()
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            engine = create_engine("sqlite://", connect_args={"check_same_thread": False, "timeout": 30})
+
+            @event.listens_for(engine, "connect")
+            def attach_dbo(dbapi_connection, connection_record):
+                dbapi_connection.execute("ATTACH DATABASE ? AS dbo", (path,))
+
+            tables = [model.__table__ for model, _ in REPLICATED]
+            tables[0].metadata.create_all(engine, tables=tables)
+            replica_metadata.create_all(engine)
+            _add_claim_columns(engine)
+            _engine, _engine_path = engine, path
+        return _engine
+
+
+def _add_claim_columns(engine) -> None:
+    """ Replica files made before writes were claimed lack the claim columns; create_all leaves existing tables alone """
+    with engine.begin() as conn:
+        present = {c["name"] for c in inspect(conn).get_columns(write_queue.name, schema=write_queue.schema)}
+        for column in (write_queue.c.claimedby, write_queue.c.claimedat):
+            if column.name not in present:
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {write_queue.schema}.{write_queue.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def lastSynced() -> Optional[str]:
+    """ When the replica last completed a full sync (ISO UTC), or None if it never has """
+    with replica_engine().connect() as conn:
+        return conn.execute(select(sync_state.c.value).where(sync_state.c.name == "synced_at")).scalar()
+
+
+def is_serving() -> bool:
+    """ True when reads and saves should go to the replica: enabled, primary down, replica populated """
+    return replica_enabled() and not is_database_connected() and lastSynced() is not None
+
+
+def execute_all(stmt) -> list:
+    """ Run a select against the replica; rows as mappings, like helper.db_query_all """
+    with replica_engine().connect() as conn:
+        return conn.execute(stmt).mappings().all()
+
+
+def storeServiceData(data: dict[str, tuple]) -> None:
+    """
+    Replace the replica's rows for each SID with data just read from the primary.
+    data maps sid_norm -> (standards, arrangements, contract), as dbquery fetches it.
+    """
+    rows = {model: [] for model, _ in REPLICATED}
+    for standards, arrangements, contract in data.values():
+        rows[ServiceStandard] += standards
+        rows[ServiceArrangement] += arrangements
+        if contract:
+            rows[ServiceContract].append(contract)
+
+    with replica_engine().begin() as conn:
+        for model, pk in REPLICATED:
+            keys = [row[pk.key] for row in rows[model]]
+            conn.execute(delete(model).where(or_(model.sid_norm.in_(list(data)), pk.in_(keys))))
+            if rows[model]:
+                conn.execute(insert(model), [dict(row) for row in rows[model]])
+
+
+def syncReplica() -> Optional[dict]:
+    """
+    Copy the replicated tables from Azure SQL into the replica in one transaction.
+    Returns row counts per table, or None if the primary could not be read.
+    """
+    copied = {}
+    for model, pk in REPLICATED:
+        columns = [c for c in model.__table__.columns if c.computed is None]
+        failed: list = []
+        result = db_query_all(select(*columns).order_by(pk), operation_name=f"syncReplica.{model.__tablename__}", default=failed)
+        if result is failed:
+            return None
+        copied[model] = [dict(row) for row in result]
+
+    with replica_engine().begin() as conn:
+        for model, _ in REPLICATED:
+            conn.execute(delete(model))
+            if copied[model]:
+                conn.execute(insert(model), copied[model])
+        conn.execute(delete(sync_state).where(sync_state.c.name == "synced_at"))
+        conn.execute(insert(sync_state).values(name="synced_at", value=_now()))
+
+    counts = {model.__tablename__: len(rows) for model, rows in copied.items()}
+    log.debug("syncReplica: %s", counts)
+    return counts
+
+
+def provisionalKeys(pk, count: int) -> list[int]:
+    """
+    Keys for rows added while the primary is down. They are negative so they can never
+    collide with a key Azure SQL assigns; the rows are replaced when the queue is replayed.
+    """
+    with replica_engine().connect() as conn:
+        lowest = conn.execute(select(func.min(pk))).scalar() or 0
+    start = min(lowest, 0) - 1
+    return [start - i for i in range(count)]
+
+
+def queueWrite(operation: str, payload: dict, apply: Callable[[Session], None]) -> None:
+    """
+    Apply a save to the replica (so it shows on the next read) and queue it for replay.
+    operation names a save function in app.dbquery, called with **payload on replay.
+    """
+    with Session(replica_engine()) as session:
+        apply(session)
+        session.execute(insert(write_queue).values(operation=operation, payload=json.dumps(payload), queuedat=_now()))
+        session.commit()
+    logging.info(f"queueWrite: {operation} queued while the database is unavailable")
+
+
+def pendingWrites() -> list[dict]:
+    with replica_engine().connect() as conn:
+        return [dict(row) for row in conn.execute(select(write_queue).order_by(write_queue.c.qid)).mappings()]
+
+
+def _claimant() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _claimNext(claimant: str) -> Optional[dict]:
+    """
+    Claim the oldest queued write for claimant. Returns None when the queue is empty or
+    another process holds the claim (writes are replayed in order, so it is replaying).
+    A claim older than claim_timeout_seconds() belongs to a process that died mid-replay
+    and is taken over. The claim is one compare-and-set UPDATE, so two workers polling
+    the same replica file can never both claim a write.
+    """
+    with replica_engine().begin() as conn:
+        head = conn.execute(select(write_queue).order_by(write_queue.c.qid).limit(1)).mappings().first()
+        if head is None:
+            return None
+        if head["claimedby"] not in (None, claimant):
+            claimed_at = datetime.fromisoformat(head["claimedat"])
+            if (datetime.now(timezone.utc) - claimed_at).total_seconds() < claim_timeout_seconds():
+                return None
+            log.warning("replayQueuedWrites: taking over %s (queued %s) from %s, claimed at %s; "
+                        "it may already have been applied", head["operation"], head["queuedat"],
+                        head["claimedby"], head["claimedat"])
+        claimed = conn.execute(
+            update(write_queue)
+            .where(write_queue.c.qid == head["qid"],
+                   write_queue.c.claimedby.is_not_distinct_from(head["claimedby"]),
+                   write_queue.c.claimedat.is_not_distinct_from(head["claimedat"]))
+            .values(claimedby=claimant, claimedat=_now())
+        )
+        return dict(head) if claimed.rowcount == 1 else None
+
+
+def replayQueuedWrites() -> int:
+    """
+    Replay queued saves against Azure SQL in the order they were made. Each write is
+    claimed before it is sent, so when every worker polls the same queue only one of them
+    replays it. Stops at the first failure, releasing it and leaving everything after it
+    queued. Returns how many this process replayed.
+    """
+    from app import dbquery
+
+    claimant = _claimant()
+    replayed = 0
+    while (item := _claimNext(claimant)) is not None:
+        mine = (write_queue.c.qid == item["qid"]) & (write_queue.c.claimedby == claimant)
+        save = getattr(dbquery, item["operation"])
+        if save(**json.loads(item["payload"])) is None:
+            with replica_engine().begin() as conn:
+                conn.execute(update(write_queue).where(mine).values(claimedby=None, claimedat=None))
+            logging.error(f"replayQueuedWrites: {item['operation']} (queued {item['queuedat']}) failed, will retry")
+            break
+        with replica_engine().begin() as conn:
+            conn.execute(delete(write_queue).where(mine))
+        replayed += 1
+
+    if replayed:
+        logging.info(f"replayQueuedWrites: replayed {replayed} queued write(s)")
+    return replayed
+
+
+def _sync_loop(app) -> None:
+    next_sync = 0.0
+    while True:
+        try:
+            if is_database_connected():
+                with app.app_context():
+                    replayQueuedWrites()
+                    if time.monotonic() >= next_sync and syncReplica() is not None:
+                        # jitter so several workers don't all sync at once
+                        next_sync = time.monotonic() + sync_interval_seconds() * random.uniform(0.9, 1.1)
+        except Exception as e:
+            logging.error(f"replica sync failed: {e}")
+        # poll often so queued writes go out soon after the database comes back
+        time.sleep(5)
+
+
+def start_replica_sync(app) -> Optional[threading.Thread]:
+    """ Start the background sync/replay thread when DB_REPLICA is set """
+    if not replica_enabled():
+        return None
+    thread = threading.Thread(target=_sync_loop, args=(app,), name="replica-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+@click.command("replica-sync")
+@with_appcontext
+def replica_sync_command():
+    """ Replay queued writes and copy the service tables into the local replica now """
+    replayed = replayQueuedWrites()
+    counts = syncReplica()
+    if counts is None:
+        raise click.ClickException("Could not read from the database; replica left as it was")
+    click.echo(f"Replayed {replayed} queued write(s); copied {counts}")
@@ -0,0 +1,266 @@
+# tracing.py - lightweight request tracing
+# Each Flask request gets a root span; outbound calls (metrics.call_dependency), Key Vault
+# reads, DB operations (helper._run_with_db_retry) and @traced functions add child spans.
+# Tracing is off unless TRACING is set. Finished traces are appended to a JSON-lines file,
+# one span per line, rotated once it reaches TRACE_SINK_MAX_MB, and optionally sent to an
+# OTLP/HTTP collector. Log lines written during a request carry its trace ID.
+from __future__ import annotations
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+_sink_lock = threading.Lock()
+_otlp_queue: "queue.Queue[list[dict]]" = queue.Queue(maxsize=1000)
+_otlp_thread: Optional[threading.Thread] = None
+
+
+def tracing_enabled() -> bool:
+    """ Trace requests (TRACING, default off) """
+    return os.environ.get("TRACING", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def trace_sink_path() -> str:
+    default = os.path.join(os.path.dirname(__file__), "instance", "traces.jsonl")
+    return os.environ.get("TRACE_SINK", default)
+
+
+def trace_sink_max_bytes() -> int:
+    """ Size at which the sink is rotated to <sink>.1, replacing the previous one (TRACE_SINK_MAX_MB, default 10) """
+    return int(float(os.environ.get("TRACE_SINK_MAX_MB", "10")) * 1024 * 1024)
+
+
+def trace_min_seconds() -> float:
+    """ Only requests at least this slow are exported (TRACE_MIN_MS, default 0: all) """
+    return float(os.environ.get("TRACE_MIN_MS", "0")) / 1000
+
+
+def otlp_endpoint() -> Optional[str]:
+    endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "").strip().rstrip("/")
+    return f"{endpoint}/v1/traces" if endpoint else None
+
+
+class Span:
+    """ One timed operation; spans of a trace share a list so the root can export them all """
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start", "end",
+                 "_started", "status", "spans")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], attributes: dict):
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status = "ok"
+        self.spans: list[Span] = parent.spans if parent else []
+        self.spans.append(self)
+
+    @property
+    def seconds(self) -> float:
+        return (self.end - self.start) if self.end is not None else time.perf_counter() - self._started
+
+    def set(self, **attributes) -> None:
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.end = self.start + (time.perf_counter() - self._started)
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"[:300]
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": round(self.start, 6),
+            "ms": round(self.seconds * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def start_trace(name: str, **attributes) -> Optional[Span]:
+    """ Begin a root span (one per request); returns it so it can be finished later """
+    if not tracing_enabled():
+        return None
+    root = Span(name, "server", None, attributes)
+    _current_span.set(root)
+    return root
+
+
+def finish_trace(root: Optional[Span], error: Optional[BaseException] = None) -> None:
+    """ Finish the root span and export the trace if it is slow enough """
+    if root is None:
+        return
+    root.finish(error)
+    if _current_span.get() is root:
+        _current_span.set(None)
+    if root.seconds >= trace_min_seconds():
+        export([span.to_dict() for span in root.spans if span.end is not None])
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes) -> Iterator[Optional[Span]]:
+    """
+    Child span of the current one. Outside a trace (CLI jobs, tests) nothing is recorded
+    and None is yielded, so callers can always write `with span(...) as s: ... if s: ...`.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, kind, parent, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.finish(e)
+        raise
+    else:
+        child.finish()
+    finally:
+        _current_span.reset(token)
+
+
+def traced(func: Callable) -> Callable:
+    """ Decorator: run func in a span named after it (e.g. c7query.getC7Contact) """
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current_span.get() is None:
+            return func(*args, **kwargs)
+        with span(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def in_context(func: Callable) -> Callable:
+    """ Bind func to the caller's trace, for work handed to a thread pool """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def export(spans: list[dict]) -> None:
+    if not spans:
+        return
+    path = trace_sink_path()
+    lines = "".join(json.dumps(s, default=str) + "\n" for s in spans)
+    try:
+        with _sink_lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) >= trace_sink_max_bytes():
+                os.replace(path, f"{path}.1")
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write(lines)
+    except OSError as e:
+        logging.warning(f"tracing: could not write {path}: {e}")
+
+    if otlp_endpoint():
+        _start_otlp_exporter()
+        try:
+            _otlp_queue.put_nowait(spans)
+        except queue.Full:
+            pass
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: list[dict]) -> dict:
+    """ Spans as an OTLP/HTTP JSON ExportTraceServiceRequest """
+    kinds = {"internal": 1, "server": 2, "client": 3}
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "cs-document-generator"}}]},
+        "scopeSpans": [{
+            "scope": {"name": "app.tracing"},
+            "spans": [{
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                **({"parentSpanId": s["parent_id"]} if s["parent_id"] else {}),
+                "name": s["name"],
+                "kind": kinds.get(s["kind"], 1),
+                "startTimeUnixNano": str(int(s["start"] * 1e9)),
+                "endTimeUnixNano": str(int((s["start"] + s["ms"] / 1000) * 1e9)),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+                "status": {"code": 2 if s["status"] == "error" else 1},
+            } for s in spans],
+        }],
+    }]}
+
+
+def _otlp_loop() -> None:
+    import requests
+
+    while True:
+        spans = _otlp_queue.get()
+        url = otlp_endpoint()
+        if not url:
+            continue
+        try:
+            requests.post(url, json=otlp_payload(spans), timeout=5)
+        except Exception as e:
+            logging.debug(f"tracing: OTLP export failed: {e}")
+
+
+def _start_otlp_exporter() -> None:
+    global _otlp_thread
+    with _sink_lock:
+        if _otlp_thread is None or not _otlp_thread.is_alive():
+            _otlp_thread = threading.Thread(target=_otlp_loop, name="otlp-export", daemon=True)
+            _otlp_thread.start()
+
+
+# -----------------------------
+# Logging
+# -----------------------------
+class TraceIdFilter(logging.Filter):
+    """ Adds record.trace_id and prefixes messages logged inside a trace with it """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace_id = current_trace_id()
+        record.trace_id = trace_id or "-"
+        if trace_id and isinstance(record.msg, str) and not record.msg.startswith("[trace "):
+            record.msg = f"[trace {trace_id[:16]}] {record.msg}"
+        return True
+
+
+def install_log_filter(logger: Optional[logging.Logger] = None) -> None:
+    target = logger or logging.getLogger()
+    if not any(isinstance(f, TraceIdFilter) for f in target.filters):
+        target.addFilter(TraceIdFilter())
@@ -3,35 +3,34 @@ import os
 from flask import render_template, request, redirect, url_for, session, send_file, flash, jsonify, abort
 from flask import Blueprint, send_from_directory
 
-from app.models import ServiceStandard, ServiceArrangement, ServiceContract
+from app.models import ServiceStandard
 from app.c7query import  searchC7Candidate, getC7ContactsByCompany, gatherC7data,\
     getC7Candidate, getC7Candidates, getC7Contact, loadC7Clients, setC7CandidateMSASent
-from app.dbquery import loadServiceStandards, loadServiceArrangements
-from app.chquery import validateCH, searchCH
+from app.dbquery import WEEKDAYS, invalidateServiceCache, saveServiceArrangements, saveServiceContract, saveServiceStandards
+from app.loader import get_loader, log_loader_counts
+from app.chquery import searchCH
+from app.chbatch import validateCHStored
 from app.classes import Company
 from app.helper import (
     formatName,
     uploadToSharePoint,
     serve_docx,
-    downloadFromSharePoint,
-    db_query_scalar,
-    db_query_one_or_none,
+    build_export_workbook,
+    downloadTemplate,
     db_get_by_pk,
     db_commit,
-    db_add,
     db_delete,
 )
 from datetime import datetime
-from sqlalchemy import select, func
-import pandas as pd
-from io import BytesIO
-from openpyxl import load_workbook
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.utils import get_column_letter
 import time
 from typing import List
 
 views_bp = Blueprint('views', __name__)
+views_bp.after_request(log_loader_counts)
+
+# SharePoint template merged for the NDA preview; app/warmup.py downloads it ahead of the first preview
+NDA_TEMPLATE_FOLDER = "Templates/Business templates/Service Provider Templates"
+NDA_TEMPLATE_FILE = "Service Provider NDA AUTOMATED MASTER.docx"
 
 @views_bp.route('/', methods=["GET", "POST"])
 def index():
@@ -106,18 +105,18 @@ def validateC7():
         # 1. Candidate        
         ch_candidatename = contract.get("candidateName").split("(")
         ch_candidatename = ch_candidatename[0]
-        ch_result = validateCH(contract.get("candidateltdregno"), contract.get("candidateltdname"), ch_candidatename)
-
-        if not ch_result.get("Valid", False):
-            flash(ch_result.get("Narrative",""), "error")
-            passed = False
+        checks = [(contract.get("candidateltdregno"), contract.get("candidateltdname"), ch_candidatename)]
 
         # 2. Client - only where clientname is present
         client_companyname = contract.get("companyregistrationnumber")
 
         if client_companyname:
-            ch_result = validateCH(client_companyname, contract.get("companyname"))
+            checks.append((client_companyname, contract.get("companyname")))
 
+        # Stored verdicts from the nightly ch-revalidate run are used when fresh;
+        # the rest run concurrently. Results come back in check order so the
+        # flash messages read candidate first, then client
+        for ch_result in validateCHStored(checks):
             if not ch_result.get("Valid", False):
                 flash(ch_result.get("Narrative",""), "error")
                 passed = False
@@ -162,13 +161,10 @@ def set_servicestandards():
             # No contract data needed for CS Standards
             contract = {"sid": service_id, "serviceid": service_id}
 
-        if which == "SP Standards":
-            contract_record = db_query_scalar(
-                select(ServiceContract).where(func.upper(ServiceContract.sid) == func.upper(service_id)),
-                operation_name="set_servicestandards.get_contract_context",
-            )
-            if contract_record:
-                contract['context'] = contract_record.context or ''
+        # Standards and contract record from one (cached) bundle read
+        bundle = get_loader().bundle(service_id)
+        if which == "SP Standards" and bundle.contract:
+            contract['context'] = bundle.contract.get('context') or ''
 
     elif request.method == 'POST':
 
@@ -180,39 +176,11 @@ def set_servicestandards():
         # Zip and process them here:
         standards = list(zip(stdids, ssns, descriptions))
 
-        # Example: print or save them
-        for stdid, ssn, desc in standards:
-            if ssn:
-                rawDesc = desc.strip().strip('"')    
-                record = None
-                if stdid and stdid.isdigit():
-                    record = db_get_by_pk(
-                        ServiceStandard,
-                        int(stdid),
-                        operation_name="set_servicestandards.lookup_standard",
-                    )
-                if record:
-                    record.ssn = ssn.strip()
-                    record.description = rawDesc
-                else:   
-                    if ssn.strip() and desc.strip():
-                        new_standard = ServiceStandard()
-                        new_standard.sid = service_id
-                        new_standard.ssn = ssn.strip()
-                        new_standard.description = rawDesc
-                        db_add(new_standard)
-        
-        if not db_commit("set_servicestandards.save_standards"):
+        # One fetch for the submitted IDs, then a batched write of the changed rows
+        if saveServiceStandards(service_id, standards) is None:
             flash("Failed to save service standards due to a database error.", "error")
             return redirect(url_for('views.set_servicestandards', which=which))
 
-        # Store standards in session for later use
-        #session['serviceStandards'] = [s.to_dict() for s in standards]
-        session['serviceStandards'] = [
-            {'id': stdid, 'ssn': ssn, 'description': desc.strip().strip('"')}
-            for stdid, ssn, desc in standards
-        ]
-
         if which == "SP Standards":
             # Persist to session contract for later exports
             contract = session.get('sessionContract', {})     
@@ -223,25 +191,16 @@ def set_servicestandards():
             raw = request.form.get('context')
             specialconditions = raw.strip() if isinstance(raw, str) else ''
 
-            contract_record = db_query_scalar(
-                select(ServiceContract).where(func.upper(ServiceContract.sid) == func.upper(service_id)),
-                operation_name="set_servicestandards.lookup_contract",
-            )
-            if not contract_record:
-                contract_record = ServiceContract(sid=service_id, specialconditions=specialconditions, context=context)
-                db_add(contract_record)
-            else:
-                contract_record.context = context
-                contract_record.specialconditions = specialconditions
-
-            # Commit all changes once
-            if not db_commit("set_servicestandards.save_contract"):
+            if saveServiceContract(service_id, context, specialconditions) is None:
                 flash("Failed to save contract context due to a database error.", "error")
                 return redirect(url_for('views.set_servicestandards', which=which))
 
             
-    # (re)load for display 
-    standards = loadServiceStandards(service_id) 
+    # (re)load for display: the full set for the SID, including what was just written
+    standards = get_loader().bundle(service_id).standards
+    if request.method == 'POST':
+        # Store standards in session for later use
+        session['serviceStandards'] = standards
     return render_template('standards.html', contract=contract, standards=standards, which=which)
 
 
@@ -270,6 +229,8 @@ def delete_standard(stdid):
     db_delete(standard)
     if not db_commit("delete_standard.commit"):
         flash("Failed to delete the service standard due to a database error.", "error")
+    else:
+        invalidateServiceCache(sid)
 
     return redirect(url_for('views.set_servicestandards', which=which))
 
@@ -288,92 +249,41 @@ def manage_servicearrangements():
     contract = session['sessionContract']    
     service_id = contract.get("sid", "")
 
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-
     if request.method == 'POST':
-        # For each day, get or create, then update from form (or sensible defaults for new rows)
-        for day in days:
-            arrangement_stmt = select(ServiceArrangement).where(
-                func.upper(ServiceArrangement.sid) == func.upper(service_id),
-                ServiceArrangement.day == day,
-            )
-            arrangement = db_query_one_or_none(
-                arrangement_stmt,
-                operation_name=f"manage_servicearrangements.lookup_{day.lower()}",
-            )
-
-            is_weekend = day in {'Saturday', 'Sunday'}
-
-            def _default(field: str) -> str:
-                if is_weekend:
-                    if field == 'defaultserviceperiod':
-                        return 'As agreed if required'
-                    if field == 'atservicebase':
-                        return 'As agreed if required'
-                    if field == 'atclientlocation':
-                        return 'As agreed if required'
-                    if field == 'atotherlocation':
-                        return 'Prior approval required'
-                else:
-                    if field == 'defaultserviceperiod':
-                        return 'As specified 0800 - 1800'
-                    if field == 'atservicebase':
-                        return 'As specified'
-                    if field == 'atclientlocation':
-                        return 'As specified'
-                    if field == 'atotherlocation':
-                        return 'Prior approval required'
-                return ''
-
-            if arrangement is None:
-                arrangement = ServiceArrangement(sid=service_id, day=day)
-                db_add(arrangement)
-
-            # Update from form (fall back to defaults when creating; fall back to existing otherwise)
-            arrangement.defaultserviceperiod = request.form.get(f'{day}_default',
-                                                                arrangement.defaultserviceperiod or _default('defaultserviceperiod'))
-            arrangement.atservicebase = request.form.get(f'{day}_base',
-                                                         arrangement.atservicebase or _default('atservicebase'))
-            arrangement.atclientlocation = request.form.get(f'{day}_client',
-                                                            arrangement.atclientlocation or _default('atclientlocation'))
-            arrangement.atotherlocation = request.form.get(f'{day}_other',
-                                                           arrangement.atotherlocation or _default('atotherlocation'))
+        # Gather the form; fields left out keep their stored value (or the default for new rows)
+        form_values = {
+            day: {
+                'defaultserviceperiod': request.form.get(f'{day}_default'),
+                'atservicebase': request.form.get(f'{day}_base'),
+                'atclientlocation': request.form.get(f'{day}_client'),
+                'atotherlocation': request.form.get(f'{day}_other'),
+            }
+            for day in WEEKDAYS
+        }
 
         # Special conditions (stored on the contract record if present)
         raw = request.form.get('SpecialConditions')
         specialconditions = raw.strip() if isinstance(raw, str) else ''
 
-        contract_record = db_query_scalar(
-            select(ServiceContract).where(func.upper(ServiceContract.sid) == func.upper(service_id)),
-            operation_name="manage_servicearrangements.lookup_contract",
-        )
-        if not contract_record:
-            contract_record = ServiceContract(sid=service_id, specialconditions=specialconditions)
-            db_add(contract_record)
-        else:
-            contract_record.specialconditions = specialconditions
-
-        # Commit all changes once
-        if not db_commit("manage_servicearrangements.commit"):
+        # One read and one batched write; returns what was written for re-display
+        bundle = saveServiceArrangements(service_id, form_values, specialconditions)
+        if bundle is None:
             flash("Failed to save service arrangements due to a database error.", "error")
             return redirect(url_for('views.manage_servicearrangements'))
 
         # Persist to session for later exports
         session['specialConditions'] = specialconditions
-    
-    # GET: (re)load for display
-    arr_list = loadServiceArrangements(service_id) or []  # returns list and sets session cache      
+    else:
+        # GET: arrangements and contract record in one round trip
+        bundle = get_loader().bundle(service_id)
+
+    arr_list = bundle.arrangements
+    if arr_list:
+        session['serviceArrangements'] = arr_list
     # Make a mapping keyed by day so Jinja can do arrangements.get("Monday")
-    arrangements = {
-        (row.get('day') if isinstance(row, dict) else row.day): row
-        for row in arr_list
-    }
-    contract_record = db_query_scalar(
-        select(ServiceContract).where(func.upper(ServiceContract.sid) == func.upper(service_id)),
-        operation_name="manage_servicearrangements.load_contract",
-    )
-    if contract_record:
-        contract['specialconditions'] = contract_record.specialconditions or ''
+    arrangements = {row['day']: row for row in arr_list}
+    if bundle.contract:
+        contract['specialconditions'] = bundle.contract.get('specialconditions') or ''
     return render_template('arrangements.html', arrangements=arrangements, contract=contract)
 
 
@@ -448,19 +358,17 @@ def download_client_contract():
                 session['sessionContract'] = contract
 
     # Load service standards and arrangements if not already in session
-    service_standards = session.get('serviceStandards', loadServiceStandards(sid))    
-    arrangements = session.get('serviceArrangements', loadServiceArrangements(sid))
+    bundle = get_loader().bundle(sid)
+    service_standards = session.get('serviceStandards') or bundle.standards
+    arrangements = session.get('serviceArrangements') or bundle.arrangements
     
     agreement_date = request.form.get('AgreementDate', '')
     f_agreement_date = datetime.strptime(agreement_date, "%Y-%m-%d").date()
     f_agreement_date = f_agreement_date.strftime("%d/%m/%Y")
         
-    contract_record = db_query_scalar(
-        select(ServiceContract).where(func.upper(ServiceContract.sid) == func.upper(sid)),
-        operation_name="download_client_contract.lookup_contract",
-    )
-    special_conditions = contract_record.specialconditions if contract_record else ''
-    context = contract_record.context if contract_record else ''
+    contract_record = bundle.contract or {}
+    special_conditions = contract_record.get('specialconditions', '')
+    context = contract_record.get('context', '')
 
     # Build rows
     data_rows = []
@@ -534,33 +442,8 @@ def download_client_contract():
                 
     data_rows.append(row)
 
-    # Create DataFrame
-    df = pd.DataFrame(data_rows)
-
-    # Write to Excel in-memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-
-    output.seek(0)
-    wb = load_workbook(output)
-    ws = wb['Sheet1']
-
-    # add table
-    df_rows = len(df) + 1
-    df_cols = len(df.columns)
-    df_range = f"A1:{get_column_letter(df_cols)}{df_rows}"
-
-    table1 = Table(displayName="Table1", ref=df_range)
-    table1.tableStyleInfo = TableStyleInfo(
-        name="TableStyleMedium9", showRowStripes=False, showColumnStripes=False
-    )
-    ws.add_table(table1)
-
-    # Save final output
-    final_output = BytesIO()
-    wb.save(final_output)
-    final_output.seek(0)
+    # One-row Excel table for the mail merge
+    final_output = build_export_workbook(data_rows)
     
     # Upload to SharePoint
     target_url = "Review"
@@ -593,19 +476,17 @@ def download_client_renewal():
     sid = contract.get("sid", "")
     
     # Ensure service standards and arrangements are loaded
-    service_standards = session.get('serviceStandards', loadServiceStandards(sid))    
-    arrangements = session.get('serviceArrangements', loadServiceArrangements(sid))
+    bundle = get_loader().bundle(sid)
+    service_standards = session.get('serviceStandards') or bundle.standards
+    arrangements = session.get('serviceArrangements') or bundle.arrangements
     
     agreement_date = request.form.get('AgreementDate', '')
     f_agreement_date = datetime.strptime(agreement_date, "%Y-%m-%d").date()
     f_agreement_date = f_agreement_date.strftime("%d/%m/%Y")
         
-    contract_record = db_query_scalar(
-        select(ServiceContract).where(func.upper(ServiceContract.sid) == func.upper(sid)),
-        operation_name="download_client_renewal.lookup_contract",
-    )
-    special_conditions = contract_record.specialconditions if contract_record else ''
-    context = contract_record.context if contract_record else ''
+    contract_record = bundle.contract or {}
+    special_conditions = contract_record.get('specialconditions', '')
+    context = contract_record.get('context', '')
     
     # Build rows
     data_rows = []
@@ -680,33 +561,8 @@ def download_client_renewal():
                 
     data_rows.append(row)
 
-    # Create DataFrame
-    df = pd.DataFrame(data_rows)
-
-    # Write to Excel in-memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-
-    output.seek(0)
-    wb = load_workbook(output)
-    ws = wb['Sheet1']
-
-    # add table
-    df_rows = len(df) + 1
-    df_cols = len(df.columns)
-    df_range = f"A1:{get_column_letter(df_cols)}{df_rows}"
-
-    table1 = Table(displayName="Table1", ref=df_range)
-    table1.tableStyleInfo = TableStyleInfo(
-        name="TableStyleMedium9", showRowStripes=False, showColumnStripes=False
-    )
-    ws.add_table(table1)
-
-    # Save final output
-    final_output = BytesIO()
-    wb.save(final_output)
-    final_output.seek(0)
+    # One-row Excel table for the mail merge
+    final_output = build_export_workbook(data_rows)
     
     # Upload to SharePoint
     target_url = "Review"
@@ -801,33 +657,8 @@ def download_sp_msa():
             
     data_rows.append(row)
 
-    # Create DataFrame
-    df = pd.DataFrame(data_rows)
-
-    # Write to Excel in-memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-
-    output.seek(0)
-    wb = load_workbook(output)
-    ws = wb['Sheet1']
-
-    # add table
-    df_rows = len(df) + 1
-    df_cols = len(df.columns)
-    df_range = f"A1:{get_column_letter(df_cols)}{df_rows}"
-
-    table1 = Table(displayName="Table1", ref=df_range)
-    table1.tableStyleInfo = TableStyleInfo(
-        name="TableStyleMedium9", showRowStripes=False, showColumnStripes=False
-    )
-    ws.add_table(table1)
-
-    # Save final output
-    final_output = BytesIO()
-    wb.save(final_output)
-    final_output.seek(0)
+    # One-row Excel table for the mail merge
+    final_output = build_export_workbook(data_rows)
 
     # Upload to SharePoint
     target_url = "Docusign"
@@ -905,33 +736,8 @@ def download_client_msa():
 
     data_rows.append(row)
 
-    # Create DataFrame
-    df = pd.DataFrame(data_rows)
-
-    # Write to Excel in-memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-
-    output.seek(0)
-    wb = load_workbook(output)
-    ws = wb['Sheet1']
-
-    # add table
-    df_rows = len(df) + 1
-    df_cols = len(df.columns)
-    df_range = f"A1:{get_column_letter(df_cols)}{df_rows}"
-
-    table1 = Table(displayName="Table1", ref=df_range)
-    table1.tableStyleInfo = TableStyleInfo(
-        name="TableStyleMedium9", showRowStripes=False, showColumnStripes=False
-    )
-    ws.add_table(table1)
-
-    # Save final output
-    final_output = BytesIO()
-    wb.save(final_output)
-    final_output.seek(0)
+    # One-row Excel table for the mail merge
+    final_output = build_export_workbook(data_rows)
     
     # Upload to SharePoint
 
@@ -1186,13 +992,13 @@ def download_sp_nda():
     action = request.form.get('action', '')
 
     if action == "Preview":
-        target_folder = "Templates/Business templates/Service Provider Templates"
-        target_file = "Service Provider NDA AUTOMATED MASTER.docx"
+        target_folder = NDA_TEMPLATE_FOLDER
+        target_file = NDA_TEMPLATE_FILE
         candidate_name = request.form.get('candidate-name', '')
         candidate_address = request.form.get('address', '')
         candidate_email = request.form.get('candidate-email', '')
 
-        file_bytes = downloadFromSharePoint(target_folder, target_file)
+        file_bytes = downloadTemplate(target_folder, target_file)
         
         if not file_bytes:
             flash("Failed to download Service Provider NDA template from SharePoint.", "error")
@@ -1231,33 +1037,8 @@ def download_sp_nda():
                 
         data_rows.append(row)
 
-        # Create DataFrame
-        df = pd.DataFrame(data_rows)
-
-        # Write to Excel in-memory
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Sheet1')
-
-        output.seek(0)
-        wb = load_workbook(output)
-        ws = wb['Sheet1']
-
-        # add table
-        df_rows = len(df) + 1
-        df_cols = len(df.columns)
-        df_range = f"A1:{get_column_letter(df_cols)}{df_rows}"
-
-        table1 = Table(displayName="Table1", ref=df_range)
-        table1.tableStyleInfo = TableStyleInfo(
-            name="TableStyleMedium9", showRowStripes=False, showColumnStripes=False
-        )
-        ws.add_table(table1)
-
-        # Save final output
-        final_output = BytesIO()
-        wb.save(final_output)
-        final_output.seek(0)
+        # One-row Excel table for the mail merge
+        final_output = build_export_workbook(data_rows)
 
         # Upload to SharePoint
         target_url = "Docusign"
@@ -1348,25 +1129,21 @@ def download_sp_contract():
     
     service_id = contract.get("sid", "")
 
-    cs_standards = loadServiceStandards("CS") or []
+    # One round trip for the CS standards and everything held for this SID
+    bundle = get_loader().bundle(service_id, include_cs=True)
+    cs_standards = bundle.cs_standards
 
     # Ensure service standards and arrangements are loaded
-    service_standards = session.get('serviceStandards')
-    if not service_standards:
-        service_standards = loadServiceStandards(service_id) or []
-
-    arrangements = session.get('serviceArrangements', loadServiceArrangements(service_id))        
+    service_standards = session.get('serviceStandards') or bundle.standards
+    arrangements = session.get('serviceArrangements') or bundle.arrangements
     agreement_date = request.form.get('AgreementDate', '')
     
     f_agreement_date = datetime.strptime(agreement_date, "%Y-%m-%d").date()
     f_agreement_date = f_agreement_date.strftime("%d/%m/%Y")
 
-    contract_record = db_query_scalar(
-        select(ServiceContract).where(func.upper(ServiceContract.sid) == func.upper(service_id)),
-        operation_name="download_sp_contract.lookup_contract",
-    )
-    special_conditions = contract_record.specialconditions if contract_record else ''
-    context = contract_record.context if contract_record else ''
+    contract_record = bundle.contract or {}
+    special_conditions = contract_record.get('specialconditions', '')
+    context = contract_record.get('context', '')
 
     # Build rows
     data_rows = []
@@ -1410,8 +1187,8 @@ def download_sp_contract():
     
     # Flatten CS standards   
     for i, std in enumerate(cs_standards, start=1):        
-        row[f"SSN{i}"] = std.ssn or ""
-        row[f"SSDescription{i}"] = std.description or ""
+        row[f"SSN{i}"] = std.get('ssn') or ""
+        row[f"SSDescription{i}"] = std.get('description') or ""
         cs_count += 1
 
     # Flatten service standards
@@ -1446,33 +1223,8 @@ def download_sp_contract():
                 
     data_rows.append(row)
 
-    # Create DataFrame
-    df = pd.DataFrame(data_rows)
-
-    # Write to Excel in-memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-
-    output.seek(0)
-    wb = load_workbook(output)
-    ws = wb['Sheet1']
-
-    # add table
-    df_rows = len(df) + 1
-    df_cols = len(df.columns)
-    df_range = f"A1:{get_column_letter(df_cols)}{df_rows}"
-
-    table1 = Table(displayName="Table1", ref=df_range)
-    table1.tableStyleInfo = TableStyleInfo(
-        name="TableStyleMedium9", showRowStripes=False, showColumnStripes=False
-    )
-    ws.add_table(table1)
-
-    # Save final output
-    final_output = BytesIO()
-    wb.save(final_output)
-    final_output.seek(0)
+    # One-row Excel table for the mail merge
+    final_output = build_export_workbook(data_rows)
     
         # Upload to SharePoint
     target_url = "Review"
@@ -1505,23 +1257,22 @@ def download_sp_renewal():
     
     service_id = contract.get("sid", "")
 
-    cs_standards = loadServiceStandards("CS") or []
+    # One round trip for the CS standards and everything held for this SID
+    bundle = get_loader().bundle(service_id, include_cs=True)
+    cs_standards = bundle.cs_standards
 
     # Ensure service standards and arrangements are loaded
-    service_standards = session.get('serviceStandards', loadServiceStandards(service_id))
-    arrangements = session.get('serviceArrangements', loadServiceArrangements(service_id))
+    service_standards = session.get('serviceStandards') or bundle.standards
+    arrangements = session.get('serviceArrangements') or bundle.arrangements
         
     agreement_date = request.form.get('AgreementDate', '')
     
     f_agreement_date = datetime.strptime(agreement_date, "%Y-%m-%d").date()
     f_agreement_date = f_agreement_date.strftime("%d/%m/%Y")
 
-    contract_record = db_query_scalar(
-        select(ServiceContract).where(func.upper(ServiceContract.sid) == func.upper(service_id)),
-        operation_name="download_sp_renewal.lookup_contract",
-    )
-    special_conditions = contract_record.specialconditions if contract_record else ''
-    context = contract_record.context if contract_record else ''
+    contract_record = bundle.contract or {}
+    special_conditions = contract_record.get('specialconditions', '')
+    context = contract_record.get('context', '')
 
     # Build rows
     data_rows = []
@@ -1565,8 +1316,8 @@ def download_sp_renewal():
     
     # Flatten CS standards   
     for i, std in enumerate(cs_standards, start=1):        
-        row[f"SSN{i}"] = std.ssn or ""
-        row[f"SSDescription{i}"] = std.description or ""
+        row[f"SSN{i}"] = std.get('ssn') or ""
+        row[f"SSDescription{i}"] = std.get('description') or ""
         cs_count += 1
 
     # Flatten service standards
@@ -1601,33 +1352,8 @@ def download_sp_renewal():
                 
     data_rows.append(row)
 
-    # Create DataFrame
-    df = pd.DataFrame(data_rows)
-
-    # Write to Excel in-memory
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Sheet1')
-
-    output.seek(0)
-    wb = load_workbook(output)
-    ws = wb['Sheet1']
-
-    # add table
-    df_rows = len(df) + 1
-    df_cols = len(df.columns)
-    df_range = f"A1:{get_column_letter(df_cols)}{df_rows}"
-
-    table1 = Table(displayName="Table1", ref=df_range)
-    table1.tableStyleInfo = TableStyleInfo(
-        name="TableStyleMedium9", showRowStripes=False, showColumnStripes=False
-    )
-    ws.add_table(table1)
-
-    # Save final output
-    final_output = BytesIO()
-    wb.save(final_output)
-    final_output.seek(0)
+    # One-row Excel table for the mail merge
+    final_output = build_export_workbook(data_rows)
     
         # Upload to SharePoint
     target_url = "Review"
@@ -0,0 +1,224 @@
+# warmup.py - prime what the first requests after a deploy would otherwise load
+# create_app starts a background thread after the database probe (each worker starts its
+# own under gunicorn --preload) that reads the Key Vault secrets, resolves and reaches each
+# API host, loads the Colleague 7 client directory, downloads the SharePoint merge template,
+# waits for the database and loads the CS standards. /health reports the process is alive;
+# /ready answers 200 only once the critical items (WARMUP_CRITICAL) are warm.
+from __future__ import annotations
+import os
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from app.log import get_logger
+
+log = get_logger(__name__)
+
+ITEMS = ("secrets", "hosts", "clients", "templates", "database", "cs_standards")
+DEFAULT_CRITICAL = ("secrets", "database", "cs_standards")
+
+# The external APIs the app calls; each new connection pays for DNS and the TLS handshake
+API_HOSTS = (
+    "https://coll7openapi.azure-api.net",
+    "https://api.company-information.service.gov.uk",
+    "https://api.nameapi.org",
+    "https://graph.microsoft.com",
+)
+
+_status: dict[str, dict] = {}
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_finished_at: Optional[float] = None
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _names(name: str, default) -> tuple[str, ...]:
+    value = os.environ.get(name)
+    if value is None:
+        return tuple(default)
+    return tuple(item for item in (part.strip().lower() for part in value.split(",")) if item in ITEMS)
+
+
+def warmup_enabled() -> bool:
+    """ Run the warm-up on start (WARMUP, default on) """
+    return _flag("WARMUP", "1")
+
+
+def warmup_items() -> tuple[str, ...]:
+    """ Items to warm, comma separated (WARMUP_ITEMS, default all of ITEMS) """
+    return _names("WARMUP_ITEMS", ITEMS)
+
+
+def critical_items() -> tuple[str, ...]:
+    """ Items /ready waits for (WARMUP_CRITICAL, default secrets,database,cs_standards) """
+    return tuple(item for item in _names("WARMUP_CRITICAL", DEFAULT_CRITICAL) if item in warmup_items())
+
+
+def db_wait_seconds() -> float:
+    """ How long the database item waits for the connection (WARMUP_DB_WAIT_SECONDS, default 300) """
+    return float(os.environ.get("WARMUP_DB_WAIT_SECONDS", "300"))
+
+
+def retry_seconds() -> float:
+    """ How soon /ready re-runs failed items (WARMUP_RETRY_SECONDS, default 30) """
+    return float(os.environ.get("WARMUP_RETRY_SECONDS", "30"))
+
+
+def status() -> dict[str, dict]:
+    with _lock:
+        return {name: dict(item) for name, item in _status.items()}
+
+
+def ready() -> bool:
+    """ True once every critical item is warm; without a warm-up, once the database is connected """
+    import app as app_package
+
+    if not warmup_enabled():
+        return app_package.db_connected
+    with _lock:
+        return all(_status.get(name, {}).get("state") == "ok" for name in critical_items())
+
+
+def _set(name: str, state: str, **fields) -> None:
+    with _lock:
+        _status[name] = {"state": state, "critical": name in critical_items(), **fields}
+
+
+def _warm_secrets(app) -> None:
+    from app.preload import config_snapshot, snapshot_config
+
+    # a preloaded master has already read them for its workers
+    if config_snapshot() is None:
+        snapshot_config()
+
+
+def _warm_hosts(app) -> None:
+    # Each API call opens its own connection (module-level requests.get/post), so only DNS
+    # and the route to each host can be primed; any HTTP answer means the host is reachable
+    failed = []
+    for url in API_HOSTS:
+        try:
+            requests.head(url, timeout=10, allow_redirects=False)
+        except requests.RequestException as e:
+            failed.append(f"{urlparse(url).hostname}: {e}")
+    if failed:
+        raise RuntimeError("; ".join(failed))
+
+
+def _warm_clients(app) -> None:
+    from app.c7query import loadC7Clients
+
+    with app.app_context():
+        if loadC7Clients() is None:
+            raise RuntimeError("Colleague 7 did not return the client list")
+
+
+def _warm_templates(app) -> None:
+    from app.helper import downloadTemplate
+    from app.views import NDA_TEMPLATE_FILE, NDA_TEMPLATE_FOLDER
+
+    if not downloadTemplate(NDA_TEMPLATE_FOLDER, NDA_TEMPLATE_FILE):
+        raise RuntimeError(f"could not download {NDA_TEMPLATE_FILE} from SharePoint")
+
+
+def _warm_database(app) -> None:
+    import app as app_package
+
+    deadline = time.monotonic() + db_wait_seconds()
+    while not app_package.db_connected:
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"database not connected after {db_wait_seconds():.0f}s: {app_package.db_error}")
+        time.sleep(1)
+
+
+def _warm_cs_standards(app) -> None:
+    import app as app_package
+    from app.dbquery import loadServiceBundle
+
+    if not app_package.db_connected:
+        raise RuntimeError("database not connected")
+    with app.app_context():
+        if not loadServiceBundle("CS").standards:
+            raise RuntimeError("no CS standards returned")
+
+
+STEPS: dict[str, Callable] = {
+    "secrets": _warm_secrets,
+    "hosts": _warm_hosts,
+    "clients": _warm_clients,
+    "templates": _warm_templates,
+    "database": _warm_database,
+    "cs_standards": _warm_cs_standards,
+}
+
+
+def run(app, names: Optional[tuple[str, ...]] = None) -> dict[str, dict]:
+    """
+    Warm each item in turn (all of warmup_items() unless names is given). A failed item
+    is recorded and does not stop the rest. Returns the status of every item.
+    """
+    global _finished_at
+
+    names = warmup_items() if names is None else names
+    for name in names:
+        _set(name, "pending")
+    for name in names:
+        _set(name, "running")
+        started = time.perf_counter()
+        try:
+            STEPS[name](app)
+        except Exception as e:
+            seconds = round(time.perf_counter() - started, 3)
+            _set(name, "failed", seconds=seconds, error=str(e))
+            log.warning("warmup: %s failed after %.3fs: %s", name, seconds, e, item=name)
+            continue
+        _set(name, "ok", seconds=round(time.perf_counter() - started, 3))
+
+    _finished_at = time.monotonic()
+    current = status()
+    log.info("warmup: finished, ready=%s", ready(),
+             **{name: item.get("seconds") for name, item in current.items() if item["state"] == "ok"})
+    return current
+
+
+def start(app, names: Optional[tuple[str, ...]] = None) -> Optional[threading.Thread]:
+    """ Run the warm-up in a daemon thread unless one is running or WARMUP is off """
+    global _thread
+
+    if not warmup_enabled():
+        return None
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return _thread
+        _thread = threading.Thread(target=run, args=(app, names), name="warmup", daemon=True)
+        _thread.start()
+        return _thread
+
+
+def ensure_started(app) -> None:
+    """ From /ready: start the warm-up if it never ran here, or retry failed items after retry_seconds() """
+    if not warmup_enabled():
+        return
+    current = status()
+    if not current:
+        start(app)
+        return
+    failed = tuple(name for name, item in current.items() if item["state"] == "failed")
+    if failed and _finished_at is not None and time.monotonic() - _finished_at >= retry_seconds():
+        start(app, failed)
+
+
+def reset() -> None:
+    """ Forget the warm-up state (a forked worker warms itself) """
+    global _thread, _finished_at
+
+    with _lock:
+        _status.clear()
+        _thread = None
+        _finished_at = None
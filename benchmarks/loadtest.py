@@ -0,0 +1,304 @@
+"""
+Load test: N concurrent users walking the real journeys through the app under gunicorn.
+
+Each virtual user repeats the journey a consultant makes: open the home page, type a
+candidate's surname (one /searchcandidates call per keystroke, as the page does), select
+the candidate, open the colleague data, validate against Companies House, load and save
+the SP standards, load and save the service arrangements, then export the SP contract
+and the NDA. Users pick the fixture candidates in turn.
+
+By default each --config is started under gunicorn with benchmarks/loadtest_app.py (the
+real create_app() with offline fakes and SQLite), loaded for --duration seconds and
+stopped; throughput and p50/p95/p99 are reported per step. A config is sync:WORKERS or
+gthread:WORKERSxTHREADS. Use --url to load an app that is already running instead.
+FAKE_SERVICES_LATENCY_MS (for example c7=80,ch=120,graph=150) is passed to the server
+to stand in for backend latency.
+
+    python benchmarks/loadtest.py [--users 8] [--duration 30] [--think 0.5]
+                                  [--config sync:4 --config gthread:2x8] [--url http://host:port]
+                                  [--save results.json]
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from typing import Optional
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# (surname typed into the search box, candidate ID selected); service IDs are seeded by loadtest_app
+CANDIDATES = [("okafor", 5905), ("patel", 9233), ("brennan", 8954), ("ng: sp", 8851)]
+STEPS = ["home", "typeahead", "select candidate", "colleague data", "validate", "standards page",
+         "standards save", "arrangements page", "arrangements save", "contract export", "nda export"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+STANDARD_IDS = re.compile(r'name="id" value="(\d+)"')
+
+
+class Recorder:
+    """ Latencies and failures per step, shared by the user threads """
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.journeys = 0
+        self._lock = threading.Lock()
+
+    def record(self, step: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[step].append(seconds)
+            if not ok:
+                self.errors[step] += 1
+
+    def journey_done(self) -> None:
+        with self._lock:
+            self.journeys += 1
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """ Nearest-rank percentile of an ascending list """
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class User:
+    """ One virtual user with its own session cookie """
+
+    def __init__(self, base_url: str, recorder: Recorder, index: int, think: float):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.surname, self.candidate_id = CANDIDATES[index % len(CANDIDATES)]
+        self.think = think
+        self.http = requests.Session()
+        self.rng = random.Random(index)
+
+    def call(self, step: str, method: str, path: str, **kwargs) -> Optional[requests.Response]:
+        kwargs.setdefault("allow_redirects", False)
+        kwargs.setdefault("timeout", 60)
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(step, time.perf_counter() - started, False)
+            return None
+        # the waiting page is served with 200 while the database is unavailable
+        ok = response.status_code < 400 and b'class="waiting-container"' not in response.content
+        self.recorder.record(step, time.perf_counter() - started, ok)
+        return response
+
+    def pause(self) -> None:
+        if self.think:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think)
+
+    def journey(self) -> None:
+        agreement = {"AgreementDate": date.today().isoformat()}
+        self.call("home", "GET", "/")
+        self.pause()
+        for length in range(4, len(self.surname) + 1):
+            self.call("typeahead", "GET", "/searchcandidates", params={"q": self.surname[:length]})
+        self.pause()
+        self.call("select candidate", "POST", "/contract/candidate", json={"candidateId": self.candidate_id})
+        self.call("colleague data", "GET", "/colleaguedata")
+        self.pause()
+        self.call("validate", "POST", "/validateC7")
+        self.pause()
+
+        page = self.call("standards page", "GET", "/servicestandards", params={"which": "SP Standards"})
+        ids = STANDARD_IDS.findall(page.text) if page is not None else []
+        edition = self.rng.randint(1, 3)
+        self.pause()
+        self.call("standards save", "POST", "/servicestandards", data={
+            "which": "SP Standards",
+            "context": f"Context revision {edition}",
+            "id": ids,
+            "ssn": [f"SS{i + 1}" for i in range(len(ids))],
+            "service-description": [f"Service standard {i + 1}, revision {edition}" for i in range(len(ids))],
+        })
+
+        self.call("arrangements page", "GET", "/servicearrangements")
+        self.pause()
+        form = {"SpecialConditions": f"Special conditions revision {edition}"}
+        for day in WEEKDAYS:
+            form.update({f"{day}_default": "0800 - 1800", f"{day}_base": "As specified",
+                         f"{day}_client": "As specified", f"{day}_other": f"Prior approval required ({edition})"})
+        self.call("arrangements save", "POST", "/servicearrangements", data=form)
+        self.pause()
+
+        self.call("contract export", "POST", "/download_sp_contract", data=agreement)
+        self.call("nda export", "POST", "/download_sp_nda", data={**agreement, "action": "Submit"})
+        self.recorder.journey_done()
+
+    def run(self, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            self.journey()
+
+
+def load(base_url: str, users: int, duration: float, think: float) -> dict:
+    """ Run `users` users for `duration` seconds; returns the per-step report """
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=User(base_url, recorder, i, think).run, args=(deadline,), daemon=True)
+               for i in range(users)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    steps = {}
+    for step in STEPS + sorted(set(recorder.latencies) - set(STEPS)):
+        ordered = sorted(recorder.latencies.get(step, []))
+        if not ordered:
+            continue
+        steps[step] = {
+            "requests": len(ordered),
+            "errors": recorder.errors.get(step, 0),
+            "rps": round(len(ordered) / elapsed, 3),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+    total = sum(s["requests"] for s in steps.values())
+    return {
+        "users": users,
+        "seconds": round(elapsed, 3),
+        "journeys": recorder.journeys,
+        "journeys_per_minute": round(recorder.journeys / elapsed * 60, 2),
+        "rps": round(total / elapsed, 3),
+        "errors": sum(s["errors"] for s in steps.values()),
+        "steps": steps,
+    }
+
+
+# -----------------------------
+# gunicorn
+# -----------------------------
+def parse_config(spec: str) -> dict:
+    """ "sync:4" or "gthread:2x8" into gunicorn worker settings """
+    match = re.fullmatch(r"(sync|gthread):(\d+)(?:x(\d+))?", spec.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"expected sync:WORKERS or gthread:WORKERSxTHREADS, got {spec!r}")
+    worker_class, workers, threads = match.group(1), int(match.group(2)), int(match.group(3) or 1)
+    if worker_class == "sync" and threads != 1:
+        raise argparse.ArgumentTypeError("sync workers have one thread each")
+    return {"name": spec.strip(), "worker_class": worker_class, "workers": workers, "threads": threads}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, process: Optional[subprocess.Popen] = None, timeout: float = 60) -> None:
+    """ Wait for /ready: the database connected and the critical warm-up items warm """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"app at {base_url} was not ready after {timeout:.0f}s")
+
+
+@contextmanager
+def gunicorn(config: dict, timeout: int = 120):
+    """ Serve loadtest_app under gunicorn with `config`; yields its base URL """
+    port = free_port()
+    command = [sys.executable, "-m", "gunicorn", "--pythonpath", "benchmarks", "--preload",
+               "--bind", f"127.0.0.1:{port}", "--worker-class", config["worker_class"],
+               "--workers", str(config["workers"]), "--threads", str(config["threads"]),
+               "--timeout", str(timeout), "--log-level", "warning",
+               "loadtest_app:create_loadtest_app()"]
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="cs-loadtest-") as directory:
+        # a fresh database per config unless LOADTEST_DIR names one to keep
+        env = {"LOADTEST_DIR": directory, **os.environ}
+        process = subprocess.Popen(command, cwd=ROOT, env=env)
+        try:
+            wait_until_ready(base_url, process)
+            yield base_url
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def run(configs: list[dict], users: int = 8, duration: float = 30, think: float = 0.5,
+        url: Optional[str] = None) -> dict:
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "users": users,
+            "duration": duration,
+            "think": think,
+            "backend_latency_ms": os.environ.get("FAKE_SERVICES_LATENCY_MS", ""),
+        },
+        "runs": {},
+    }
+    if url:
+        wait_until_ready(url.rstrip("/"))
+        results["runs"][url] = load(url, users, duration, think)
+        return results
+    for config in configs:
+        with gunicorn(config) as base_url:
+            results["runs"][config["name"]] = {**config, **load(base_url, users, duration, think)}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run each config")
+    parser.add_argument("--think", type=float, default=0.5, help="Mean pause between pages, in seconds")
+    parser.add_argument("--config", dest="configs", type=parse_config, action="append",
+                        help="gunicorn workers to test: sync:WORKERS or gthread:WORKERSxTHREADS (repeatable)")
+    parser.add_argument("--url", help="Load this running app instead of starting gunicorn")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    configs = args.configs or [parse_config("sync:2"), parse_config("gthread:2x4")]
+    results = run(configs, args.users, args.duration, args.think, args.url)
+
+    for name, result in results["runs"].items():
+        print(f"{name}: {result['users']} users, {result['rps']:.1f} req/s, "
+              f"{result['journeys_per_minute']:.1f} journeys/min, {result['errors']} errors")
+        print(f"  {'step':<18} {'requests':>8} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for step, s in result["steps"].items():
+            print(f"  {step:<18} {s['requests']:>8} {s['errors']:>6} {s['rps']:>7.2f} "
+                  f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"saved {len(results['runs'])} runs to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+The real create_app() for load tests: external services answered by tests/fakes/services.py
+and SQL by a seeded SQLite database, so gunicorn can serve it on a developer machine.
+
+    gunicorn --pythonpath benchmarks --preload -k gthread -w 2 --threads 4 \
+        'loadtest_app:create_loadtest_app()'
+
+benchmarks/loadtest.py starts it this way itself. FAKE_SERVICES_LATENCY_MS (for example
+c7=80,ch=120,graph=150) adds backend latency so the run resembles production. The database
+lives in LOADTEST_DIR (a new temporary directory by default) and is seeded once, so use
+--preload: it also gives every worker the same session secret. gunicorn.conf.py is
+read from the project root, so the workers start as they do in production.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from tests.fakes.services import OFFLINE_SECRETS, FakeServices
+
+SERVICE_IDS = ("SP0117", "SP0231", "SP0098", "SP0305")
+
+
+def database_dir() -> str:
+    directory = os.environ.get("LOADTEST_DIR") or tempfile.mkdtemp(prefix="cs-loadtest-")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def seed(db, url: str) -> None:
+    """ Standards, arrangements and a contract for each fixture candidate's service ID, once """
+    from sqlalchemy.orm import Session
+    from app.dbquery import WEEKDAYS
+    from app.models import ServiceArrangement, ServiceContract, ServiceStandard
+
+    # its own engine: under --preload the app's engine is only created in the workers
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    session = Session(engine)
+    if session.query(ServiceStandard).count():
+        session.close()
+        engine.dispose()
+        return
+    rows = [ServiceStandard(sid="CS", ssn=f"CS{i}", description=f"Change Specialists standard {i}") for i in range(1, 6)]
+    for sid in SERVICE_IDS:
+        rows += [ServiceStandard(sid=sid, ssn=f"SS{i}", description=f"Service standard {i} for {sid}")
+                 for i in range(1, 9)]
+        rows += [ServiceArrangement(sid=sid, day=day, defaultserviceperiod="0800 - 1800", atservicebase="As specified",
+                                    atclientlocation="As specified", atotherlocation="Prior approval required")
+                 for day in WEEKDAYS]
+        rows.append(ServiceContract(sid=sid, specialconditions="None", context=f"Context for {sid}"))
+    session.add_all(rows)
+    session.commit()
+    session.close()
+    engine.dispose()
+
+
+def create_loadtest_app():
+    os.environ.setdefault("FLASK_CONFIG", "ProductionConfig")
+    for name, value in OFFLINE_SECRETS.items():
+        os.environ.setdefault(name, value)
+    os.environ.pop("KEY_VAULT_NAME", None)
+
+    directory = database_dir()
+    os.environ.setdefault("SID_CACHE_DIR", os.path.join(directory, "sid_versions"))
+    url = f"sqlite:///{os.path.join(directory, 'main.db')}"
+
+    @event.listens_for(Engine, "connect")
+    def attach_dbo(dbapi_connection, connection_record):
+        # the models live in the dbo schema; SQLite gets it as a second database file
+        if dbapi_connection.__class__.__module__.startswith("sqlite3"):
+            dbapi_connection.execute(f"ATTACH DATABASE '{os.path.join(directory, 'dbo.db')}' AS dbo")
+
+    FakeServices.from_env().install()
+
+    import app as app_package
+    app_package.create_db_engine = lambda timeout=120: create_engine(url)
+
+    seed(app_package.db, url)
+    return app_package.create_app()
@@ -0,0 +1,146 @@
+"""
+Logging overhead benchmark: disabled log.debug() calls versus the old debugMode() checks.
+
+Times a call site that logs nothing, one guarded by `if debugMode(): print(...)` (which
+reads FLASK_CONFIG on every call) and one calling log.debug() with debug disabled.
+Then runs the candidate search path (getC7Candidates plus getC7Candidate for each hit,
+as views.fetch_candidates does) against canned Colleague 7 responses, counts the log
+calls it makes and works out what they cost per search with debug off.
+
+    python benchmarks/logging_overhead.py [--calls 1000000] [--searches 2000] [--hits 10]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ["FLASK_CONFIG"] = "ProductionConfig"
+for secret in ("C7APIKey", "C7USERID", "CHKEY", "NAMEAPI_KEYPREFIX", "NAMEAPI_KEYSUFFIX",
+               "SQL_USERNAME", "SQL_PASSWORD", "SQL_SERVERNAME", "SQL_DATABASE", "SQL_PORT"):
+    os.environ.setdefault(secret, "benchmark")
+
+from app import c7query, log as app_log
+from app.helper import debugMode
+
+log = app_log.get_logger("benchmarks.logging_overhead")
+
+
+def per_call_ns(func, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def call_sites() -> dict:
+    def nothing(i):
+        pass
+
+    def debug_mode(i):
+        if debugMode():
+            print(f"benchmark: iteration {i}")
+
+    def facade(i):
+        log.debug("benchmark: iteration %s", i)
+
+    return {"no logging": nothing, "debugMode() + print": debug_mode, "log.debug (disabled)": facade}
+
+
+class CannedResponse:
+    status_code = 200
+
+    def __init__(self, body):
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+def canned_c7(hits: int):
+    """ requests stand-in answering the Candidate Search and Get endpoints """
+    candidate = {
+        "Surname": "Benchmark", "Forenames": "Ben", "MobileNumber": "07700 900000",
+        "EmailAddress": "ben@example.com", "AddressLine1": "1 High Street", "City": "Leeds",
+        "CustomFields": [{"Name": "MSA Signed", "Value": "01/01/2025"},
+                         {"Name": "CompanyRegistrationNumber", "Value": "01234567"},
+                         {"Name": "NameOfLimitedCompany", "Value": "Benchmark Ltd"}],
+    }
+
+    def get(url, **kwargs):
+        return CannedResponse(list(range(1, hits + 1)) if "/Candidate/Search" in url else candidate)
+    return SimpleNamespace(get=get)
+
+
+def search(query: str) -> list:
+    return [c7query.getC7Candidate(cid, query) for cid in c7query.getC7Candidates(query)]
+
+
+def time_searches(searches: int) -> float:
+    started = time.perf_counter()
+    for _ in range(searches):
+        search("benchmark")
+    return (time.perf_counter() - started) / searches
+
+
+def count_log_calls() -> int:
+    count = 0
+    original = app_log.Logger.debug
+
+    def counting(self, msg, *args, **fields):
+        nonlocal count
+        count += 1
+        return original(self, msg, *args, **fields)
+
+    app_log.Logger.debug = counting
+    try:
+        search("benchmark")
+    finally:
+        app_log.Logger.debug = original
+    return count
+
+
+def run(calls: int = 1000000, searches: int = 2000, hits: int = 10) -> dict:
+    app_log.configure(level=logging.INFO)
+    sites = {name: per_call_ns(func, calls) for name, func in call_sites().items()}
+
+    real_requests = c7query.requests
+    c7query.requests = canned_c7(hits)
+    try:
+        seconds = time_searches(searches)
+        log_calls = count_log_calls()
+    finally:
+        c7query.requests = real_requests
+
+    overhead_ns = (sites["log.debug (disabled)"] - sites["no logging"]) * log_calls
+    return {
+        "call_sites_ns": sites,
+        "search": {
+            "seconds": seconds,
+            "log_calls": log_calls,
+            "logging_ns": overhead_ns,
+            "logging_share": overhead_ns / 1e9 / seconds,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1000000)
+    parser.add_argument("--searches", type=int, default=2000)
+    parser.add_argument("--hits", type=int, default=10, help="Candidates returned by each search")
+    args = parser.parse_args()
+
+    results = run(args.calls, args.searches, args.hits)
+    for name, ns in results["call_sites_ns"].items():
+        print(f"{name:<22} {ns:8.1f} ns per call")
+    s = results["search"]
+    print(f"search ({args.hits} hits)      {s['seconds'] * 1e6:8.1f} us per search, {s['log_calls']} log calls "
+          f"costing {s['logging_ns']:.0f} ns ({s['logging_share']:.3%}) with debug off")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+SID lookup benchmark: UPPER(sid) = UPPER(?) versus the indexed sid_norm column.
+
+Seeds a local SQLite database with ServiceStandard rows (mixed-case SIDs, with an index
+on sid as well, to show that UPPER() defeats it) and runs the same lookups both ways,
+printing each query plan and the time taken. SQLite stands in for Azure SQL here: the
+plans show SCAN versus SEARCH ... USING INDEX, the equivalent of a scan versus a seek.
+
+    python benchmarks/sid_lookup.py [--rows 100000] [--lookups 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import Index, create_engine, event, func, insert, select
+
+from app.dbquery import sid_matches
+from app.models import ServiceStandard
+
+
+def seed(engine, rows: int, sids: list[str]) -> None:
+    ServiceStandard.__table__.create(engine)
+    Index("ix_bench_sid", ServiceStandard.__table__.c.sid).create(engine)
+    batch = [
+        {"sid": random.choice([sid, sid.lower(), f" {sid}"]), "ssn": f"SS{i % 8 + 1}", "description": "Benchmark standard"}
+        for i, sid in enumerate(random.choice(sids) for _ in range(rows))
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(ServiceStandard), batch)
+        conn.exec_driver_sql("ANALYZE dbo")
+
+
+def plan(engine, stmt) -> list[str]:
+    compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")]
+
+
+def time_lookups(engine, make_stmt, sids: list[str]) -> float:
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        for sid in sids:
+            conn.execute(make_stmt(sid)).all()
+    return time.perf_counter() - started
+
+
+def run(rows: int = 100000, lookups: int = 500) -> dict:
+    random.seed(1)
+    sids = [f"SP{n:04d}" for n in range(rows // 8)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'main.db')}")
+
+        @event.listens_for(engine, "connect")
+        def attach_dbo(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{os.path.join(tmp, 'dbo.db')}' AS dbo")
+
+        seed(engine, rows, sids)
+        targets = [random.choice(sids).lower() for _ in range(lookups)]
+
+        queries = {
+            "upper(sid)": lambda sid: select(ServiceStandard).where(func.upper(ServiceStandard.sid) == func.upper(sid)),
+            "sid_norm": lambda sid: select(ServiceStandard).where(sid_matches(ServiceStandard, sid)),
+        }
+        results = {}
+        for name, make_stmt in queries.items():
+            results[name] = {
+                "plan": plan(engine, make_stmt(targets[0])),
+                "seconds": time_lookups(engine, make_stmt, targets),
+            }
+        engine.dispose()
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    results = run(args.rows, args.lookups)
+    for name, result in results.items():
+        per_lookup = result["seconds"] / args.lookups * 1000
+        print(f"{name:<12} {result['seconds']:.3f}s for {args.lookups} lookups ({per_lookup:.3f} ms each)")
+        for line in result["plan"]:
+            print(f"{'':<12} plan: {line}")
+    speedup = results["upper(sid)"]["seconds"] / max(results["sid_norm"]["seconds"], 1e-9)
+    print(f"sid_norm is {speedup:.1f}x faster over {args.rows} rows")
+
+
+if __name__ == "__main__":
+    main()
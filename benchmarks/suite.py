@@ -0,0 +1,348 @@
+"""
+Benchmark suite for the document generation hot paths, run against the offline fakes.
+
+Times candidate and client search (views.fetch_candidates / fetch_clients), contract
+assembly (c7query.getC7contract), every download_* export route, the NDA preview
+(serve_docx on a small and a large template), replace_text_in_document and
+convert_docx_to_pdf_reportlab. Colleague 7, Companies House and SharePoint are answered
+by tests/fakes/services.py and SQL by SQLite, so the numbers are the app's own cost.
+Each case is run --rounds times after a warm-up; its setup is not timed.
+
+Results can be saved as JSON and compared with a saved baseline: a case whose median is
+more than --threshold slower than the baseline is flagged and the exit status is 1.
+
+    python benchmarks/suite.py [-k download] [--rounds 20] [--candidates 25] [--companies 10000]
+                               [--paragraphs 400] [--save results.json]
+                               [--compare baseline.json] [--threshold 0.2]
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from typing import Callable, NamedTuple, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+os.environ["FLASK_CONFIG"] = "ProductionConfig"
+
+from tests.fakes.services import FIXTURES, OFFLINE_SECRETS, FakeServices
+
+for name, value in OFFLINE_SECRETS.items():
+    os.environ.setdefault(name, value)
+os.environ.pop("KEY_VAULT_NAME", None)
+
+from docx import Document
+from flask import Flask
+from sqlalchemy import event
+
+import app as app_package
+from app import c7query, db, dbquery, helper, log as app_log, views
+from app.classes import Company
+from app.models import ServiceArrangement, ServiceContract, ServiceStandard
+
+CANDIDATE_ID = 5905
+AGREEMENT_DATE = date.today().isoformat()
+
+
+class Case(NamedTuple):
+    """ A timed call: setup() runs untimed before every round and returns func's arguments """
+    name: str
+    func: Callable
+    setup: Callable[[], tuple] = tuple
+
+
+# -----------------------------
+# Environment
+# -----------------------------
+@contextmanager
+def environment(directory: str):
+    """ Fakes installed and a Flask app with views_bp on a seeded SQLite database """
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(directory, 'main.db')}"
+    flask_app.secret_key = "benchmark"
+    flask_app.register_blueprint(views.views_bp)
+    db.init_app(flask_app)
+    os.environ["SID_CACHE_DIR"] = os.path.join(directory, "sid_versions")
+    saved_connected = app_package.db_connected
+    app_package.db_connected = True
+
+    with FakeServices() as fakes, flask_app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def attach_dbo(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{os.path.join(directory, 'dbo.db')}' AS dbo")
+
+        db.create_all()
+        seed_service("SP0231")
+        try:
+            yield flask_app, fakes
+        finally:
+            db.session.remove()
+            app_package.db_connected = saved_connected
+
+
+def seed_service(sid: str) -> None:
+    """ Ten standards for the SID and the CS standards, a week of arrangements and a contract """
+    rows = [ServiceStandard(sid="CS", ssn=f"CS{i}", description=f"Change Specialists standard {i}") for i in range(1, 6)]
+    rows += [ServiceStandard(sid=sid, ssn=f"SS{i}", description=f"Service standard {i} " + "detail " * 20)
+             for i in range(1, 11)]
+    rows += [ServiceArrangement(sid=sid, day=day, defaultserviceperiod="0800 - 1800", atservicebase="As specified",
+                                atclientlocation="As specified", atotherlocation="Prior approval required")
+             for day in dbquery.WEEKDAYS]
+    rows.append(ServiceContract(sid=sid, specialconditions="None", context="Context text " * 30))
+    db.session.add_all(rows)
+    db.session.commit()
+
+
+def add_candidates(fakes: FakeServices, count: int) -> None:
+    """ `count` candidates whose surname contains "Benchmark", copied from a fixture candidate """
+    template = next(c for c in fakes.data["c7"]["candidates"] if c["CandidateId"] == CANDIDATE_ID)
+    for i in range(count):
+        candidate = json.loads(json.dumps(template))
+        candidate["CandidateId"] = 100000 + i
+        candidate["Surname"] = f"Benchmark{i}: SP{9000 + i}"
+        fakes.data["c7"]["candidates"].append(candidate)
+
+
+def add_companies(fakes: FakeServices, count: int) -> None:
+    """ `count` more companies for the Company/AdvancedSearch that loadC7Clients makes """
+    for i in range(count):
+        fakes.data["c7"]["companies"].append({
+            "CompanyId": 200000 + i, "CompanyID": 200000 + i,
+            "CompanyName": f"{'ABCDEFGHIJKLMNOPQRSTUVWXYZ'[i % 26]}benchmark Company {i} Limited",
+            "DateCreated": "1 Jan 2020",
+        })
+
+
+def reset_companies() -> None:
+    Company._instances = []
+    Company.counter = 0
+
+
+def large_template(path: str, paragraphs: int) -> bytes:
+    """ A template with `paragraphs` paragraphs (every tenth with placeholders) and a 50-row table """
+    doc = Document()
+    doc.add_heading("Service Provider Agreement", level=1)
+    for i in range(paragraphs):
+        if i % 10 == 0:
+            doc.add_paragraph(f"Clause {i}: this agreement dated PDocDate is between PSPName and the Company.")
+        else:
+            doc.add_paragraph(f"Clause {i}: " + "The Service Provider shall provide the Services with due care. " * 4)
+    table = doc.add_table(rows=50, cols=3)
+    for r, row in enumerate(table.rows):
+        row.cells[0].text = f"SS{r}"
+        row.cells[1].text = "PSPName shall meet this standard " * 3
+        row.cells[2].text = "PDocDate"
+    doc.save(path)
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+# -----------------------------
+# Cases
+# -----------------------------
+def replacements() -> dict:
+    return {"PDocDate": date.today().strftime("%d/%m/%Y"), "PSPName": "Daniel Okafor",
+            "PBodyName": "Daniel Okafor", "PSPAddress": "41 Canal Wharf, Leeds", "PSigName": "Daniel Okafor"}
+
+
+def export_case(flask_app: Flask, contract: dict, route: str, form: dict) -> Case:
+    """ POST to a download_* route with the assembled contract in the session """
+    client = flask_app.test_client()
+
+    def setup():
+        with client.session_transaction() as sess:
+            sess.clear()
+            sess["sessionContract"] = dict(contract)
+        dbquery.clearServiceCache()
+        return ()
+
+    def post():
+        response = client.post(route, data={"AgreementDate": AGREEMENT_DATE, **form})
+        if response.status_code not in (200, 302):
+            raise RuntimeError(f"{route} returned {response.status_code}")
+        return response
+
+    return Case(f"views.{route.lstrip('/')}" + (f"[{form['action']}]" if "action" in form else ""), post, setup)
+
+
+def cases(flask_app: Flask, fakes: FakeServices, directory: str, candidates: int, companies: int,
+          paragraphs: int) -> list[Case]:
+    add_candidates(fakes, candidates)
+    add_companies(fakes, companies)
+    contract = c7query.getC7contract(CANDIDATE_ID)
+    email = {"candidate-email": contract["candidateemail"]}
+
+    small_path = os.path.join(FIXTURES, "sp_nda_template.docx")
+    with open(small_path, "rb") as fh:
+        small = fh.read()
+    large_path = os.path.join(directory, "large_template.docx")
+    large = large_template(large_path, paragraphs)
+    pdf_path = os.path.join(directory, "out.pdf")
+
+    def clear_search_cache():
+        views._cache.clear()
+        return ()
+
+    def warm_companies():
+        views._cache.clear()
+        if Company.count() == 0:
+            c7query.loadC7Clients()
+        return ()
+
+    def cold_companies():
+        views._cache.clear()
+        reset_companies()
+        return ()
+
+    def preview(file_bytes):
+        with flask_app.test_request_context("/download_sp_nda", method="POST"):
+            return helper.serve_docx(file_bytes, "Service Provider NDA AUTOMATED MASTER.docx", replacements())
+
+    return [
+        Case(f"views.fetch_candidates[{candidates}]", views.fetch_candidates, lambda: clear_search_cache() + ("benchmark",)),
+        Case(f"views.fetch_clients[{companies}]", views.fetch_clients, lambda: warm_companies() + ("m",)),
+        Case(f"views.fetch_clients[{companies},cold]", views.fetch_clients, lambda: cold_companies() + ("m",)),
+        Case("c7query.getC7contract", c7query.getC7contract, lambda: (CANDIDATE_ID,)),
+        export_case(flask_app, contract, "/download_client_contract", {}),
+        export_case(flask_app, contract, "/download_client_renewal", {}),
+        export_case(flask_app, contract, "/download_client_msa", {"contactEmail": contract["contactemail"]}),
+        export_case(flask_app, contract, "/download_sp_msa", email),
+        export_case(flask_app, contract, "/download_sp_nda", {"action": "Submit", **email}),
+        export_case(flask_app, contract, "/download_sp_nda", {
+            "action": "Preview", "candidate-name": "Daniel Okafor", "address": contract["candidateaddress"], **email}),
+        export_case(flask_app, contract, "/download_sp_contract", {}),
+        export_case(flask_app, contract, "/download_sp_renewal", {}),
+        Case("helper.serve_docx[small]", preview, lambda: (small,)),
+        Case(f"helper.serve_docx[large,{paragraphs}]", preview, lambda: (large,)),
+        Case(f"helper.replace_text_in_document[large,{paragraphs}]", helper.replace_text_in_document,
+             lambda: (Document(io.BytesIO(large)), replacements())),
+        Case(f"helper.convert_docx_to_pdf_reportlab[large,{paragraphs}]", helper.convert_docx_to_pdf_reportlab,
+             lambda: (large_path, pdf_path)),
+    ]
+
+
+# -----------------------------
+# Timing
+# -----------------------------
+def measure(case: Case, rounds: int, warmup: int = 1) -> dict:
+    """ Milliseconds per call over `rounds` timed calls, after `warmup` untimed ones """
+    for _ in range(warmup):
+        case.func(*case.setup())
+    timings = []
+    for _ in range(rounds):
+        args = case.setup()
+        started = time.perf_counter()
+        case.func(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "rounds": rounds,
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+        "stdev_ms": round(statistics.stdev(timings), 4) if rounds > 1 else 0.0,
+        "max_ms": round(max(timings), 4),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2) -> list[dict]:
+    """
+    Cases present in both whose median is more than `threshold` (a fraction) slower than
+    the baseline's, slowest change first.
+    """
+    regressions = []
+    for name, stats in results["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if not before or before["median_ms"] <= 0:
+            continue
+        change = stats["median_ms"] / before["median_ms"] - 1
+        if change > threshold:
+            regressions.append({"case": name, "baseline_ms": before["median_ms"],
+                                "median_ms": stats["median_ms"], "change": round(change, 4)})
+    regressions.sort(key=lambda r: r["change"], reverse=True)
+    return regressions
+
+
+def run(rounds: int = 20, pattern: str = "", candidates: int = 25, companies: int = 10000,
+        paragraphs: int = 400) -> dict:
+    app_log.configure(level=logging.WARNING)
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "commit": git_commit(),
+            "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "rounds": rounds,
+            "candidates": candidates,
+            "companies": companies,
+            "paragraphs": paragraphs,
+        },
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory() as directory, environment(directory) as (flask_app, fakes):
+        for case in cases(flask_app, fakes, directory, candidates, companies, paragraphs):
+            if pattern and pattern not in case.name:
+                continue
+            results["cases"][case.name] = measure(case, rounds)
+    reset_companies()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-k", dest="pattern", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=25, help="Candidates returned by the search")
+    parser.add_argument("--companies", type=int, default=10000, help="Extra companies in Colleague 7")
+    parser.add_argument("--paragraphs", type=int, default=400, help="Paragraphs in the large template")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file from an earlier --save")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown flagged as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = run(args.rounds, args.pattern, args.candidates, args.companies, args.paragraphs)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+
+    for name, stats in results["cases"].items():
+        line = f"{name:<48} {stats['median_ms']:10.3f} ms median  {stats['min_ms']:10.3f} min  ±{stats['stdev_ms']:.3f}"
+        before = baseline and baseline.get("cases", {}).get(name)
+        if before:
+            line += f"  ({stats['median_ms'] / before['median_ms'] - 1:+.1%} vs baseline)"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"saved {len(results['cases'])} results to {args.save}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['case']}: {r['baseline_ms']:.3f} ms -> {r['median_ms']:.3f} ms ({r['change']:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# gunicorn.conf.py - gunicorn settings for App Service: gunicorn --config gunicorn.conf.py run:app
+# preload_app builds the app and its read-only warm state (config, compiled templates, the
+# C7 client directory, heavy libraries) once in the master - see app/preload.py. post_fork
+# then gives each worker its own database engine and background threads, so a new or
+# recycled worker serves at full speed as soon as it is forked.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").strip().lower() not in ("0", "false", "no", "off")
+
+if preload_app:
+    # read by create_app (app/preload.py) to defer sockets and threads to the workers
+    os.environ["APP_PRELOAD"] = "1"
+
+
+def post_fork(server, worker):
+    from app import preload
+
+    if preload.deferred():
+        preload.start_worker()
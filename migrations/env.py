@@ -0,0 +1,45 @@
+# Alembic environment - connects with build_engine() so migrations use the app's secrets
+import dotenv
+from alembic import context
+
+from app import build_engine, db
+import app.models  # noqa: F401  (registers the models on db.metadata)
+
+dotenv.load_dotenv()
+
+target_metadata = db.metadata
+
+# Keep Alembic's version table alongside the application tables
+VERSION_TABLE_SCHEMA = "dbo"
+
+
+def run_migrations_offline() -> None:
+    """ Emit SQL for SQL Server without connecting (alembic upgrade head --sql) """
+    context.configure(
+        dialect_name="mssql",
+        target_metadata=target_metadata,
+        literal_binds=True,
+        version_table_schema=VERSION_TABLE_SCHEMA,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    # long timeout: the serverless database may need to wake first
+    engine = build_engine(timeout=120)
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            version_table_schema=VERSION_TABLE_SCHEMA,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,42 @@
+"""Add a persisted, indexed normalised SID column to the service tables
+
+Revision ID: 0001_sid_norm
+Revises:
+Create Date: 2026-10-19
+
+Queries filtered on UPPER(sid) = UPPER(?), which cannot use an index. sid_norm holds
+UPPER(LTRIM(RTRIM(sid))) as a persisted computed column so the lookup can seek.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0001_sid_norm"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+SID_NORM_SQL = "UPPER(LTRIM(RTRIM(sid)))"
+
+# table -> index name and columns
+INDEXES = {
+    "ServiceStandard": ("ix_ServiceStandard_sid_norm", ["sid_norm"]),
+    "ServiceArrangement": ("ix_ServiceArrangement_sid_norm_day", ["sid_norm", "day"]),
+    "ServiceContract": ("ix_ServiceContract_sid_norm", ["sid_norm"]),
+}
+
+
+def upgrade() -> None:
+    for table, (index_name, columns) in INDEXES.items():
+        op.add_column(
+            table,
+            sa.Column("sid_norm", sa.String(10), sa.Computed(SID_NORM_SQL, persisted=True)),
+            schema="dbo",
+        )
+        op.create_index(index_name, table, columns, schema="dbo")
+
+
+def downgrade() -> None:
+    for table, (index_name, _) in INDEXES.items():
+        op.drop_index(index_name, table_name=table, schema="dbo")
+        op.drop_column(table, "sid_norm", schema="dbo")
@@ -0,0 +1,40 @@
+"""Create the CompanyValidation table for stored Companies House verdicts
+
+Revision ID: 0002_company_validation
+Revises: 0001_sid_norm
+Create Date: 2026-10-19
+
+validateC7 reads stored verdicts from dbo.CompanyValidation and the nightly ch-revalidate
+run writes them (app/chbatch.py). The table has to exist before either runs.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0002_company_validation"
+down_revision = "0001_sid_norm"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "CompanyValidation",
+        sa.Column("cvid", sa.Integer, sa.Identity(start=1, increment=1), primary_key=True),
+        sa.Column("regno", sa.String(10)),
+        sa.Column("companyname", sa.String(255)),
+        sa.Column("director", sa.String(255)),
+        sa.Column("valid", sa.Boolean),
+        sa.Column("narrative", sa.String(500)),
+        sa.Column("isdirector", sa.Boolean),
+        sa.Column("jurisdiction", sa.String(50)),
+        sa.Column("status", sa.String(50)),
+        sa.Column("checkedat", sa.DateTime),
+        schema="dbo",
+    )
+    op.create_index("ix_dbo_CompanyValidation_regno", "CompanyValidation", ["regno"], schema="dbo")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_dbo_CompanyValidation_regno", table_name="CompanyValidation", schema="dbo")
+    op.drop_table("CompanyValidation", schema="dbo")
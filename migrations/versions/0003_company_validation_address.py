@@ -0,0 +1,25 @@
+"""Store the registered office address with each Companies House verdict
+
+Revision ID: 0003_company_validation_address
+Revises: 0002_company_validation
+Create Date: 2026-10-19
+
+validateCH returns the registered office address; a verdict answered from
+dbo.CompanyValidation has to return it too, so callers get the same result either way.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0003_company_validation_address"
+down_revision = "0002_company_validation"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("CompanyValidation", sa.Column("address", sa.String(500)), schema="dbo")
+
+
+def downgrade() -> None:
+    op.drop_column("CompanyValidation", "address", schema="dbo")
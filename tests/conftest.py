@@ -0,0 +1,50 @@
+# conftest.py - tests run offline against tests/fakes/services.py by default
+# Set LIVE_SERVICES=1 to run them against the real C7, Companies House, NameAPI and
+# Graph APIs instead, with secrets from the environment or Key Vault as the app does.
+import os, sys
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from tests.fakes.services import OFFLINE_SECRETS, FakeServices
+
+
+def live_services() -> bool:
+    return os.environ.get("LIVE_SERVICES", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+@pytest.fixture(autouse=True)
+def offline_services(monkeypatch):
+    """ Fake external services and offline secrets for every test, unless LIVE_SERVICES is set """
+    if live_services():
+        yield None
+        return
+    for name, value in OFFLINE_SECRETS.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delenv("KEY_VAULT_NAME", raising=False)
+    monkeypatch.delenv("CH_KEY", raising=False)
+    with FakeServices.from_env() as services:
+        yield services
+
+
+@pytest.fixture
+def fake_services(offline_services):
+    """ The installed fakes, for tests that inject latency or errors; skipped when live """
+    if offline_services is None:
+        pytest.skip("needs the offline fakes; not run with LIVE_SERVICES=1")
+    return offline_services
+
+
+@pytest.fixture(autouse=True)
+def no_warmup(monkeypatch):
+    """ create_app() in tests does not start the background warm-up (tests/unit/test_warmup.py runs it directly) """
+    monkeypatch.setenv("WARMUP", "0")
+
+
+@pytest.fixture(autouse=True)
+def no_tracing(monkeypatch, tmp_path):
+    """ Tracing off, and any trace written goes to the test's tmp dir, not app/instance (tests/unit/test_tracing.py turns it on) """
+    monkeypatch.setenv("TRACING", "0")
+    monkeypatch.setenv("TRACE_SINK", str(tmp_path / "traces.jsonl"))
@@ -0,0 +1,87 @@
+# chstream.py - replays recorded Companies House streaming API files over local HTTP
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class ReplayStreamServer:
+    """
+    Serves recorded stream files (one JSON event per line, blank lines as heartbeats)
+    the way stream.companieshouse.gov.uk does: /{stream}?timepoint=N starts at that
+    timepoint, an unknown timepoint gets 416 and a missing key gets 401.
+    Unlike the real service the response ends once the recording has been replayed.
+
+        with ReplayStreamServer({"companies": "tests/fixtures/ch_stream_companies.jsonl"}) as url:
+            monkeypatch.setenv("CH_STREAM_URL", url)
+    """
+
+    def __init__(self, recordings: dict[str, str]):
+        self.recordings = {}
+        for stream, path in recordings.items():
+            with open(path, encoding="utf-8") as fh:
+                self.recordings[stream] = [line.rstrip("\n") for line in fh]
+        self.requests = []
+        self._server = None
+        self._thread = None
+
+    def _events(self, stream: str) -> list[tuple[int, str]]:
+        return [(json.loads(line)["event"]["timepoint"], line) for line in self.recordings[stream] if line.strip()]
+
+    def _handler(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                stream = url.path.strip("/")
+                query = parse_qs(url.query)
+                timepoint = int(query["timepoint"][0]) if "timepoint" in query else None
+                replay.requests.append((stream, timepoint))
+
+                if not self.headers.get("Authorization"):
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+                if stream not in replay.recordings:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                events = replay._events(stream)
+                first = events[0][0] if events else 0
+                last = events[-1][0] if events else 0
+                if timepoint is not None and not first <= timepoint <= last + 1:
+                    self.send_response(416)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                for line in replay.recordings[stream]:
+                    if line.strip() and timepoint is not None and json.loads(line)["event"]["timepoint"] < timepoint:
+                        continue
+                    self.wfile.write(line.encode("utf-8") + b"\n")
+
+        return Handler
+
+    def start(self) -> str:
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
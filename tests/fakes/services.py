@@ -0,0 +1,437 @@
+# services.py - offline stand-ins for Colleague 7, Companies House, NameAPI and Microsoft Graph
+# A requests transport adapter: while installed, calls to the real hosts are answered in
+# process from the recorded fixtures in tests/fixtures/services, with optional latency
+# and injected errors. Other hosts are refused so a test can never reach a live service
+# by accident (localhost is let through for the local replay servers).
+import copy
+import http
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from typing import Optional
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+import requests
+from azure.core.credentials import AccessToken
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+FIXTURES = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "fixtures", "services"))
+
+HOSTS = {
+    "coll7openapi.azure-api.net": "c7",
+    "api.company-information.service.gov.uk": "ch",
+    "api.nameapi.org": "nameapi",
+    "graph.microsoft.com": "graph",
+}
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+# Secrets the app reads, so config loads without Key Vault when running offline
+OFFLINE_SECRETS = {
+    "C7APIKey": "offline-c7-key",
+    "C7USERID": "1001",
+    "CHKEY": "offline-ch-key",
+    "NAMEAPI_KEYPREFIX": "offline",
+    "NAMEAPI_KEYSUFFIX": "nameapi",
+    "NAMEAPI-KEYPREFIX": "offline",
+    "NAMEAPI-KEYSUFFIX": "nameapi",
+    "SQL_USERNAME": "offline",
+    "SQL_PASSWORD": "offline",
+    "SQL_SERVERNAME": "offline.invalid",
+    "SQL_DATABASE": "offline",
+    "SQL_PORT": "1433",
+    "SP-SITE-NAME": "Documents",
+    "SP-SITE-DOMAIN": "contoso.sharepoint.com",
+    "SP-LIBRARY": "Common",
+}
+
+RELATIVE_DATE = re.compile(r"^\{today([+-]\d+)d\}$")
+_fixture_cache: dict[str, dict] = {}
+_fixture_lock = threading.Lock()
+
+
+def _resolve_dates(value):
+    """ "{today+45d}" -> "03 Dec 2026", the C7 date format """
+    if isinstance(value, dict):
+        return {k: _resolve_dates(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve_dates(v) for v in value]
+    if isinstance(value, str):
+        m = RELATIVE_DATE.match(value)
+        if m:
+            return (date.today() + timedelta(days=int(m.group(1)))).strftime("%d %b %Y")
+    return value
+
+
+def load_fixtures(directory: str = FIXTURES) -> dict:
+    """ Recorded responses for every service, as a fresh copy the caller may modify """
+    with _fixture_lock:
+        if directory not in _fixture_cache:
+            data = {}
+            for service in ("c7", "ch", "nameapi", "graph"):
+                with open(os.path.join(directory, f"{service}.json"), encoding="utf-8") as fh:
+                    data[service] = json.load(fh)
+            _fixture_cache[directory] = data
+    return _resolve_dates(copy.deepcopy(_fixture_cache[directory]))
+
+
+def _per_service(spec: str) -> dict[str, float]:
+    """ "80" -> {"*": 80.0}; "c7=80,ch=120" -> {"c7": 80.0, "ch": 120.0} """
+    values = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        service, _, value = part.rpartition("=")
+        values[service or "*"] = float(value)
+    return values
+
+
+def _field(record: dict, name: str):
+    """ C7 column lookup: case-insensitive, custom fields stored as CUSTOM_<name> """
+    wanted = name.lower()
+    for key, value in record.items():
+        if key.lower() in (wanted, f"custom_{wanted}"):
+            return key, value
+    return None, None
+
+
+class FakeCredential:
+    """ Stands in for DefaultAzureCredential when calling the fake Graph """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_token(self, *scopes, **kwargs) -> AccessToken:
+        return AccessToken("offline-graph-token", int(time.time()) + 3600)
+
+
+class FakeAdapter(BaseAdapter):
+    def __init__(self, services: "FakeServices"):
+        super().__init__()
+        self.services = services
+
+    def send(self, request, **kwargs):
+        return self.services.dispatch(request)
+
+    def close(self):
+        pass
+
+
+class FakeServices:
+    """
+    In-process fake of the external APIs the app calls through requests.
+
+        with FakeServices(latency={"c7": 0.08}, error_rate={"ch": 0.05}, seed=1) as fakes:
+            fakes.fail("c7", "Candidate/Get", status=503)   # next matching call fails
+            ...
+            fakes.calls                                      # [(service, method, path), ...]
+
+    latency is seconds per call by service ("*" for all); error_rate is the fraction of
+    calls answered 503. The data starts as load_fixtures() and can be edited through
+    .data; Graph uploads are kept in .files.
+    """
+
+    def __init__(self, fixtures: str = FIXTURES, latency: Optional[dict] = None, error_rate: Optional[dict] = None,
+                 seed: Optional[int] = None, block_network: bool = True):
+        self.data = load_fixtures(fixtures)
+        self.fixtures = fixtures
+        self.latency = dict(latency or {})
+        self.error_rate = dict(error_rate or {})
+        self.block_network = block_network
+        self.calls: list[tuple[str, str, str]] = []
+        self.files: dict[str, bytes] = {}
+        self._failures: list[list] = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._adapter = FakeAdapter(self)
+        self._saved: list[tuple] = []
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "FakeServices":
+        """ Configured by FAKE_SERVICES_LATENCY_MS, FAKE_SERVICES_ERROR_RATE and FAKE_SERVICES_SEED """
+        latency = {k: v / 1000 for k, v in _per_service(os.environ.get("FAKE_SERVICES_LATENCY_MS", "")).items()}
+        error_rate = _per_service(os.environ.get("FAKE_SERVICES_ERROR_RATE", ""))
+        seed = os.environ.get("FAKE_SERVICES_SEED")
+        return cls(latency=latency, error_rate=error_rate, seed=int(seed) if seed else None, **kwargs)
+
+    # -----------------------------
+    # Installing
+    # -----------------------------
+    def install(self) -> "FakeServices":
+        from app import helper
+
+        original_get_adapter = requests.Session.get_adapter
+        services = self
+
+        def get_adapter(session, url):
+            host = urlparse(url).hostname or ""
+            if host in HOSTS:
+                return services._adapter
+            if services.block_network and host not in LOCAL_HOSTS:
+                raise requests.ConnectionError(f"offline: no fake for {host}; run with LIVE_SERVICES=1 to call it")
+            return original_get_adapter(session, url)
+
+        self._saved = [(requests.Session, "get_adapter", original_get_adapter),
+                       (helper, "graph_credential", helper.graph_credential)]
+        requests.Session.get_adapter = get_adapter
+        helper.graph_credential = FakeCredential
+        return self
+
+    def uninstall(self) -> None:
+        for target, name, original in reversed(self._saved):
+            setattr(target, name, original)
+        self._saved = []
+
+    def __enter__(self) -> "FakeServices":
+        return self.install()
+
+    def __exit__(self, *exc) -> None:
+        self.uninstall()
+
+    # -----------------------------
+    # Error injection
+    # -----------------------------
+    def fail(self, service: str, path: str = "", status: int = 503, times: int = 1,
+             exception: Optional[type] = None) -> None:
+        """
+        Make the next `times` calls to `service` whose path contains `path` fail with
+        `status`, or raise `exception` (e.g. requests.Timeout) as the transport would.
+        """
+        with self._lock:
+            self._failures.append([service, path, status, exception, times])
+
+    def _injected_failure(self, service: str, path: str):
+        with self._lock:
+            for failure in self._failures:
+                if failure[0] == service and failure[1] in path:
+                    failure[4] -= 1
+                    if failure[4] <= 0:
+                        self._failures.remove(failure)
+                    return failure[2], failure[3]
+            rate = self.error_rate.get(service, self.error_rate.get("*", 0))
+            if rate and self._rng.random() < rate:
+                return 503, None
+        return None
+
+    # -----------------------------
+    # Dispatch
+    # -----------------------------
+    def dispatch(self, request) -> requests.Response:
+        url = urlparse(request.url)
+        service = HOSTS[url.hostname]
+        path = unquote(url.path)
+        with self._lock:
+            self.calls.append((service, request.method, path))
+
+        delay = self.latency.get(service, self.latency.get("*", 0))
+        if delay:
+            time.sleep(delay)
+
+        failure = self._injected_failure(service, path)
+        if failure:
+            status, exception = failure
+            if exception is not None:
+                raise exception(f"injected {exception.__name__} for {request.method} {path}")
+            return self._response(request, status, {"error": f"injected {status}"})
+
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        body = request.body.decode("utf-8") if isinstance(request.body, bytes) and service != "graph" else request.body
+        status, payload = getattr(self, f"_{service}")(request, path, query, body)
+        return self._response(request, status, payload)
+
+    def _response(self, request, status: int, payload) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status
+        response.reason = http.HTTPStatus(status).phrase
+        response.url = request.url
+        response.request = request
+        if isinstance(payload, (bytes, bytearray)):
+            content, content_type = bytes(payload), "application/octet-stream"
+        elif isinstance(payload, str):
+            content, content_type = payload.encode("utf-8"), "text/plain; charset=utf-8"
+            response.encoding = "utf-8"
+        else:
+            content, content_type = json.dumps(payload).encode("utf-8"), "application/json; charset=utf-8"
+            response.encoding = "utf-8"
+        response._content = content
+        response.headers = CaseInsensitiveDict({"Content-Type": content_type, "Content-Length": str(len(content))})
+        return response
+
+    # -----------------------------
+    # Colleague 7 Open API
+    # -----------------------------
+    def _c7(self, request, path, query, body):
+        if not request.headers.get("Ocp-Apim-Subscription-Key"):
+            return 401, {"statusCode": 401, "message": "Access denied due to missing subscription key."}
+        c7 = self.data["c7"]
+        route = (request.method, path.removeprefix("/api/"))
+
+        if route == ("GET", "Candidate/Search"):
+            surname = query.get("Surname", "").lower()
+            return 200, [c["CandidateId"] for c in c7["candidates"] if surname and surname in c["Surname"].lower()]
+        if route == ("GET", "Candidate/Get"):
+            return self._c7_get(c7["candidates"], "CandidateId", query.get("candidateId"))
+        if route == ("PATCH", "Candidate/Update"):
+            update = json.loads(body or "{}")
+            status, candidate = self._c7_get(c7["candidates"], "CandidateId", update.get("candidateId"))
+            if status != 200:
+                return status, candidate
+            fields = {f["Name"]: f for f in candidate["CustomFields"]}
+            for change in update.get("customFieldUpdates", []):
+                fields.setdefault(change["fieldName"], {"Name": change["fieldName"]})["Value"] = change["fieldValue"]
+            candidate["CustomFields"] = list(fields.values())
+            return 200, "Candidate updated successfully"
+        if route == ("GET", "Contact/Get"):
+            return self._c7_get(c7["contacts"], "ContactId", query.get("ContactId"))
+        if route == ("POST", "Contact/AdvancedSearch"):
+            return self._c7_advanced_search(c7["contacts"], body)
+        if route == ("POST", "Company/AdvancedSearch"):
+            return self._c7_advanced_search(c7["companies"], body)
+        if route == ("POST", "Placement/AdvancedSearch"):
+            return self._c7_advanced_search(c7["placements"], body)
+        if route == ("GET", "Requirement/Search"):
+            company, contact = query.get("CompanyName", "").lower(), query.get("ContactName", "").lower()
+            return 200, [{k: v for k, v in r.items() if k != "candidates"} for r in c7["requirements"]
+                         if company in r["companyName"].lower() and contact in r["contactName"].lower()]
+        if route == ("GET", "Requirement/GetRequirementCandidates"):
+            requirement = next((r for r in c7["requirements"] if str(r["requirementId"]) == query.get("RequirementId")), None)
+            return 200, requirement["candidates"] if requirement else []
+        return 404, {"statusCode": 404, "message": "Resource not found"}
+
+    @staticmethod
+    def _c7_get(records, key, value):
+        record = next((r for r in records if str(r[key]) == str(value)), None)
+        if record is None:
+            return 404, {"statusCode": 404, "message": f"{key} {value} not found"}
+        return 200, record
+
+    @staticmethod
+    def _c7_advanced_search(records, body):
+        search = json.loads(body or "{}")
+        parameters = search.get("parameters") or []
+        if not parameters:
+            return 400, {"statusCode": 400, "message": "At least one search parameter is required"}
+
+        results = []
+        for record in records:
+            if record.get("Archived") and not search.get("includeArchived"):
+                continue
+            # DateCreated is used as a catch-all by the app; every fixture record predates it
+            if all(p["fieldName"] == "DateCreated" or str(_field(record, p["fieldName"])[1]).lower() == str(p["fieldValue"]).lower()
+                   for p in parameters):
+                results.append(record)
+
+        if search.get("allColumns"):
+            return 200, [{k: v for k, v in r.items() if k != "Archived"} for r in results]
+        rows = []
+        for record in results:
+            row = {}
+            for column in search.get("columns", []):
+                key, value = _field(record, column)
+                row[key if key and key.startswith("CUSTOM_") else column] = value
+            rows.append(row)
+        return 200, rows
+
+    # -----------------------------
+    # Companies House public data API
+    # -----------------------------
+    def _ch(self, request, path, query, body):
+        if not request.headers.get("Authorization"):
+            return 401, {"error": "Invalid Authorization", "type": "ch:service"}
+        ch = self.data["ch"]
+        profiles = {c["company_number"]: c for c in ch["companies"]}
+
+        if path == "/search/companies":
+            words = query.get("q", "").upper().split()
+            items = [{
+                "kind": "searchresults#company",
+                "title": c["company_name"],
+                "company_number": c["company_number"],
+                "company_status": c["company_status"],
+                "date_of_creation": c["date_of_creation"],
+                "address_snippet": ", ".join(v for v in c["registered_office_address"].values() if v),
+            } for c in ch["companies"] if words and all(w in c["company_name"] for w in words)]
+            return 200, {"kind": "search#companies", "items": items, "total_results": len(items)}
+
+        m = re.fullmatch(r"/company/([A-Za-z0-9]+)(/officers)?", path)
+        number = m.group(1).upper() if m else None
+        if number in profiles:
+            if m.group(2):
+                officers = ch["officers"].get(number, [])
+                if query.get("filter") == "active":
+                    officers = [o for o in officers if "resigned_on" not in o]
+                return 200, {"kind": "officer-list", "items": officers, "active_count": sum("resigned_on" not in o for o in officers)}
+            return 200, profiles[number]
+        return 404, {"errors": [{"error": "company-profile-not-found", "type": "ch:service"}]}
+
+    # -----------------------------
+    # NameAPI person matcher
+    # -----------------------------
+    def _nameapi(self, request, path, query, body):
+        if not query.get("apiKey"):
+            return 401, {"error": "API key missing"}
+        if not path.endswith("/matcher/personmatcher"):
+            return 404, {"error": "not found"}
+        people = json.loads(body or "{}")
+        person1 = " ".join(f["string"] for f in people["inputPerson1"]["personName"]["nameFields"]).upper()
+        person2 = [f["string"].upper() for f in people["inputPerson2"]["personName"]["nameFields"]]
+        return 200, {"matchType": self.match_type(person1, person2), "confidence": 0.9}
+
+    def match_type(self, person1: str, person2: list[str]) -> str:
+        """ Recorded answer for this pair if there is one, otherwise a simple rule """
+        for recorded in self.data["nameapi"]["matches"]:
+            if recorded["person1"] == person1 and recorded["person2"] == person2:
+                return recorded["matchType"]
+        tokens = person1.split()
+        for name in person2:
+            other = name.split()
+            if tokens == other:
+                return "EQUAL"
+            if tokens and other and tokens[-1] == other[-1] and tokens[0][0] == other[0][0]:
+                return "SIMILAR"
+        return "NO_MATCH"
+
+    # -----------------------------
+    # Microsoft Graph (SharePoint)
+    # -----------------------------
+    def _graph(self, request, path, query, body):
+        graph = self.data["graph"]
+        if path.startswith("/fake-download/"):
+            content = self._graph_file(path.removeprefix("/fake-download/"))
+            return (200, content) if content is not None else (404, {"error": {"code": "itemNotFound"}})
+
+        if not (request.headers.get("Authorization") or "").startswith("Bearer "):
+            return 401, {"error": {"code": "InvalidAuthenticationToken", "message": "Access token is empty."}}
+
+        if re.fullmatch(r"/v1\.0/sites/[^/]+:/sites/[^/]+", path):
+            return 200, graph["site"]
+
+        m = re.fullmatch(r"/v1\.0/sites/([^/]+)/drive/root:/(.+?)(:/content)?", path)
+        if not m or m.group(1) != graph["site"]["id"]:
+            return 404, {"error": {"code": "itemNotFound", "message": "The resource could not be found."}}
+        item_path = m.group(2)
+        if m.group(3):
+            if request.method != "PUT":
+                return 405, {"error": {"code": "methodNotAllowed"}}
+            self.files[item_path] = bytes(body or b"")
+            return 201, {"id": f"fake-{abs(hash(item_path))}", "name": item_path.rsplit("/", 1)[-1], "size": len(self.files[item_path])}
+
+        content = self._graph_file(item_path)
+        if content is None:
+            return 404, {"error": {"code": "itemNotFound", "message": "The resource could not be found."}}
+        return 200, {
+            "name": item_path.rsplit("/", 1)[-1],
+            "size": len(content),
+            "@microsoft.graph.downloadUrl": f"https://graph.microsoft.com/fake-download/{quote(item_path)}",
+        }
+
+    def _graph_file(self, item_path: str) -> Optional[bytes]:
+        if item_path in self.files:
+            return self.files[item_path]
+        fixture = self.data["graph"]["files"].get(item_path)
+        if fixture is None:
+            return None
+        with open(os.path.join(self.fixtures, fixture), "rb") as fh:
+            return fh.read()
@@ -0,0 +1,112 @@
+import os, sys
+import time
+from datetime import datetime
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from app import chbatch
+from app.models import CompanyValidation
+
+
+def test_RateLimiter_spaces_acquisitions():
+
+    limiter = chbatch.RateLimiter(rate=20)
+    started = time.perf_counter()
+    for _ in range(5):
+        limiter.acquire()
+    elapsed = time.perf_counter() - started
+
+    # first token is immediate, the next four wait 50ms each
+    assert elapsed >= 0.18, f"Rate limit not applied ({elapsed:.2f}s)"
+
+
+def test_gatherActiveChecks_dedupes(monkeypatch):
+
+    monkeypatch.setattr(chbatch, "getC7ActivePlacements", lambda: [
+        {"CandidateId": 1, "CompanyId": 10},
+        {"CandidateId": 1, "CompanyId": 10},
+        {"CandidateId": 2, "CompanyId": 11},
+    ])
+    monkeypatch.setattr(chbatch, "getC7Candidate", lambda cid, ch_lookup=True: {
+        1: {"name": "Mceachran:SP001, Cameron", "registration_number": "SC855314", "ltd_name": "AMBETH CONSULTING LIMITED"},
+        2: {"name": "Umbrella, Una", "registration_number": None, "ltd_name": None},
+    }[cid])
+    monkeypatch.setattr(chbatch, "getC7Company", lambda cid: {
+        10: {"CompanyName": "Bellrock Property & Facilities Management Limited", "CUSTOM_Company Registration Number": "03075427"},
+        11: {"CompanyName": "No Number Ltd", "CUSTOM_Company Registration Number": None},
+    }[cid])
+
+    checks = chbatch.gatherActiveChecks()
+
+    assert checks == [
+        ("SC855314", "AMBETH CONSULTING LIMITED", "Cameron Mceachran"),
+        ("03075427", "Bellrock Property & Facilities Management Limited"),
+    ], f"Unexpected checks {checks}"
+
+
+def test_revalidate_stores_verdicts(monkeypatch):
+
+    def fake_validateCH(ch_number, ch_name, director=None):
+        if ch_number == "BOOM":
+            raise RuntimeError("Companies House unavailable")
+        return {"Valid": ch_number != "2", "Narrative": "" if ch_number != "2" else f"{ch_name} is not Active"}
+
+    saved = []
+    monkeypatch.setattr(chbatch, "validateCH", fake_validateCH)
+    monkeypatch.setattr(chbatch, "saveVerdicts", lambda results: saved.extend(results) or True)
+
+    summary = chbatch.revalidate([("1", "a ltd"), ("2", "b ltd"), ("BOOM", "c ltd")], rate=100)
+
+    assert summary == {"checked": 2, "invalid": 1, "errors": 1}, f"Unexpected summary {summary}"
+    assert [check[0] for check, _ in saved] == ["1", "2"], "Failed checks should keep their old verdict"
+
+
+def test_validateCHStored_uses_fresh_verdicts(monkeypatch):
+
+    stored = CompanyValidation(regno="03075427", companyname="BELLROCK LIMITED", director="",
+                               valid=False, narrative="Bellrock Limited has outstanding charges",
+                               checkedat=datetime.now())
+    live_checks = []
+    saved = []
+
+    monkeypatch.setattr(chbatch, "loadVerdicts", lambda checks: {chbatch.verdict_key(("03075427", "Bellrock Limited")): stored})
+    monkeypatch.setattr(chbatch, "validateCHMany", lambda checks: live_checks.extend(checks) or [{"Valid": True, "Narrative": ""}])
+    monkeypatch.setattr(chbatch, "saveVerdicts", lambda results: saved.extend(results) or True)
+
+    results = chbatch.validateCHStored([("SC855314", "Ambeth Consulting Limited", "Cameron Mceachran"), ("03075427", "Bellrock Limited")])
+
+    assert live_checks == [("SC855314", "Ambeth Consulting Limited", "Cameron Mceachran")], "Stored verdict was revalidated live"
+    assert results[0].get("Valid") == True, "Live result out of order"
+    assert results[1].get("Narrative") == "Bellrock Limited has outstanding charges", "Stored verdict not returned"
+    assert [check for check, _ in saved] == live_checks, "Live result not written back"
+
+
+def test_verdict_key_matches_batch_and_interactive_names():
+
+    from app.helper import formatName
+
+    # the batch formats C7's candidate name; validateC7 passes the session's candidateName
+    batch = chbatch.verdict_key(("SC855314", "AMBETH CONSULTING LIMITED", formatName("Mceachran:SP001, Cameron")))
+    interactive = chbatch.verdict_key(("SC855314", "Ambeth Consulting Limited", "Cameron McEachran (SP001) "))
+
+    assert batch == interactive, f"Stored verdict would not be found: {batch} != {interactive}"
+
+
+def test_stored_verdict_has_the_live_result_shape(monkeypatch):
+
+    from app.chquery import validateCH
+
+    check = ("SC855314", "AMBETH CONSULTING LIMITED", "CAMERON MCEACHRAN")
+    live = validateCH(*check)
+
+    rows = []
+    monkeypatch.setattr(chbatch, "db_query_scalars", lambda stmt, operation_name: [])
+    monkeypatch.setattr(chbatch, "db_add", rows.append)
+    monkeypatch.setattr(chbatch, "db_commit", lambda operation_name: True)
+    assert chbatch.saveVerdicts([(check, live)]), "Verdict not saved"
+
+    stored = chbatch.verdict_result(rows[0])
+    assert set(stored) - {"CheckedAt"} == set(live), "Stored verdict keys differ from a live validateCH result"
+    assert stored["Address"] == live["Address"] and live["Address"], "Address not kept with the stored verdict"
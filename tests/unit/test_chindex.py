@@ -0,0 +1,72 @@
+import os, sys
+from datetime import date, timedelta
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from app import chindex, chquery
+
+SAMPLE_CSV = os.path.join(project_root, "tests", "fixtures", "ch_company_sample.csv")
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setenv("CH_INDEX_PATH", str(tmp_path / "ch_index.db"))
+    written = chindex.ingest(SAMPLE_CSV, snapshot_date=date.today().isoformat())
+    assert written == 6, "Sample file not fully indexed"
+    return tmp_path
+
+
+def test_getIndexedRecord(index):
+
+    record = chindex.getIndexedRecord("03075427")
+    assert record.get("company_name") == "BELLROCK PROPERTY & FACILITIES MANAGEMENT LIMITED", "Incorrect company name returned"
+    assert record.get("company_status") == "active", "Bulk status not mapped to API status"
+    assert record.get("jurisdiction") == "england-wales", "Jurisdiction not derived"
+
+    assert chindex.getIndexedRecord("SC855314").get("jurisdiction") == "scotland", "Scottish jurisdiction not derived"
+    assert chindex.getIndexedRecord("09999901").get("accounts", {}).get("overdue") == True, "Overdue accounts not flagged"
+    assert chindex.getIndexedRecord("09999902").get("has_charges") == True, "Charges not flagged"
+    assert chindex.getIndexedRecord("09999903").get("company_status") == "liquidation", "Liquidation status not mapped"
+    assert chindex.getIndexedRecord("00000000") is None, "Unknown company returned"
+
+
+def test_searchIndex(index):
+
+    items = chindex.searchIndex("Bellrock Property and Facilities Management Ltd")
+    assert [i.get("company_number") for i in items] == ["03075427"], "Normalised name search failed"
+
+
+def test_stale_entries_ignored(tmp_path, monkeypatch):
+
+    monkeypatch.setenv("CH_INDEX_PATH", str(tmp_path / "stale.db"))
+    chindex.ingest(SAMPLE_CSV, snapshot_date=(date.today() - timedelta(days=90)).isoformat())
+
+    assert chindex.getIndexedRecord("03075427") is None, "Stale entry returned"
+    assert chindex.searchIndex("AMBETH CONSULTING LIMITED") == [], "Stale entry returned from search"
+
+
+def test_validateCH_searches_index_but_reads_live_profile(index, fake_services):
+
+    # the bulk data has no dispute flag, so validation must see the live profile's
+    profile = next(c for c in fake_services.data["ch"]["companies"] if c["company_number"] == "SC855314")
+    profile["registered_office_is_in_dispute"] = True
+
+    result = chquery.validateCH("SC855314", "AMBETH CONSULTING LIMITED")
+
+    assert result.get("Narrative") == "Registered office of AMBETH CONSULTING LIMITED is in dispute", result
+    paths = [path for service, method, path in fake_services.calls if service == "ch"]
+    assert paths == ["/company/SC855314"], f"Search should come from the index, the profile from the API: {paths}"
+
+
+def test_getCHbasics_uses_index(index, monkeypatch):
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("Live Companies House API called")
+
+    monkeypatch.setattr(chquery.requests, "get", no_network)
+
+    address, jurisdiction = chquery.getCHbasics("AMBETH CONSULTING LIMITED", "SC855314")
+    assert jurisdiction == "scotland", "Jurisdiction not read from the index"
@@ -32,3 +32,42 @@ def test_validateCH():
 
     assert result.get("Valid") == True, "Company validation failed when it should have passed"
 
+
+def test_validateCH_nameapi_without_matchtype_is_not_a_director(monkeypatch):
+
+    from app import chquery
+
+    # a reply with no matchType must not count as a match ("" is in every string)
+    monkeypatch.setattr(chquery, "matchNameAPI", lambda name, officers: "")
+
+    result = validateCH("SC855314", "AMBETH CONSULTING LIMITED", "DAVID JONES")
+
+    assert result.get("Valid") == False, "Director accepted without a NameAPI matchType"
+    assert result.get("Narrative") == "DAVID JONES not listed as a director of AMBETH CONSULTING LIMITED", result
+
+
+def test_validateCHMany_runs_concurrently_in_order(monkeypatch):
+
+    import time
+    from app import chquery
+
+    def fake_search(name):
+        time.sleep(0.2)
+        return {"items": [{"title": name.upper(), "company_number": name[:2].upper() + "000001", "address_snippet": "1 High Street"}]}
+
+    def fake_record(number):
+        time.sleep(0.2)
+        status = "dissolved" if number.startswith("BB") else "active"
+        return {"company_status": status, "jurisdiction": "england-wales"}
+
+    monkeypatch.setattr(chquery, "searchCH", fake_search)
+    monkeypatch.setattr(chquery, "getCHRecord", fake_record)
+
+    started = time.perf_counter()
+    results = chquery.validateCHMany([("AA000001", "aa ltd"), ("BB000001", "bb ltd")])
+    elapsed = time.perf_counter() - started
+
+    assert [r.get("CompanyNumber") for r in results] == ["AA000001", "BB000001"], "Results returned out of order"
+    assert results[0].get("Valid") == True, "Active company failed validation"
+    assert results[1].get("Narrative") == "bb ltd is not Active", "Dissolved company passed validation"
+    assert elapsed < 0.35, f"Lookups ran serially ({elapsed:.2f}s)"
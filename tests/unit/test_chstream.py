@@ -0,0 +1,125 @@
+import os, sys
+from datetime import date
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from app import chindex, chstream
+from tests.fakes.chstream import ReplayStreamServer
+
+FIXTURES = os.path.join(project_root, "tests", "fixtures")
+WATCHED = {"03075427", "SC855314", "09999903"}
+
+
+@pytest.fixture
+def stream(tmp_path, monkeypatch):
+    monkeypatch.setenv("CH_INDEX_PATH", str(tmp_path / "ch_index.db"))
+    monkeypatch.setenv("CHSTREAMKEY", "test-stream-key")
+    chindex.ingest(os.path.join(FIXTURES, "ch_company_sample.csv"), snapshot_date=date.today().isoformat())
+
+    invalidated = []
+    monkeypatch.setattr(chstream, "invalidateVerdicts", lambda numbers: invalidated.extend(numbers) or len(numbers))
+
+    server = ReplayStreamServer({
+        "companies": os.path.join(FIXTURES, "ch_stream_companies.jsonl"),
+        "officers": os.path.join(FIXTURES, "ch_stream_officers.jsonl"),
+    })
+    monkeypatch.setenv("CH_STREAM_URL", server.start())
+    yield server, invalidated
+    server.stop()
+
+
+def test_companies_stream_updates_watched_companies(stream):
+
+    server, invalidated = stream
+    stats = chstream.consume("companies", watched=WATCHED, once=True)
+
+    assert stats == {"events": 4, "matched": 2}, f"Unexpected stats {stats}"
+    assert sorted(invalidated) == ["03075427", "09999903"], "Verdicts not invalidated for watched companies"
+    assert chindex.getIndexedRecord("03075427").get("company_status") == "liquidation", "Index not updated from stream"
+    assert chindex.getIndexedRecord("09999903") is None, "Deleted company left in index"
+
+    changes = chstream.recentChanges("03075427")
+    assert [(c["timepoint"], c["action"]) for c in changes] == [(101, "updated")], "Change event not recorded"
+
+
+def test_consumer_resumes_from_saved_timepoint(stream):
+
+    server, invalidated = stream
+    chstream.consume("companies", watched=WATCHED, once=True)
+    invalidated.clear()
+
+    stats = chstream.consume("companies", watched=WATCHED, once=True)
+
+    assert server.requests == [("companies", None), ("companies", 104)], f"Unexpected requests {server.requests}"
+    assert stats == {"events": 0, "matched": 0}, "Events replayed after resume"
+    assert invalidated == [], "Verdicts invalidated twice"
+
+
+def test_officers_stream_invalidates_director_checks(stream):
+
+    server, invalidated = stream
+    stats = chstream.consume("officers", watched=WATCHED, once=True)
+
+    assert stats == {"events": 2, "matched": 1}, f"Unexpected stats {stats}"
+    assert invalidated == ["SC855314"], "Officer change did not invalidate verdict"
+    assert chindex.getIndexedRecord("SC855314") is not None, "Officer event should not touch the index"
+
+
+def test_failed_invalidation_keeps_the_resume_point(stream, monkeypatch):
+
+    server, invalidated = stream
+    monkeypatch.setattr(chstream, "invalidateVerdicts", lambda numbers: None)
+    chstream.consume("companies", watched=WATCHED, once=True)
+
+    assert chindex.getIndexedRecord("03075427").get("company_status") == "active", "Index change committed without the invalidation"
+
+    monkeypatch.setattr(chstream, "invalidateVerdicts", lambda numbers: invalidated.extend(numbers) or len(numbers))
+    chstream.consume("companies", watched=WATCHED, once=True)
+
+    assert server.requests == [("companies", None), ("companies", None)], f"Resume point moved on: {server.requests}"
+    assert sorted(invalidated) == ["03075427", "09999903"], "Events not repeated after the failed invalidation"
+
+
+def test_unreadable_watch_list_is_an_error(stream, monkeypatch):
+
+    monkeypatch.setattr(chstream, "loadWatchedCompanies", lambda: None)
+
+    with pytest.raises(RuntimeError):
+        chstream.consume("companies", once=True)
+
+
+def test_heartbeats_are_yielded_when_asked(stream):
+
+    events = list(chstream.readStream("companies", heartbeats=True))
+
+    assert events.count(None) == 1 and len(events) == 5, "Heartbeat line not passed to the consumer"
+    assert None not in chstream.readStream("companies"), "Heartbeats should be skipped by default"
+
+
+def test_expired_timepoint_invalidates_every_watched_company(stream, monkeypatch):
+
+    server, invalidated = stream
+    conn = chstream.stream_connection()
+    chstream.saveTimepoint(conn, "companies", 5000)
+    conn.commit()
+    conn.close()
+
+    # the gap cannot be covered while the database is down: keep the expired resume point
+    monkeypatch.setattr(chstream, "invalidateVerdicts", lambda numbers: None)
+    chstream.consume("companies", watched=WATCHED, once=True)
+    conn = chstream.stream_connection()
+    assert chstream.loadTimepoint(conn, "companies") == 5000, "Expired resume point dropped before the gap was covered"
+    conn.close()
+
+    monkeypatch.setattr(chstream, "invalidateVerdicts", lambda numbers: invalidated.extend(numbers) or len(numbers))
+    server.requests.clear()
+    chstream.consume("companies", watched=WATCHED, once=True)
+
+    assert server.requests == [("companies", 5001), ("companies", None)], f"Unexpected requests {server.requests}"
+    assert set(invalidated) == WATCHED, "Watched verdicts not invalidated for the missed events"
+    conn = chstream.stream_connection()
+    assert chstream.loadTimepoint(conn, "companies") == 103, "Stream not followed from now after the gap"
+    conn.close()
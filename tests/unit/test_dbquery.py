@@ -0,0 +1,369 @@
+import os, sys
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+import app as app_package
+from app import db
+from app.models import ServiceArrangement, ServiceContract, ServiceStandard
+from app import dbquery
+from app.dbquery import invalidateServiceCache, loadServiceBundle, serviceCacheStats
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """ SQLite stand-in for Azure SQL, with the dbo schema attached as a second file """
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'main.db'}"
+    flask_app.secret_key = "test"
+    db.init_app(flask_app)
+    monkeypatch.setattr(app_package, "db_connected", True)
+    monkeypatch.setenv("SID_CACHE_DIR", str(tmp_path / "sid_versions"))
+    dbquery.clearServiceCache()
+
+    with flask_app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def attach_dbo(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+        db.create_all()
+        db.session.add_all([
+            ServiceStandard(sid="CS", ssn="CS1", description="Change Specialists standard"),
+            ServiceStandard(sid="SP001", ssn="SS1", description="First standard"),
+            ServiceStandard(sid="sp001", ssn="SS2", description="Second standard"),
+            ServiceStandard(sid="SP002", ssn="SS1", description="Other provider"),
+            ServiceArrangement(sid="SP001", day="Monday", defaultserviceperiod="0800 - 1800",
+                               atservicebase="As specified", atclientlocation="As specified", atotherlocation="Prior approval required"),
+            ServiceContract(sid="SP001", specialconditions="None", context="Context text"),
+        ])
+        db.session.commit()
+        with flask_app.test_request_context("/"):
+            yield flask_app
+        db.session.remove()
+
+
+def test_loadServiceBundle_single_round_trip(database):
+
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    bundle = loadServiceBundle("Sp001", include_cs=True)
+
+    assert len(statements) == 1, f"Expected one round trip, got {len(statements)}"
+    assert [s["ssn"] for s in bundle.standards] == ["SS1", "SS2"], "Standards not matched case-insensitively"
+    assert [a["day"] for a in bundle.arrangements] == ["Monday"], "Arrangements missing"
+    assert bundle.arrangements[0]["atotherlocation"] == "Prior approval required", "Arrangement columns misaligned"
+    assert bundle.contract == {"conid": 1, "sid": "SP001", "specialconditions": "None", "context": "Context text"}, "Contract missing"
+    assert [s["ssn"] for s in bundle.cs_standards] == ["CS1"], "CS standards missing"
+
+
+def test_loadServiceBundle_empty(database):
+
+    bundle = loadServiceBundle("SP999")
+    assert bundle.standards == [] and bundle.arrangements == [] and bundle.contract is None, "Unknown SID returned data"
+    assert bundle.cs_standards == [], "CS standards loaded without include_cs"
+
+    assert loadServiceBundle("CS", include_cs=True).cs_standards == loadServiceBundle("CS").standards, "CS bundle should reuse standards"
+
+
+def test_sid_matches_uses_index(database):
+
+    from sqlalchemy import select
+    from app.dbquery import sid_matches
+
+    stmt = select(ServiceStandard).where(sid_matches(ServiceStandard, " sp001 "))
+    compiled = stmt.compile(db.engine, compile_kwargs={"literal_binds": True})
+    plan = " ".join(row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}")))
+
+    assert "USING INDEX ix_ServiceStandard_sid_norm" in plan, f"SID lookup does not use the index: {plan}"
+    assert len(db.session.execute(stmt).scalars().all()) == 2, "Normalised SID lookup missed rows"
+
+
+def test_saveServiceArrangements_batches_writes(database):
+
+    from app.dbquery import WEEKDAYS, saveServiceArrangements
+
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2].split()[0]))
+
+    # New SID: seven rows inserted in one statement, plus the contract record
+    form = {day: {"defaultserviceperiod": None, "atservicebase": None, "atclientlocation": None, "atotherlocation": None} for day in WEEKDAYS}
+    form["Monday"]["atservicebase"] = "Remote"
+    saved = saveServiceArrangements("sp003", form, "Conditions")
+
+    assert statements == ["SELECT", "INSERT", "INSERT"], f"Unexpected statements {statements}"
+    assert [row["day"] for row in saved.arrangements] == WEEKDAYS, "Written state not returned in day order"
+    assert all(row["arrid"] for row in saved.arrangements), "Inserted keys not returned"
+    assert saved.arrangements[0]["atservicebase"] == "Remote", "Form value not saved"
+    assert saved.arrangements[5]["defaultserviceperiod"] == "As agreed if required", "Weekend default not applied"
+
+    # One changed day: a single UPDATE for the arrangements, contract untouched
+    statements.clear()
+    form["Tuesday"]["atotherlocation"] = "Anywhere"
+    saved = saveServiceArrangements("SP003", form, "Conditions")
+    assert statements == ["SELECT", "UPDATE"], f"Unexpected statements {statements}"
+
+    # Nothing changed: read only
+    statements.clear()
+    saveServiceArrangements("SP003", form, "Conditions")
+    assert statements == ["SELECT"], f"Unchanged save wrote to the database: {statements}"
+
+    stored = loadServiceBundle("SP003")
+    assert {row["day"]: row["atotherlocation"] for row in stored.arrangements}["Tuesday"] == "Anywhere", "Update not stored"
+    assert len(stored.arrangements) == 7, "Duplicate arrangement rows written"
+    assert stored.contract["specialconditions"] == "Conditions", "Contract not stored"
+
+
+def test_saveServiceStandards_batches_writes(database):
+
+    from app.dbquery import saveServiceStandards
+
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2].split()[0]))
+
+    # stdids 2 and 3 belong to SP001 (see fixture): change one, keep one, add two, skip a blank row
+    written = saveServiceStandards("SP001", [
+        ("2", "SS1", "First standard"),
+        ("3", "SS2", '"Second standard, revised"'),
+        ("", "SS3", "Third standard"),
+        ("", "SS4", "Fourth standard"),
+        ("", "", ""),
+    ])
+
+    assert statements == ["SELECT", "UPDATE", "INSERT"], f"Unexpected statements {statements}"
+    assert [(s["ssn"], s["description"]) for s in written] == [
+        ("SS1", "First standard"),
+        ("SS2", "Second standard, revised"),
+        ("SS3", "Third standard"),
+        ("SS4", "Fourth standard"),
+    ], f"Unexpected written state {written}"
+    assert all(s["stdid"] for s in written), "Inserted keys not returned"
+
+    stored = [(s["stdid"], s["ssn"], s["description"]) for s in loadServiceBundle("SP001").standards]
+    assert stored == [(s["stdid"], s["ssn"], s["description"]) for s in written], "Written state differs from the database"
+
+    statements.clear()
+    saveServiceStandards("SP001", [(str(s["stdid"]), s["ssn"], s["description"]) for s in written])
+    assert statements == ["SELECT"], f"Unchanged save wrote to the database: {statements}"
+
+
+def test_saveServiceStandards_only_updates_this_sid(database):
+
+    from app.dbquery import saveServiceStandards
+
+    # stdid 4 belongs to SP002: posted for SP001 it becomes a new SP001 row
+    saveServiceStandards("SP001", [("4", "SS1", "Posted with another provider's ID")])
+
+    assert db.session.get(ServiceStandard, 4).description == "Other provider", "Another SID's standard overwritten"
+    assert "Posted with another provider's ID" in [s["description"] for s in loadServiceBundle("SP001").standards], \
+        "Row not added to this SID"
+
+
+def test_save_invalidates_request_loader(database):
+
+    from app.dbquery import saveServiceStandards
+    from app.loader import get_loader
+
+    assert len(get_loader().bundle("SP001").standards) == 2, "Bundle not loaded"
+    saveServiceStandards("SP001", [("", "SS3", "Third standard")])
+    assert len(get_loader().bundle("sp001").standards) == 3, "Request loader kept the bundle from before the save"
+
+
+def test_saveServiceStandards_failed_read_writes_nothing(database, monkeypatch):
+
+    from app.dbquery import saveServiceStandards
+
+    with monkeypatch.context() as patch:
+        patch.setattr(dbquery, "db_query_all", lambda stmt, operation_name, default: default)
+        assert saveServiceStandards("SP001", [("2", "SS1", "First standard"), ("3", "SS2", "Second standard")]) is None, \
+            "Failed read reported as a successful save"
+
+    assert [s["ssn"] for s in loadServiceBundle("SP001").standards] == ["SS1", "SS2"], "Rows inserted again after a failed read"
+
+
+def test_standards_page_shows_full_set_after_save(database):
+
+    import jinja2
+    from app.views import views_bp
+
+    database.register_blueprint(views_bp)
+    database.jinja_loader = jinja2.FileSystemLoader(os.path.join(project_root, "app", "templates"))
+    client = database.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session["sessionContract"] = {"sid": "SP001"}
+
+    # only the edited row is posted
+    response = client.post("/servicestandards", data={
+        "which": "SP Standards", "id": ["2"], "ssn": ["SS1"], "service-description": ["First, revised"], "context": "Context text",
+    })
+
+    assert response.status_code == 200, response.data[:500]
+    assert b"First, revised" in response.data and b"Second standard" in response.data, "Page does not show every standard"
+    with client.session_transaction() as flask_session:
+        assert [s["ssn"] for s in flask_session["serviceStandards"]] == ["SS1", "SS2"], "Session standards not the full set"
+
+
+def test_loadServiceBundle_cached_until_invalidated(database):
+
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    first = loadServiceBundle("SP001", include_cs=True)
+    first.standards.clear()
+    again = loadServiceBundle(" sp001", include_cs=True)
+
+    assert len(statements) == 1, f"Cached bundle hit the database ({len(statements)} queries)"
+    assert [s["ssn"] for s in again.standards] == ["SS1", "SS2"], "Caller changes leaked into the cache"
+
+    db.session.add(ServiceStandard(sid="SP001", ssn="SS3", description="Third standard"))
+    db.session.commit()
+    invalidateServiceCache("SP001")
+    statements.clear()
+
+    refreshed = loadServiceBundle("SP001", include_cs=True)
+    assert len(statements) == 1, "Invalidated SID not refetched"
+    assert [s["ssn"] for s in refreshed.standards] == ["SS1", "SS2", "SS3"], "Stale standards after invalidation"
+    assert "'standard'" in statements[0] and statements[0].count("sid_norm =") == 3, "CS standards refetched with SP001"
+
+
+def test_cache_version_bump_from_another_worker(database):
+
+    loadServiceBundle("SP001")
+    db.session.add(ServiceStandard(sid="SP001", ssn="SS3", description="Third standard"))
+    db.session.commit()
+
+    # another worker's invalidation: only the shared version stamp changes
+    local = dict(dbquery._sid_cache)
+    invalidateServiceCache("SP001")
+    dbquery._sid_cache.update(local)
+
+    assert [s["ssn"] for s in loadServiceBundle("SP001").standards] == ["SS1", "SS2", "SS3"], "Version bump ignored"
+
+
+def test_cache_is_bounded(database, monkeypatch):
+
+    monkeypatch.setenv("SID_CACHE_MAX_ENTRIES", "2")
+    for sid in ["SP001", "SP002", "SP003"]:
+        loadServiceBundle(sid)
+
+    stats = serviceCacheStats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1, f"Cache not bounded {stats}"
+    assert list(dbquery._sid_cache) == ["SP002", "SP003"], "Least recently used entry not evicted"
+
+
+def test_failed_fetch_not_cached(database, monkeypatch):
+
+    monkeypatch.setattr(app_package, "db_connected", False)
+    assert loadServiceBundle("SP001").standards == [], "Expected empty bundle while disconnected"
+
+    monkeypatch.setattr(app_package, "db_connected", True)
+    assert [s["ssn"] for s in loadServiceBundle("SP001").standards] == ["SS1", "SS2"], "Failed fetch was cached"
+
+
+@pytest.fixture
+def replica_db(database, tmp_path, monkeypatch):
+    """ Read-replica enabled and synced from the test database """
+    from app import replica
+
+    monkeypatch.setenv("DB_REPLICA", "1")
+    monkeypatch.setenv("DB_REPLICA_PATH", str(tmp_path / "replica.db"))
+    assert replica.syncReplica() == {"ServiceStandard": 4, "ServiceArrangement": 1, "ServiceContract": 1}, "Sync counts wrong"
+    yield replica
+
+
+def test_replica_serves_reads_while_primary_down(replica_db, monkeypatch):
+
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    monkeypatch.setattr(app_package, "db_connected", False)
+
+    assert replica_db.is_serving(), "Synced replica not serving while primary down"
+    bundle = loadServiceBundle("sp001", include_cs=True)
+
+    assert statements == [], "Primary queried while replica serving"
+    assert [s["ssn"] for s in bundle.standards] == ["SS1", "SS2"], "Standards not read from replica"
+    assert bundle.contract["context"] == "Context text", "Contract not read from replica"
+    assert [s["ssn"] for s in bundle.cs_standards] == ["CS1"], "CS standards not read from replica"
+    assert serviceCacheStats()["entries"] == 0, "Replica reads should not be cached"
+
+
+def test_replica_queues_writes_and_replays(replica_db, monkeypatch):
+
+    from app.dbquery import saveServiceContract, saveServiceStandards
+
+    monkeypatch.setattr(app_package, "db_connected", False)
+    written = saveServiceStandards("SP001", [("3", "SS2", "Edited while waking"), ("", "SS9", "Added while waking")])
+    assert saveServiceContract("SP001", "New context", "None") is not None, "Contract save not queued"
+
+    assert [(w["stdid"], w["description"]) for w in written] == [(-1, "Added while waking"), (3, "Edited while waking")], \
+        "Queued save did not return the projected state"
+    assert [w["operation"] for w in replica_db.pendingWrites()] == ["saveServiceStandards", "saveServiceContract"], "Writes not queued"
+    assert "Added while waking" in [s["description"] for s in loadServiceBundle("SP001").standards], "Replica not updated"
+    assert db.session.get(ServiceStandard, 3).description == "Second standard", "Primary written while down"
+
+    # a pending row re-submitted before the replay is not inserted twice
+    saveServiceStandards("SP001", [("-1", "SS9", "Added while waking")])
+    assert len(replica_db.pendingWrites()) == 2, "Pending row queued again"
+
+    monkeypatch.setattr(app_package, "db_connected", True)
+    assert replica_db.replayQueuedWrites() == 2, "Queued writes not replayed"
+
+    db.session.expire_all()
+    assert db.session.get(ServiceStandard, 3).description == "Edited while waking", "Queued update not replayed"
+    assert [s["ssn"] for s in loadServiceBundle("SP001").standards] == ["SS1", "SS2", "SS9"], "Queued insert not replayed"
+    assert loadServiceBundle("SP001").contract["context"] == "New context", "Queued contract save not replayed"
+    assert replica_db.pendingWrites() == [], "Replayed writes left in the queue"
+
+    monkeypatch.setattr(app_package, "db_connected", False)
+    assert [s["stdid"] for s in loadServiceBundle("SP001").standards] == [2, 3, 5], "Replica not refreshed after replay"
+
+
+def test_replica_not_serving_before_first_sync(database, tmp_path, monkeypatch):
+
+    from app import replica
+
+    monkeypatch.setenv("DB_REPLICA", "1")
+    monkeypatch.setenv("DB_REPLICA_PATH", str(tmp_path / "empty.db"))
+    monkeypatch.setattr(app_package, "db_connected", False)
+    assert not replica.is_serving(), "Empty replica should not serve"
+
+
+def test_replica_replays_each_write_in_one_worker(replica_db, monkeypatch):
+
+    from app.dbquery import saveServiceContract
+
+    monkeypatch.setattr(app_package, "db_connected", False)
+    saveServiceContract("SP001", "New context", "None")
+    monkeypatch.setattr(app_package, "db_connected", True)
+
+    # another worker has claimed the write and is replaying it
+    assert replica_db._claimNext("other-worker")["operation"] == "saveServiceContract", "Write not claimed"
+    assert replica_db.replayQueuedWrites() == 0, "Write claimed by another worker replayed again"
+    assert len(replica_db.pendingWrites()) == 1, "Claimed write removed by the wrong worker"
+
+    # the claim outlives the timeout, so the worker is taken to have died
+    monkeypatch.setenv("DB_REPLICA_CLAIM_SECONDS", "0")
+    assert replica_db.replayQueuedWrites() == 1, "Stale claim not taken over"
+    assert replica_db.pendingWrites() == [], "Replayed write left in the queue"
+
+
+def test_replica_logs_dropped_edits_to_provisional_rows(replica_db, monkeypatch, caplog):
+
+    import logging
+    from app.dbquery import saveServiceStandards
+
+    monkeypatch.setattr(app_package, "db_connected", False)
+    saveServiceStandards("SP001", [("", "SS9", "Added while waking")])
+
+    # the app logger does not propagate to the root logger caplog listens on
+    monkeypatch.setattr(logging.getLogger("app"), "handlers", [caplog.handler])
+    with caplog.at_level(logging.WARNING, logger="app"):
+        saveServiceStandards("SP001", [("-1", "SS9", "Added while waking")])
+        assert "dropped edits" not in caplog.text, "Unchanged provisional row reported"
+        saveServiceStandards("SP001", [("-1", "SS9", "Edited before the replay")])
+    assert "dropped edits to standards [-1]" in caplog.text, "Edit to a provisional row dropped silently"
@@ -0,0 +1,87 @@
+import os, sys
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+import app as app_package
+from app import dbwake
+
+LONDON = ZoneInfo("Europe/London")
+
+
+@pytest.fixture
+def schedule(monkeypatch):
+    monkeypatch.setenv("DB_PREWAKE_AT", "08:15")
+    monkeypatch.setenv("DB_PREWAKE_DAYS", "Mon-Fri")
+    monkeypatch.setenv("DB_KEEPWARM_WINDOWS", "Mon-Fri 09:00-12:30, Sat 10:00-11:00")
+    monkeypatch.setattr(dbwake, "_last_ping", None)
+    monkeypatch.setattr(dbwake, "_prewakes_fired", set())
+    wakes = []
+    monkeypatch.setattr(dbwake, "request_wake", lambda reason: wakes.append(reason) or "started")
+    return wakes
+
+
+def test_parse_days_and_windows():
+
+    assert dbwake.parse_days("Mon-Fri") == {0, 1, 2, 3, 4}, "Weekday range not parsed"
+    assert dbwake.parse_days("Sat-Mon") == {5, 6, 0}, "Wrapping range not parsed"
+    assert dbwake.parse_windows("Tue 9:00-17:30") == [({1}, "09:00", "17:30")], "Window not parsed"
+
+
+def test_prewake_fires_once_near_scheduled_time(schedule, monkeypatch):
+
+    monday = datetime(2025, 3, 3, 8, 16, tzinfo=LONDON)
+    assert dbwake.tick(monday) == ["prewake"], "Pre-wake did not fire"
+    assert dbwake.tick(monday.replace(minute=17)) == [], "Pre-wake fired twice"
+
+    late_start = datetime(2025, 3, 4, 11, 0, tzinfo=LONDON)
+    assert "prewake" not in dbwake.tick(late_start), "Pre-wake fired hours late"
+    assert dbwake.tick(datetime(2025, 3, 8, 8, 16, tzinfo=LONDON)) == [], "Pre-wake fired at the weekend"
+
+    # a late-evening pre-wake whose 10 minute window runs past midnight
+    monkeypatch.setenv("DB_PREWAKE_AT", "23:55")
+    assert dbwake.tick(datetime(2025, 3, 5, 23, 57, tzinfo=LONDON)) == ["prewake"], "Pre-wake near midnight did not fire"
+
+    monkeypatch.setenv("DB_PREWAKE_AT", "08:15")
+    assert dbwake.next_prewake(datetime(2025, 3, 7, 9, 0, tzinfo=LONDON)) == datetime(2025, 3, 10, 8, 15, tzinfo=LONDON), \
+        "Next pre-wake should skip the weekend"
+
+
+def test_keepwarm_only_inside_windows(schedule, monkeypatch):
+
+    assert dbwake.tick(datetime(2025, 3, 3, 10, 0, tzinfo=LONDON)) == ["keep-warm"], "Keep-warm did not fire in window"
+    assert dbwake.tick(datetime(2025, 3, 3, 13, 0, tzinfo=LONDON)) == [], "Keep-warm fired outside window"
+    assert dbwake.tick(datetime(2025, 3, 8, 10, 30, tzinfo=LONDON)) == ["keep-warm"], "Saturday window ignored"
+
+    monkeypatch.setattr(dbwake, "_last_ping", dbwake.time.monotonic())
+    assert dbwake.tick(datetime(2025, 3, 3, 10, 5, tzinfo=LONDON)) == [], "Keep-warm ignored interval"
+
+
+def test_request_wake_starts_one_timed_connect(monkeypatch):
+
+    release = threading.Event()
+    connects = []
+
+    def fake_connect():
+        connects.append(1)
+        release.wait(5)
+        app_package.db_connected = True
+
+    monkeypatch.setattr(app_package, "db_connected", False)
+    monkeypatch.setattr(app_package, "db_wake_thread", None)
+    monkeypatch.setattr(app_package, "connect_database_background", fake_connect)
+
+    assert dbwake.request_wake("index") == "started", "Wake not started"
+    assert dbwake.request_wake("index") == "in-progress", "Second wake started while one is running"
+    assert dbwake.wake_status()["in_progress"], "Wake not reported in progress"
+
+    release.set()
+    app_package.db_wake_thread.join(5)
+    assert connects == [1], "Connect ran more than once"
+    last = dbwake.wake_status()["last_wake"]
+    assert last["reason"] == "index" and last["connected"], f"Wake timing not recorded {last}"
@@ -0,0 +1,75 @@
+import os, sys
+import time
+from datetime import date, datetime
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+import requests
+from app import c7query, chquery, helper
+
+
+def test_injected_status_reaches_the_caller(fake_services):
+    fake_services.fail("c7", "Company/AdvancedSearch", status=503)
+
+    first = c7query.getC7Company(5074)
+    second = c7query.getC7Company(5074)
+
+    assert first.get("status_code") == 503, f"injected 503 not returned: {first}"
+    assert second.get("CompanyId") == 5074, "failure should only apply to the next call"
+
+
+def test_injected_timeout_is_raised(fake_services):
+    fake_services.fail("ch", "/officers", exception=requests.Timeout)
+
+    with pytest.raises(requests.Timeout):
+        chquery.getCHOfficers("SC855314")
+
+
+def test_latency_is_applied_per_service(fake_services):
+    fake_services.latency["c7"] = 0.05
+
+    started = time.perf_counter()
+    c7query.getC7Contact(5286)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed >= 0.05, f"C7 call should take at least 50ms, took {elapsed * 1000:.1f}ms"
+    assert fake_services.calls[-1] == ("c7", "GET", "/api/Contact/Get"), fake_services.calls
+
+
+def test_error_rate_is_seeded(fake_services):
+    fake_services.error_rate["ch"] = 0.5
+    fake_services._rng.seed(7)
+    first = [requests.get("https://api.company-information.service.gov.uk/company/03075427", auth=("k", "")).status_code
+             for _ in range(20)]
+    fake_services._rng.seed(7)
+    second = [requests.get("https://api.company-information.service.gov.uk/company/03075427", auth=("k", "")).status_code
+              for _ in range(20)]
+
+    assert set(first) == {200, 503}, f"expected a mix of successes and injected errors: {first}"
+    assert first == second, "the same seed should inject the same errors"
+
+
+def test_unknown_hosts_are_refused(fake_services):
+    with pytest.raises(requests.ConnectionError):
+        requests.get("https://example.com/")
+
+
+def test_placement_dates_are_relative_to_today(fake_services):
+    active = c7query.getC7ActivePlacements()
+
+    assert {p["PlacementId"] for p in active} == {227, 229}, "ended placement 221 should be filtered out"
+    start = datetime.strptime(next(p for p in active if p["PlacementId"] == 229)["StartDate"], "%d %b %Y").date()
+    assert start > date.today(), "placement 229 is recorded as starting in the future"
+
+
+def test_sharepoint_upload_then_download(fake_services):
+    content = b"PK" + b"\0" * 200
+
+    status = helper.uploadToSharePoint(content, "Okafor NDA.docx", "Contracts/SP0231")
+    downloaded = helper.downloadFromSharePoint("Contracts/SP0231", "Okafor NDA.docx")
+
+    assert status == 201, f"upload should be accepted, got {status}"
+    assert downloaded == content, "downloaded file should match the upload"
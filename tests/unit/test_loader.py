@@ -0,0 +1,49 @@
+import os, sys
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from flask import Flask
+from app import loader as loader_module
+from app.helper import load_config
+from app.loader import get_loader
+
+app = Flask(__name__)
+
+
+def test_loader_fetches_each_bundle_once(monkeypatch):
+
+    calls = []
+    monkeypatch.setattr(loader_module, "loadServiceBundle",
+                        lambda sid, include_cs=False: calls.append((sid, include_cs)) or f"bundle {sid}")
+
+    with app.test_request_context("/"):
+        loader = get_loader()
+        for _ in range(3):
+            assert loader.bundle("sp001") == "bundle sp001", "Bundle not returned"
+            assert loader.bundle("SP001 ", include_cs=True) == "bundle SP001 ", "Bundle with CS standards not returned"
+        assert get_loader() is loader, "Loader not shared within the request"
+
+        assert calls == [("sp001", False), ("SP001 ", True)], f"Duplicate fetches {calls}"
+        assert loader.counts == {"bundle": 2}, f"Unexpected counts {loader.counts}"
+        assert loader.hits == {"bundle": 4}, f"Unexpected hits {loader.hits}"
+
+        loader.invalidate("SP001")
+        loader.bundle("SP001")
+        assert loader.counts.get("bundle") == 3, "Invalidated entry not refetched"
+
+    with app.test_request_context("/"):
+        assert get_loader().counts == {}, "Loader leaked across requests"
+
+
+def test_load_config_read_once_per_request(monkeypatch):
+
+    reads = []
+    monkeypatch.setattr(loader_module, "read_config", lambda: reads.append(1) or {"C7_USERID": "user"})
+
+    with app.test_request_context("/"):
+        for _ in range(3):
+            assert load_config().get("C7_USERID") == "user", "Config not returned"
+
+    assert len(reads) == 1, f"Config read {len(reads)} times in one request"
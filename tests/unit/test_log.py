@@ -0,0 +1,93 @@
+import os, sys
+import io
+import json
+import logging
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from app import log as app_log, tracing
+
+
+class Exploding:
+    """ Fails the test if anything tries to format it """
+
+    def __str__(self):
+        raise AssertionError("message formatted although debug is disabled")
+
+    __repr__ = __str__
+
+
+@pytest.fixture
+def output(monkeypatch):
+    monkeypatch.delenv("LOG_LEVEL", raising=False)
+    monkeypatch.delenv("LOG_FORMAT", raising=False)
+    stream = io.StringIO()
+
+    def configure(level=logging.DEBUG):
+        app_log.configure(level=level, stream=stream)
+        return stream
+    yield configure
+    app_log.configure()
+
+
+def test_disabled_debug_does_not_format(output):
+    stream = output(logging.INFO)
+    log = app_log.get_logger("app.test_log")
+
+    assert log.debug_enabled is False, "debug should be disabled at INFO"
+    log.debug("value: %s", Exploding())
+    assert stream.getvalue() == "", f"nothing should be written, got {stream.getvalue()!r}"
+
+
+def test_configure_refreshes_cached_level(output):
+    log = app_log.get_logger("app.test_log")
+    output(logging.INFO)
+    assert log.debug_enabled is False, "debug should be disabled at INFO"
+
+    stream = output(logging.DEBUG)
+    assert log.debug_enabled is True, "existing loggers should pick up the new level"
+    log.debug("getC7Candidate: Fetching data for CandidateId %s", 42)
+    assert "DEBUG app.test_log getC7Candidate: Fetching data for CandidateId 42" in stream.getvalue(), stream.getvalue()
+
+
+def test_structured_fields_and_trace_id(output, tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACING", "1")
+    monkeypatch.setenv("TRACE_SINK", str(tmp_path / "traces.jsonl"))
+    stream = output()
+    log = app_log.get_logger("app.test_log")
+
+    root = tracing.start_trace("GET views.index")
+    try:
+        log.info("loadServiceBundle: fetched", sid="SP0001", rows=3, note="two words")
+    finally:
+        tracing.finish_trace(root)
+
+    line = stream.getvalue().strip()
+    assert line.endswith("loadServiceBundle: fetched sid=SP0001 rows=3 note='two words'"), line
+    assert f"[{root.trace_id[:16]}]" in line, f"trace ID missing from {line!r}"
+
+
+def test_json_format(output, monkeypatch):
+    monkeypatch.setenv("LOG_FORMAT", "json")
+    stream = output()
+    log = app_log.get_logger("app.test_log")
+
+    log.warning("replayQueuedWrites: %s failed", "saveServiceStandards", queued=2)
+    entry = json.loads(stream.getvalue())
+    assert entry["level"] == "WARNING" and entry["logger"] == "app.test_log", entry
+    assert entry["message"] == "replayQueuedWrites: saveServiceStandards failed", entry
+    assert entry["queued"] == 2, entry
+
+
+def test_level_from_environment(monkeypatch):
+    monkeypatch.delenv("LOG_LEVEL", raising=False)
+    assert app_log.configured_level("DevelopmentConfig") == logging.DEBUG, "development logs debug by default"
+    assert app_log.configured_level("ProductionConfig") == logging.INFO, "production logs info by default"
+
+    monkeypatch.setenv("LOG_LEVEL", "debug")
+    assert app_log.configured_level("ProductionConfig") == logging.DEBUG, "LOG_LEVEL should win"
+    monkeypatch.setenv("LOG_LEVEL", "chatty")
+    assert app_log.configured_level("ProductionConfig") == logging.INFO, "unknown LOG_LEVEL should fall back"
@@ -0,0 +1,158 @@
+import os, sys
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+import app as app_package
+from app import helper, metrics
+
+
+@pytest.fixture
+def connected(monkeypatch):
+    monkeypatch.setattr(app_package, "db_connected", True)
+    monkeypatch.setattr(helper, "_rollback_session_safely", lambda: None)
+    monkeypatch.setattr(helper.time, "sleep", lambda seconds: None)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_operation_timings_retries_and_rollbacks(connected):
+
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise OperationalError("SELECT 1", {}, Exception("40613"))
+        return "ok"
+
+    assert helper._run_with_db_retry(flaky, "test.flaky", default=None) == "ok", "Retried call did not succeed"
+    assert helper._run_with_db_retry(lambda: 1 / 0, "test.broken", default="fallback") == "fallback", "Default not returned"
+
+    stats = metrics.operation_stats()
+    assert stats["test.flaky"]["calls"] == 1 and stats["test.flaky"]["retries"] == 2, f"Retries not counted {stats['test.flaky']}"
+    assert stats["test.flaky"]["rollbacks"] == 2 and stats["test.flaky"]["failures"] == 0, "Rollbacks not counted"
+    assert stats["test.broken"]["failures"] == 1 and stats["test.broken"]["rollbacks"] == 1, "Failure not counted"
+    assert sum(stats["test.flaky"]["buckets"].values()) == 1, "Latency not added to histogram"
+
+
+def test_skipped_while_disconnected(connected, monkeypatch):
+
+    monkeypatch.setattr(app_package, "db_connected", False)
+    helper._run_with_db_retry(lambda: "never", "test.skipped", default=None)
+    assert metrics.operation_stats()["test.skipped"]["skipped"] == 1, "Skipped call not counted"
+
+
+def test_slow_query_logged_with_operation_and_parameters(connected, monkeypatch):
+
+    # the threshold is read once (at import and by create_app), not on every statement
+    monkeypatch.setattr(metrics, "_slow_query_seconds", metrics.slow_query_seconds())
+    monkeypatch.setenv("DB_SLOW_QUERY_MS", "0")
+    metrics.configure()
+    engine = create_engine("sqlite://")
+
+    def action():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT :value"), {"value": 42}).scalar()
+
+    assert helper._run_with_db_retry(action, "test.slow_lookup", default=None) == 42, "Query failed"
+
+    slow = metrics.slow_queries()
+    assert slow and slow[-1]["operation"] == "test.slow_lookup", f"Slow query not attributed {slow}"
+    assert slow[-1]["statement"] == "SELECT ?" and "42" in slow[-1]["parameters"], "Statement or parameters missing"
+
+    monkeypatch.setenv("DB_SLOW_QUERY_MS", "60000")
+    metrics.configure()
+    helper._run_with_db_retry(action, "test.fast_lookup", default=None)
+    assert metrics.slow_queries()[-1]["operation"] != "test.fast_lookup", "Fast query logged as slow"
+
+
+def test_failed_statement_does_not_leave_a_start_time():
+
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        with pytest.raises(Exception):
+            conn.execute(text("SELECT * FROM missing_table"))
+        assert conn.info.get("query_started") == [], "Failed statement left its start time"
+        conn.execute(text("SELECT 1"))
+        assert conn.info["query_started"] == [], "Start times out of step after a failure"
+
+
+def test_metrics_endpoints_closed_without_token(tmp_path, monkeypatch):
+
+    monkeypatch.setenv("FLASK_CONFIG", "TestingConfig")
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+    for name in ("db_connected", "db_error", "db_waking", "db_engine", "app_instance", "db_wake_thread"):
+        monkeypatch.setattr(app_package, name, getattr(app_package, name))
+
+    def sqlite_engine(timeout=120):
+        engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+        @event.listens_for(engine, "connect")
+        def attach_dbo(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+        app_package.db.metadata.create_all(engine)
+        return engine
+
+    monkeypatch.setattr(app_package, "create_db_engine", sqlite_engine)
+    client = app_package.create_app().test_client()
+    # a local reverse proxy makes every caller look like localhost
+    local = {"REMOTE_ADDR": "127.0.0.1"}
+    for path in ("/metrics", "/db-metrics", "/profiles"):
+        assert client.get(path, environ_base=local).status_code == 403, f"{path} open without METRICS_TOKEN"
+
+    monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+    client = app_package.create_app().test_client()
+    assert client.get("/metrics").status_code == 403, "/metrics open without the bearer token"
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200, "Token not accepted"
+
+
+class FakeResponse:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+def test_dependency_calls_recorded(connected):
+
+    response = metrics.call_dependency("C7", lambda url, headers=None: FakeResponse(200, b"12345"), "https://c7", headers={})
+    assert response.status_code == 200, "Response not passed through"
+    metrics.call_dependency("C7", lambda url: FakeResponse(404, b""), "https://c7/missing")
+
+    def timeout(url):
+        raise TimeoutError("read timed out")
+
+    with pytest.raises(TimeoutError):
+        metrics.call_dependency("CH", timeout, "https://ch")
+
+    text = metrics.render_prometheus()
+    assert 'cs_dependency_requests_total{dependency="C7",status="200"} 1' in text, "Status not counted"
+    assert 'cs_dependency_requests_total{dependency="C7",status="404"} 1' in text, "Error status not counted"
+    assert 'cs_dependency_requests_total{dependency="CH",status="error"} 1' in text, "Exception not counted"
+    assert 'cs_dependency_response_bytes_total{dependency="C7"} 5' in text, "Bytes not counted"
+
+
+def test_prometheus_histograms_and_caches(connected):
+
+    metrics.record_request("views.search_candidates", "GET", 200, 0.02)
+    metrics.record_request("views.search_candidates", "GET", 500, 3.0)
+    metrics.record_cache("test_cache", hits=3, misses=1)
+    metrics.register_cache("test_source", lambda: (0, 0))
+
+    text = metrics.render_prometheus()
+    labels = 'endpoint="views.search_candidates",method="GET"'
+    assert f'cs_http_request_duration_seconds_bucket{{{labels},le="0.025"}} 1' in text, "Bucket not cumulative"
+    assert f'cs_http_request_duration_seconds_bucket{{{labels},le="5.0"}} 2' in text, "Bucket not cumulative"
+    assert f'cs_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text, "+Inf bucket wrong"
+    assert f'cs_http_request_duration_seconds_count{{{labels}}} 2' in text, "Count missing"
+    assert 'cs_http_requests_total{endpoint="views.search_candidates",method="GET",status="500"} 1' in text, "Status missing"
+    assert 'cs_cache_hit_ratio{cache="test_cache"} 0.75' in text, "Cache ratio missing"
+    assert 'cs_cache_hit_ratio{cache="test_source"}' not in text, "Ratio reported for an unused cache"
+    assert all(line.startswith("#") or " " in line for line in text.splitlines()), "Malformed exposition line"
@@ -0,0 +1,42 @@
+import os, sys
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from app.namematch import match_names, best_match, normalise_name
+
+
+def test_normalise_name():
+
+    assert normalise_name("Horn, Michael:9233") == ["MICHAEL", "HORN"], "Surname-first C7 name not reordered"
+    assert normalise_name("Mr. Seán O'Brien") == ["SEAN", "OBRIEN"], "Accents, punctuation or titles not removed"
+
+
+def test_match_names_decisive():
+
+    assert match_names("CAMERON MCEACHRAN", "Cameron McEachran").match_type == "EQUAL", "Case-only difference not EQUAL"
+    assert match_names("MCEACHRAN CAMERON", "CAMERON MCEACHRAN").match_type == "MATCHING", "Transposed name not MATCHING"
+    assert match_names("C MCEACHRAN", "CAMERON MCEACHRAN").is_match, "Initial not accepted"
+    assert match_names("MICHAEL JOHN HORN", "MICHAEL HORN").is_match, "Middle name rejected"
+    assert not match_names("MICHAEL HORN", "CAMERON MCEACHRAN").is_match, "Unrelated names matched"
+
+
+def test_match_names_ambiguous():
+
+    # nicknames and surname-only names are left for NameAPI to decide
+    assert not match_names("BILL SMITH", "WILLIAM SMITH").decisive, "Nickname decided locally"
+    assert not match_names("SMITH", "WILLIAM SMITH").decisive, "Surname-only name decided locally"
+    # no shared tokens is not proof of a different person: spelling variants go to NameAPI too
+    assert not match_names("JOHN SMYTH", "JON SMITH").decisive, "Spelling variant rejected locally"
+    # a middle name on one side may line up with the other's first name
+    assert not match_names("MICHAEL JOHN HORN", "JOHN HORN").decisive, "Skipped first forename matched locally"
+    assert not match_names("JOHN HORN", "M JOHN HORN").decisive, "Skipped first initial matched locally"
+
+
+def test_best_match():
+
+    officers = ["JANE DOE", "CAMERON MCEACHRAN"]
+    assert best_match("Cameron McEachran", officers).match_type == "EQUAL", "Matching officer not found"
+    assert best_match("JOHN DOE", officers).match_type == "AMBIGUOUS", "Partial match should be referred to NameAPI"
+    assert not best_match("MICHAEL HORN", officers).decisive, "Non-matching name should be referred to NameAPI"
@@ -0,0 +1,77 @@
+import os, sys
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+import app as app_package
+from app import db, loader, preload
+from app.classes import Company
+from app.loader import get_loader
+
+
+@pytest.fixture
+def master(tmp_path, monkeypatch):
+    """ create_app() as a preloading gunicorn master would run it, with SQLite for the workers """
+    monkeypatch.setenv("APP_PRELOAD", "1")
+    monkeypatch.setenv("FLASK_CONFIG", "TestingConfig")
+    for name in ("db_connected", "db_error", "db_waking", "db_engine", "app_instance", "db_wake_thread"):
+        monkeypatch.setattr(app_package, name, getattr(app_package, name))
+    monkeypatch.setattr(preload, "_config", None)
+    monkeypatch.setattr(preload, "_warm_timings", {})
+    monkeypatch.setattr(Company, "_instances", [])
+    monkeypatch.setattr(Company, "counter", 0)
+
+    engines = []
+
+    def sqlite_engine(timeout=120):
+        engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+        @event.listens_for(engine, "connect")
+        def attach_dbo(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+        # a migrated database, so the schema check passes
+        db.metadata.create_all(engine)
+        engines.append(engine)
+        return engine
+
+    monkeypatch.setattr(app_package, "create_db_engine", sqlite_engine)
+    flask_app = app_package.create_app()
+    yield flask_app, engines
+    for engine in engines:
+        engine.dispose()
+
+
+def test_master_builds_warm_state_without_an_engine(master, monkeypatch):
+    flask_app, engines = master
+
+    assert engines == [], "the master must not create a database engine before fork"
+    assert not app_package.db_connected, "the master should leave connecting to the workers"
+    assert set(preload.warm_timings()) == {"config", "templates", "clients", "modules"}, preload.warm_timings()
+    assert "Northgate Analytics Limited" in {c.companyname for c in Company.get_all_companies()}, \
+        "client directory should be loaded from Colleague 7"
+    assert any(key[1] == "index.html" for key in flask_app.jinja_env.cache.keys()), "templates should be compiled"
+
+    monkeypatch.setattr(loader, "read_config", lambda: pytest.fail("config should come from the snapshot"))
+    with flask_app.test_request_context("/"):
+        assert get_loader().config()["C7_USERID"] == "1001", "loader should use the master's config"
+
+
+def test_each_worker_connects_after_fork(master):
+    flask_app, engines = master
+
+    preload.start_worker(flask_app)
+
+    assert len(engines) == 1 and app_package.db_connected, "worker should connect on start"
+    with flask_app.app_context():
+        assert db.engine is engines[0], "worker's engine should replace the placeholder"
+        assert db.session.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_preload_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("APP_PRELOAD", raising=False)
+    assert not preload.deferred(), "create_app should connect as before outside a preloading master"
@@ -0,0 +1,67 @@
+import os, sys
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from app import profiling
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.delenv("PROFILE_SAMPLE_RATE", raising=False)
+    monkeypatch.delenv("PROFILE_KEEP", raising=False)
+    return tmp_path
+
+
+def build_renewal():
+    return sum(i * i for i in range(20000))
+
+
+def test_only_admins_can_request_a_profile(profile_dir, monkeypatch):
+    assert profiling.requested({"X-Profile": "1"}, {}), "header should request a profile"
+    assert profiling.requested({}, {"profile": "true"}), "query flag should request a profile"
+    assert not profiling.requested({}, {}), "no flag, no profile"
+
+    assert profiling.should_profile(True, True) == "requested"
+    assert profiling.should_profile(True, False) is None, "non-admin requests must not be profiled"
+
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "1")
+    assert profiling.should_profile(False, False) == "sampled", "sampling should not need the flag"
+
+
+def test_profile_is_stored_and_listed(profile_dir):
+    profiler = profiling.start()
+    assert profiler is not None, "profiler should start"
+    build_renewal()
+    name = profiling.finish(profiler, "views.download_sp_renewal", "POST", "/download_sp_renewal", 200, 0.25,
+                            "requested", "abc123")
+
+    assert name and name.endswith("-views.download_sp_renewal"), name
+    assert (profile_dir / f"{name}.prof").exists(), "raw profile should be written"
+
+    summaries = profiling.latest()
+    assert [s["name"] for s in summaries] == [name], summaries
+    assert summaries[0]["endpoint"] == "views.download_sp_renewal" and summaries[0]["ms"] == 250.0, summaries[0]
+    assert any("build_renewal" in row["function"] for row in summaries[0]["top"]), summaries[0]["top"]
+
+    text = profiling.profile_report(name)
+    assert "build_renewal" in text, "report should list the profiled function"
+
+
+def test_old_profiles_are_pruned(profile_dir, monkeypatch):
+    monkeypatch.setenv("PROFILE_KEEP", "2")
+    names = []
+    for endpoint in ("views.spnda", "views.download_sp_nda", "views.download_sp_renewal"):
+        profiler = profiling.start()
+        names.append(profiling.finish(profiler, endpoint, "POST", "/", 200, 0.01, "sampled"))
+
+    assert [s["name"] for s in profiling.latest()] == names[:0:-1], "only the two newest should remain"
+    assert profiling.profile_path(names[0]) is None, "pruned profile should be gone"
+
+
+def test_profile_names_are_checked(profile_dir):
+    assert profiling.profile_path("../../config") is None, "path traversal must be rejected"
+    assert profiling.profile_report("missing") is None, "unknown profile should return None"
@@ -0,0 +1,92 @@
+import os, sys
+import random
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from app import reconnect
+from app.reconnect import ReconnectManager
+
+
+class FakeConnection:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def execute(self, statement):
+        return None
+
+    def close(self):
+        self.engine.open -= 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakePool:
+    def size(self):
+        return 5
+
+
+class FakeEngine:
+    """ Fails with the given errors, then connects; tracks how many connections are open at once """
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.pool = FakePool()
+        self.open = 0
+        self.peak = 0
+        self.disposed = False
+
+    def connect(self):
+        if self.errors:
+            raise Exception(self.errors.pop(0))
+        self.open += 1
+        self.peak = max(self.peak, self.open)
+        return FakeConnection(self)
+
+    def dispose(self):
+        self.disposed = True
+
+
+def test_backoff_reuses_engine_and_prewarms_pool():
+
+    engine = FakeEngine(["(40613) Database is not currently available"] * 6)
+    built, sleeps = [], []
+    manager = ReconnectManager(engine_factory=lambda timeout: built.append(timeout) or engine,
+                               timeout=30, base_delay=2, max_delay=20, sleep=sleeps.append, rng=random.Random(1))
+
+    assert manager.run() is engine, "Engine not returned after the database answered"
+    assert built == [30], f"Engine built {len(built)} times"
+
+    ceilings = [2, 4, 8, 16, 20, 20]
+    assert len(sleeps) == 6, f"Expected six backoff sleeps, got {sleeps}"
+    assert all(c / 2 <= s <= c for s, c in zip(sleeps, ceilings)), f"Delays outside jittered bounds {sleeps}"
+    assert engine.peak == 5 and engine.open == 0, f"Pool not pre-warmed with pool_size connections (peak {engine.peak})"
+
+    status = reconnect.reconnect_status()
+    assert [a["ok"] for a in status["attempts"][-7:]] == [False] * 6 + [True], "Attempt history not recorded"
+    assert status["prewarm"]["connections"] == 5, "Pre-warm not recorded"
+
+
+def test_non_waking_error_stops_retrying():
+
+    engine = FakeEngine(["Login failed for user 'app'"])
+    sleeps = []
+    manager = ReconnectManager(engine_factory=lambda timeout: engine, sleep=sleeps.append)
+
+    assert manager.run() is None, "Expected no engine after a login failure"
+    assert not manager.timed_out and "Login failed" in manager.last_error, "Error not reported"
+    assert sleeps == [] and engine.disposed, "Retried or leaked the engine after a non-waking error"
+
+
+def test_gives_up_after_max_attempts():
+
+    engine = FakeEngine(["Login timeout expired"] * 10)
+    manager = ReconnectManager(engine_factory=lambda timeout: engine, max_attempts=3, sleep=lambda s: None)
+
+    assert manager.run() is None, "Expected no engine after running out of attempts"
+    assert manager.timed_out and engine.disposed, "Timeout not reported"
@@ -0,0 +1,52 @@
+import os, sys
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+import app as app_package
+from app import db, check_schema, SchemaOutOfDate
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """ SQLite with the dbo schema attached as a second file """
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    yield engine
+    engine.dispose()
+
+
+def test_check_schema_passes_on_a_migrated_database(engine):
+
+    db.metadata.create_all(engine)
+    check_schema(engine)
+
+
+def test_unmigrated_database_is_reported_not_connected(engine, monkeypatch):
+
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # as before 0001_sid_norm
+        conn.execute(text("DROP TABLE dbo.ServiceContract"))
+        conn.execute(text("CREATE TABLE dbo.ServiceContract (conid INTEGER PRIMARY KEY, sid VARCHAR(10), "
+                          "specialconditions TEXT, context TEXT)"))
+
+    with pytest.raises(SchemaOutOfDate, match="dbo.ServiceContract has no sid_norm"):
+        check_schema(engine)
+
+    for name in ("db_connected", "db_error", "db_waking", "db_engine", "db_wake_thread"):
+        monkeypatch.setattr(app_package, name, getattr(app_package, name))
+    monkeypatch.setattr(app_package, "create_db_engine", lambda timeout=120: engine)
+    monkeypatch.setattr(app_package, "start_background_connect", lambda reason="request": pytest.fail("should not retry"))
+
+    assert app_package.initialize_database_connection() is False
+    assert not app_package.db_connected, "queries would return empty data against the old schema"
+    assert "alembic upgrade head" in app_package.db_error, "the waiting page should say what to do"
@@ -0,0 +1,55 @@
+import os, sys
+import json
+import subprocess
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from app import HEAVY_MODULES, preload_modules
+
+# Seconds `import run` (which calls create_app) may take; IMPORT_BUDGET_SECONDS overrides it
+DEFAULT_BUDGET = 1.5
+
+MEASURE = """
+import json, sys, time
+started = time.perf_counter()
+import run
+seconds = time.perf_counter() - started
+print(json.dumps({"seconds": seconds, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+@pytest.fixture(scope="module")
+def cold_import():
+    """ Best of two fresh interpreters importing run, with the offline secrets and no database """
+    env = {k: v for k, v in os.environ.items() if k != "KEY_VAULT_NAME"}
+    env["FLASK_CONFIG"] = "TestingConfig"
+    # the background warm-up imports some of them on purpose; this measures the import itself
+    env["WARMUP"] = "0"
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (project_root, env.get("PYTHONPATH")) if p)
+    runs = []
+    for _ in range(2):
+        out = subprocess.run([sys.executable, "-c", MEASURE], cwd=project_root, env=env,
+                             capture_output=True, text=True, timeout=120)
+        assert out.returncode == 0, f"import run failed:\n{out.stderr[-2000:]}"
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return min(runs, key=lambda r: r["seconds"])
+
+
+def test_import_run_within_budget(cold_import):
+    budget = float(os.environ.get("IMPORT_BUDGET_SECONDS", DEFAULT_BUDGET))
+    assert cold_import["seconds"] <= budget, \
+        f"import run took {cold_import['seconds']:.2f}s, over the {budget:.2f}s budget"
+
+
+def test_heavy_libraries_load_on_first_use(cold_import):
+    assert cold_import["loaded"] == [], f"imported at startup instead of on first use: {cold_import['loaded']}"
+
+
+def test_preload_modules_imports_them():
+    timings = preload_modules()
+
+    assert set(timings) == set(HEAVY_MODULES), f"not all modules preloaded: {timings}"
+    assert all(name in sys.modules for name in HEAVY_MODULES), "preloaded modules should be imported"
@@ -0,0 +1,103 @@
+import os, sys
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+import app as app_package
+from app import helper, metrics, tracing
+
+
+class FakeResponse:
+    status_code = 200
+    content = b"{}"
+
+
+@pytest.fixture
+def sink(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACING", "1")
+    monkeypatch.setenv("TRACE_SINK", str(path))
+    monkeypatch.delenv("OTEL_EXPORTER_OTLP_ENDPOINT", raising=False)
+    monkeypatch.setattr(app_package, "db_connected", True)
+
+    def read():
+        return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+    return read
+
+
+def test_request_trace_has_child_spans(sink):
+
+    @tracing.traced
+    def getC7Contact(contact_id):
+        metrics.call_dependency("C7", lambda url, headers=None: FakeResponse(), "https://c7/api/Contact?id=1", headers={})
+        return helper._run_with_db_retry(lambda: "row", "test.lookup_contract", default=None)
+
+    root = tracing.start_trace("GET views.candidatefetch")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert executor.submit(tracing.in_context(getC7Contact), 1).result() == "row", "Traced function result lost"
+    tracing.finish_trace(root)
+
+    spans = {s["name"]: s for s in sink()}
+    assert set(spans) == {"GET views.candidatefetch", "test_tracing.getC7Contact", "C7 <LAMBDA>", "SQL test.lookup_contract"}, \
+        f"Unexpected spans {sorted(spans)}"
+    assert len({s["trace_id"] for s in spans.values()}) == 1, "Spans not in one trace"
+    assert spans["test_tracing.getC7Contact"]["parent_id"] == root.span_id, "Function span not a child of the request"
+    client = spans["C7 <LAMBDA>"]
+    assert client["parent_id"] == spans["test_tracing.getC7Contact"]["span_id"], "Outbound span not nested"
+    assert client["attributes"] == {"dependency": "C7", "url": "https://c7/api/Contact", "status_code": "200", "bytes": 2}, \
+        f"Outbound attributes wrong {client['attributes']}"
+    assert tracing.current_span() is None, "Trace left active after the request"
+
+
+def test_no_spans_outside_a_trace(sink):
+
+    with tracing.span("orphan") as orphan:
+        assert orphan is None, "Span recorded without a trace"
+    assert sink() == [], "Orphan span exported"
+
+
+def test_fast_requests_not_exported_with_threshold(sink, monkeypatch):
+
+    monkeypatch.setenv("TRACE_MIN_MS", "60000")
+    tracing.finish_trace(tracing.start_trace("GET views.index"))
+    assert sink() == [], "Fast request exported despite TRACE_MIN_MS"
+
+
+def test_tracing_off_by_default(sink, monkeypatch):
+
+    monkeypatch.delenv("TRACING")
+    assert tracing.start_trace("GET views.index") is None, "Traced without TRACING set"
+
+
+def test_sink_rotated_at_size_limit(sink, tmp_path, monkeypatch):
+
+    monkeypatch.setenv("TRACE_SINK_MAX_MB", "0.0001")
+    for _ in range(3):
+        tracing.finish_trace(tracing.start_trace("GET views.index"))
+    assert (tmp_path / "traces.jsonl.1").exists(), "Sink not rotated"
+    assert len(sink()) < 3, "Rotated spans left in the sink"
+
+
+def test_failed_span_and_log_trace_id(sink, caplog):
+
+    tracing.install_log_filter()
+    root = tracing.start_trace("GET views.validateC7")
+    with caplog.at_level(logging.INFO):
+        logging.info("checking company")
+        with pytest.raises(ValueError):
+            with tracing.span("CH GET", kind="client"):
+                raise ValueError("bad company number")
+    tracing.finish_trace(root)
+
+    assert f"[trace {root.trace_id[:16]}] checking company" in caplog.text, "Trace ID missing from log line"
+    failed = [s for s in sink() if s["name"] == "CH GET"][0]
+    assert failed["status"] == "error" and "bad company number" in failed["attributes"]["error"], "Error not recorded on span"
+
+    payload = tracing.otlp_payload(sink())
+    otlp_spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert {s["traceId"] for s in otlp_spans} == {root.trace_id} and otlp_spans[0]["status"]["code"] in (1, 2), "Bad OTLP payload"
@@ -0,0 +1,117 @@
+import os, sys
+
+# Add the project root to Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event
+
+import app as app_package
+from app import db, dbquery, helper, preload, warmup
+from app.classes import Company
+from app.models import ServiceStandard
+
+
+@pytest.fixture
+def warm_state(monkeypatch):
+    """ A clean warm-up state, with the warm-up enabled and the caches it fills emptied """
+    monkeypatch.setenv("WARMUP", "1")
+    for name in ("db_connected", "db_error", "db_waking", "db_engine", "app_instance", "db_wake_thread"):
+        monkeypatch.setattr(app_package, name, getattr(app_package, name))
+    monkeypatch.setattr(warmup, "_status", {})
+    monkeypatch.setattr(warmup, "_thread", None)
+    monkeypatch.setattr(warmup, "_finished_at", None)
+    monkeypatch.setattr(preload, "_config", None)
+    monkeypatch.setattr(Company, "_instances", [])
+    monkeypatch.setattr(Company, "counter", 0)
+    helper.clearTemplateCache()
+    yield
+    helper.clearTemplateCache()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch, warm_state):
+    """ SQLite stand-in for Azure SQL holding one CS standard """
+    flask_app = Flask(__name__)
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'main.db'}"
+    db.init_app(flask_app)
+    monkeypatch.setattr(app_package, "db_connected", True)
+    monkeypatch.setenv("SID_CACHE_DIR", str(tmp_path / "sid_versions"))
+    dbquery.clearServiceCache()
+
+    with flask_app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def attach_dbo(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+        db.create_all()
+        db.session.add(ServiceStandard(sid="CS", ssn="CS1", description="Change Specialists standard"))
+        db.session.commit()
+        db.session.remove()
+    yield flask_app
+    dbquery.clearServiceCache()
+
+
+def test_run_warms_every_item(database, fake_services):
+
+    status = warmup.run(database)
+
+    assert {name: item["state"] for name, item in status.items()} == {name: "ok" for name in warmup.ITEMS}, status
+    assert warmup.ready(), "all critical items are warm"
+    assert preload.config_snapshot() is not None, "secrets should be kept for the loaders"
+    assert {service for service, method, path in fake_services.calls if method == "HEAD"} == \
+        {"c7", "ch", "nameapi", "graph"}, "every API host should be reached"
+    assert "Northgate Analytics Limited" in {c.companyname for c in Company.get_all_companies()}
+
+    downloads = len(fake_services.calls)
+    from app.views import NDA_TEMPLATE_FILE, NDA_TEMPLATE_FOLDER
+    assert helper.downloadTemplate(NDA_TEMPLATE_FOLDER, NDA_TEMPLATE_FILE), "template should be cached"
+    assert len(fake_services.calls) == downloads, "the first preview should not download the template again"
+
+
+def test_not_ready_until_critical_items_are_warm(database, fake_services, monkeypatch):
+    monkeypatch.setattr(app_package, "db_connected", False)
+    monkeypatch.setenv("WARMUP_DB_WAIT_SECONDS", "0")
+
+    status = warmup.run(database)
+
+    assert status["database"]["state"] == "failed" and status["cs_standards"]["state"] == "failed", status
+    assert status["clients"]["state"] == "ok", "items that do not need the database still warm"
+    assert not warmup.ready(), "not ready while a critical item has failed"
+
+    monkeypatch.setenv("WARMUP_CRITICAL", "secrets,clients")
+    assert warmup.ready(), "readiness should follow WARMUP_CRITICAL"
+
+    monkeypatch.setenv("WARMUP_CRITICAL", "secrets,database")
+    monkeypatch.setattr(app_package, "db_connected", True)
+    warmup.run(database, ("database", "cs_standards"))
+    assert warmup.ready(), "retrying the failed items once the database is up makes it ready"
+
+
+def test_health_and_ready_endpoints(tmp_path, monkeypatch, warm_state):
+    monkeypatch.setenv("WARMUP", "0")
+    monkeypatch.setenv("FLASK_CONFIG", "TestingConfig")
+
+    def sqlite_engine(timeout=120):
+        engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+        @event.listens_for(engine, "connect")
+        def attach_dbo(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+        # a migrated database, so the schema check passes
+        db.metadata.create_all(engine)
+        return engine
+
+    monkeypatch.setattr(app_package, "create_db_engine", sqlite_engine)
+    client = app_package.create_app().test_client()
+
+    monkeypatch.setattr(app_package, "db_connected", False)
+    assert client.get("/health").status_code == 200, "liveness does not depend on the database"
+    response = client.get("/ready")
+    assert response.status_code == 503 and response.get_json()["ready"] is False, "not ready without the database"
+
+    monkeypatch.setattr(app_package, "db_connected", True)
+    assert client.get("/ready").status_code == 200, "ready once the database is connected"